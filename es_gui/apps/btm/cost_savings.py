@@ -31,7 +31,7 @@ from kivy.uix.textinput import TextInput
 
 # from es_gui.apps.valuation.reporting import Report
 from .reporting import BtmCostSavingsReport
-from es_gui.resources.widgets.common import BodyTextBase, MyPopup, WarningPopup, TileButton, RecycleViewRow, InputError, BASE_TRANSITION_DUR, BUTTON_FLASH_DUR, ANIM_STAGGER, FADEIN_DUR, SLIDER_DUR, PALETTE, rgba_to_fraction, fade_in_animation, slow_blinking_animation, WizardCompletePopup, ParameterRow, ParameterGridWidget
+from es_gui.resources.widgets.common import BodyTextBase, MyPopup, WarningPopup, WizardExecuteScreen, TileButton, RecycleViewRow, InputError, BASE_TRANSITION_DUR, BUTTON_FLASH_DUR, ANIM_STAGGER, FADEIN_DUR, SLIDER_DUR, PALETTE, rgba_to_fraction, fade_in_animation, slow_blinking_animation, WizardCompletePopup, ParameterRow, ParameterGridWidget
 from es_gui.proving_grounds.data_importer import DataImporter
 from es_gui.apps.data_manager.data_manager import DATA_HOME
 from es_gui.tools.btm.readutdata import get_pv_profile_string
@@ -688,7 +688,7 @@ class CostSavingsWizardSummary(Screen):
         self.manager.current = 'execute'
 
 
-class CostSavingsWizardExecute(Screen):
+class CostSavingsWizardExecute(WizardExecuteScreen):
     """The screen for executing the prescribed optimizations for the cost savings wizard."""
     solved_ops = []
     report_attributes = {}
@@ -706,9 +706,14 @@ class CostSavingsWizardExecute(Screen):
         op_handler_requests = ss.get_selections()
 
         # Send requests to handler.
-        handler = btm_home.handler
-        handler.solver_name = App.get_running_app().config.get('optimization', 'solver')
-        self.solved_ops, handler_status = handler.process_requests(op_handler_requests)
+        handler = btm_home.configure_handler()
+
+        self.report_attributes = op_handler_requests
+        self.start_run(handler, op_handler_requests)
+
+    def finish_run(self, solved_ops, handler_status):
+        """Shows the outcome of the run and proceeds to the report."""
+        self.solved_ops = solved_ops
 
         popup = WizardCompletePopup()
 
@@ -735,10 +740,6 @@ class CostSavingsWizardExecute(Screen):
                 popup.bind(on_dismiss=lambda x: self.manager.parent.parent.manager.nav_bar.go_up_screen())  # Go back to BTM Home
                 popup.open()
                 return
-        
-        self.report_attributes = op_handler_requests
-
-        popup = WizardCompletePopup()
 
         # if not handler_status:
         #     popup.title = "Success!*"
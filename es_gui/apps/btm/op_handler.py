@@ -1,24 +1,57 @@
 from __future__ import absolute_import
 
+from concurrent.futures import ProcessPoolExecutor
 import logging
 from datetime import datetime
 import calendar
+import itertools
 import pyutilib
 import numpy as np
+import pandas as pd
 
-from kivy.clock import mainthread
-
-from es_gui.tools.btm.btm_optimizer import BtmOptimizer, BadParameterException, IncompatibleDataException
+from es_gui.tools.optimizer import solve_stacked
+from es_gui.tools.progress import RunProgress
+from es_gui.tools.solve_cache import make_key
+from es_gui.tools.btm.btm_optimizer import BtmOptimizer, BtmRecord, BadParameterException, IncompatibleDataException
 import es_gui.tools.btm.readutdata as readutdata
 
 
 class BtmOptimizerHandler:
     """A handler for creating and solving BtmOptimizer instances as requested."""
     dms = None
+    solve_cache = None
     solved_ops = []
 
-    def __init__(self, solver_name):
+    # The maximum number of records kept in solved_ops; the oldest are discarded first. Unlimited if None or 0.
+    solved_ops_limit = None
+
+    # BtmOptimizer results saved to and restored from the solve cache.
+    CACHED_ATTRIBUTES = ('results', 'total_bill_with_es', 'total_bill_without_es',
+                         'energy_charge_with_es', 'energy_charge_without_es',
+                         'demand_charge_with_es', 'demand_charge_without_es',
+                         'nem_charge_with_es', 'nem_charge_without_es',
+                         'peak_demand_with_es', 'peak_demand_without_es')
+
+    # BtmRecord attributes written to the summaries of BTM runs, e.g., by process_portfolio().
+    SUMMARY_ATTRIBUTES = ('total_bill_without_es', 'total_bill_with_es',
+                          'energy_charge_without_es', 'energy_charge_with_es',
+                          'demand_charge_without_es', 'demand_charge_with_es',
+                          'nem_charge_without_es', 'nem_charge_with_es',
+                          'peak_demand_without_es', 'peak_demand_with_es')
+
+    # The issue reported when a run is cancelled before every model is solved.
+    CANCELLED_STATUS = '* The run was cancelled; only the models solved before then are included.'
+
+    # A pool of worker processes shared by the batches of a portfolio; each batch starts its own if None.
+    _executor = None
+
+    # The futures submitted to the shared pool of worker processes.
+    _executor_futures = ()
+
+    def __init__(self, solver_name, n_workers=1, stack_size=1):
         self._solver_name = solver_name
+        self._n_workers = n_workers
+        self._stack_size = stack_size
 
     @property
     def solver_name(self):
@@ -29,8 +62,37 @@ class BtmOptimizerHandler:
     def solver_name(self, value):
         self._solver_name = value
 
-    def process_requests(self, op_handler_requests, *args):
-        """Generates and solves BtmOptimizer models based on the given requests."""
+    @property
+    def n_workers(self):
+        """The number of worker processes used to solve the monthly models; models are solved in-process if less than two."""
+        return self._n_workers
+
+    @n_workers.setter
+    def n_workers(self, value):
+        try:
+            self._n_workers = max(int(value), 1)
+        except (TypeError, ValueError):
+            raise ValueError('n_workers must be a positive integer.')
+
+    @property
+    def stack_size(self):
+        """The maximum number of independent models stacked into one block-diagonal model per solver call; models are solved one at a time if less than two. Models solved in worker processes and sub-hourly models are not stacked."""
+        return self._stack_size
+
+    @stack_size.setter
+    def stack_size(self, value):
+        try:
+            self._stack_size = max(int(value), 1)
+        except (TypeError, ValueError):
+            raise ValueError('stack_size must be a positive integer.')
+
+    def process_requests(self, op_handler_requests, *args, progress_callback=None, cancel_event=None, solved_entries=None):
+        """Generates and solves BtmOptimizer models based on the given requests.
+
+        :param progress_callback: A callable that receives an event as each model is built, solved, or fails; see RunProgress.
+        :param cancel_event: A threading.Event; once set, no further models are solved and the models solved so far are returned.
+        :param solved_entries: A list that the solved_ops entry of each solved model is appended to, or None.
+        """
         dms = self.dms
 
         rate_structure = op_handler_requests['rate_structure']
@@ -42,7 +104,17 @@ class BtmOptimizerHandler:
 
         handler_status = set()
 
-        year = 2019
+        def _save(op, month, params):
+            solved_requests.append(self._save_to_solved_ops(op, month, params))
+
+            if solved_entries is not None:
+                solved_entries.append(BtmOptimizerHandler.solved_ops[-1])
+
+        # The year of the rate calendar; the hourly load and PV profiles are split into months as if they start on January 1 of the year.
+        year = int(op_handler_requests.get('year', 2019))
+
+        # The length of each time period of the models [minutes]; profiles with other timesteps are resampled.
+        timestep = int(op_handler_requests.get('timestep', 60))
 
         weekday_energy_schedule = rate_structure['energy rate structure']['weekday schedule']
         weekend_energy_schedule = rate_structure['energy rate structure']['weekend schedule']
@@ -52,87 +124,441 @@ class BtmOptimizerHandler:
         nem_type = 2 if rate_structure['net metering']['type'] else 1
         nem_rate = None if rate_structure['net metering']['type'] else rate_structure['net metering']['energy sell price']
 
-        rate_df = readutdata.input_df(year, weekday_energy_schedule, weekend_energy_schedule, weekday_demand_schedule, weekend_demand_schedule)
+        rate_calendar = readutdata.rate_calendar(year, weekday_energy_schedule, weekend_energy_schedule, weekday_demand_schedule, weekend_demand_schedule, timestep=timestep)
+
+        # Parameter sets after the first empty one are not solved.
+        n_params = next((ix + 1 for ix, params in enumerate(param_set) if not params), len(param_set))
+        progress = RunProgress(12*n_params, callback=progress_callback, cancel_event=cancel_event)
+
+        # Parameter sweeps over the same model parameters reuse one model per month when possible.
+        sweep = self._is_sweep(param_set)
+
+        # The monthly models are independent; they are solved by worker processes if there are enough of them.
+        n_workers = min(self.n_workers, progress.total)
+
+        # Otherwise, independent models are stacked into block-diagonal models to share the fixed cost of each solver call. Sub-hourly models are solved as sparse matrix LPs (see BtmOptimizer.backend) and are not stacked.
+        stack = self.stack_size > 1 and not sweep and n_workers < 2 and timestep >= 60
+
+        # Jobs of (month, op_inputs, params) solved after every month's inputs have been gathered.
+        batch_jobs = []
 
         for ix, month in enumerate(calendar.month_abbr[1:], start=1):
+            if progress.cancelled():
+                break
+
+            # Get data.
+            # TODO: Move to a DMS. Should the omission of PV profile data be handled by the BtmOptimizer?
+            load_profile = self.dms.get_load_profile_data(load_profile_path['path'], ix, year=year, timestep=timestep)
+
+            try:
+                pv_profile = self.dms.get_pv_profile_data(pv_profile_path['path'], ix, year=year, timestep=timestep)
+            except KeyError:
+                pv_profile = np.zeros(len(load_profile))
+
+            # Build op inputs.
+            tou_energy_schedule, tou_demand_schedule = rate_calendar.get_month(ix)
+
+            op_inputs = {'tou_energy_schedule': tou_energy_schedule,
+                         'tou_demand_schedule': tou_demand_schedule,
+                         'tou_energy_rate': [x[1] for x in rate_structure['energy rate structure']['energy rates'].items()],
+                         'tou_demand_rate': [x[1] for x in rate_structure['demand rate structure']['time of use rates'].items()],
+                         'flat_demand_rate': rate_structure['demand rate structure']['flat rates'][month],
+                         'nem_type': nem_type,
+                         'nem_rate': nem_rate,
+                         'load_profile': load_profile,
+                         'pv_profile': pv_profile,
+                         'timestep': timestep,
+                         'rate_structure_metadata': rate_structure,
+                         'load_profile_metadata': load_profile_path,
+                         'pv_profile_metadata': pv_profile_path,
+                         }
+
+            if stack or n_workers > 1:
+                for params in param_set:
+                    batch_jobs.append((month, op_inputs, params))
+
+                    if not params:
+                        break
+
+                continue
+
+            op = None
+
             param_set_iterator = iter(param_set)
             continue_param_loop = True
 
-            while continue_param_loop:
+            while continue_param_loop and not progress.cancelled():
                 try:
                     params = next(param_set_iterator)
                 except StopIteration:
                     break
 
-                op = BtmOptimizer()
+                if not params:
+                    continue_param_loop = False
+
+                cached_op = self._get_cached(op_inputs, params)
 
-                # Get data.
-                # TODO: Move to a DMS. Should the omission of PV profile data be handled by the BtmOptimizer?
-                load_profile = self.dms.get_load_profile_data(load_profile_path['path'], ix)
+                if cached_op is not None:
+                    _save(cached_op, month, params)
+                    progress.report('cached', month, params)
+                    continue
 
                 try:
-                    pv_profile = self.dms.get_pv_profile_data(pv_profile_path['path'], ix)
-                except KeyError:
-                    pv_profile = np.zeros(len(load_profile))
+                    if op is None:
+                        # Populate op.
+                        op = BtmOptimizer(**op_inputs)
+                        op.sweep_mode = sweep
+
+                        if params:
+                            op.set_model_parameters(**params)
+
+                        try:
+                            solved_op = self._solve_model(op, progress, month, params)
+                        except Exception:
+                            # Rebuild for the next parameter set.
+                            op = None
+                            raise
+                    else:
+                        # Update the month's model in place and re-solve.
+                        op.update_parameters(**params)
+                        op.resolve()
+
+                    # The model is shared between parameter sets in sweep mode; its results are recorded before the next solve.
+                    solved_op = op
+
+                    if not sweep:
+                        op = None
+                except (pyutilib.common._exceptions.ApplicationError, IncompatibleDataException, AssertionError) as e:
+                    self._report_error(e, month, year, handler_status)
+                    progress.report('failed', month, params)
+                else:
+                    self._put_cached(op_inputs, params, solved_op)
+                    _save(solved_op, month, params)
+                    progress.report('solved', month, params)
+
+        if stack:
+            batch_outcomes = self._solve_stacks(batch_jobs, progress)
+        elif batch_jobs:
+            batch_outcomes = self._solve_in_workers(batch_jobs, n_workers, sweep, progress)
+        else:
+            batch_outcomes = []
+
+        # Outcomes are collected in month order so that solved_ops is deterministic.
+        for (month, op_inputs, params), outcome in zip(batch_jobs, batch_outcomes):
+            if outcome is None:
+                # Not solved because the run was cancelled.
+                continue
+            elif isinstance(outcome, Exception):
+                self._report_error(outcome, month, year, handler_status)
+            else:
+                _save(outcome, month, params)
 
-                # Build op inputs.
-                rate_df_month = rate_df.loc[rate_df['month'] == ix]
+        if progress.cancelled() and progress.completed < progress.total:
+            logging.info('Op Handler: Cancelled after {0} of {1} models.'.format(progress.completed, progress.total))
+            handler_status.add(self.CANCELLED_STATUS)
 
-                # Populate op.
-                op.tou_energy_schedule = rate_df_month['tou_energy_schedule'].values
-                op.tou_demand_schedule = rate_df_month['tou_demand_schedule'].values
+        # Persist the data loaded for this batch once instead of on every insert.
+        self.dms.save_state()
 
-                op.tou_energy_rate = [x[1] for x in rate_structure['energy rate structure']['energy rates'].items()]
-                op.tou_demand_rate = [x[1] for x in rate_structure['demand rate structure']['time of use rates'].items()]
-                op.flat_demand_rate = rate_structure['demand rate structure']['flat rates'][month]
+        if self.solve_cache is not None:
+            self.solve_cache.evict()
 
-                op.nem_type = nem_type
-                op.nem_rate = nem_rate
+        logging.info('Op Handler: Finished processing requested jobs.')
+        return solved_requests, handler_status
 
-                op.load_profile = load_profile
-                op.pv_profile = pv_profile
-                op.rate_structure_metadata = rate_structure
-                op.load_profile_metadata = load_profile_path
-                op.pv_profile_metadata = pv_profile_path
+    def process_portfolio(self, portfolio_requests, *args, progress_callback=None, cancel_event=None):
+        """Generates and solves BtmOptimizer models for every combination of the rate structures, load profiles, and PV profiles in the given requests.
 
-                if params:
-                    op.set_model_parameters(**params)
-                else:
-                    continue_param_loop = False
-                
-                try:
-                    solved_op = self._solve_model(op)
-                except pyutilib.common._exceptions.ApplicationError as e:
-                    logging.error('Op Handler: {error}'.format(error=e))
+        portfolio_requests has lists of 'rate_structures', 'load_profiles', and 'pv_profiles' in the forms of process_requests() (use [{}] to omit PV), its 'params', and optionally its 'year' and 'timestep'. The combinations are processed one building at a time, i.e., each load profile with each PV profile against every rate structure, so that each profile is read once and the rate calendar of each rate structure is reused. If n_workers is at least two, one pool of worker processes is shared by every combination.
 
-                    if 'No executable found' in e.args[0]:
-                        # Could not locate solver executable
-                        handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
+        :param progress_callback: A callable that receives an event as each model is built, solved, or fails; see RunProgress. The completed and total counts are of the whole portfolio.
+        :param cancel_event: A threading.Event; once set, no further models are solved and the models solved so far are returned.
+        :return: A tidy DataFrame with a row of the bills with and without energy storage of each solved model and the set of issues reported.
+        """
+        rate_structures = portfolio_requests['rate_structures']
+        load_profiles = portfolio_requests['load_profiles']
+        pv_profiles = portfolio_requests.get('pv_profiles') or [{}]
+        param_set = portfolio_requests['params']
+
+        combinations = [(load_profile, pv_profile, rate_structure)
+                        for load_profile in load_profiles for pv_profile in pv_profiles for rate_structure in rate_structures]
+
+        # Parameter sets after the first empty one are not solved.
+        n_params = next((ix + 1 for ix, params in enumerate(param_set) if not params), len(param_set))
+        n_models = 12*n_params
+
+        handler_status = set()
+        rows = []
+        n_completed = 0
+
+        def _report(event):
+            progress_callback(dict(event, completed=n_completed + event['completed'], total=n_models*len(combinations)))
+
+        if self.n_workers > 1 and combinations:
+            self._executor = ProcessPoolExecutor(max_workers=min(self.n_workers, n_models*len(combinations)))
+            self._executor_futures = []
+
+        try:
+            for load_profile, pv_profile, rate_structure in combinations:
+                if cancel_event is not None and cancel_event.is_set():
+                    handler_status.add(self.CANCELLED_STATUS)
+                    break
+
+                op_handler_requests = {'rate_structure': rate_structure,
+                                       'load_profile': load_profile,
+                                       'pv_profile': pv_profile,
+                                       'params': param_set,
+                                       }
+
+                for key in ('year', 'timestep'):
+                    if key in portfolio_requests:
+                        op_handler_requests[key] = portfolio_requests[key]
+
+                entries = []
+                solved_requests, combination_status = self.process_requests(op_handler_requests,
+                                                                             progress_callback=_report if progress_callback is not None else None,
+                                                                             cancel_event=cancel_event,
+                                                                             solved_entries=entries)
+
+                combination_name = ' | '.join([rate_structure.get('name', ''), load_profile.get('name', ''), pv_profile.get('name', 'None')])
+                for status in combination_status:
+                    if status == self.CANCELLED_STATUS:
+                        handler_status.add(status)
                     else:
-                        handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
+                        handler_status.add('* [{0}] {1}'.format(combination_name, status.lstrip('* ')))
+
+                for entry in entries:
+                    record = entry['optimizer']
+
+                    row = {'rate structure': rate_structure.get('name', ''),
+                           'load profile': load_profile.get('name', ''),
+                           'pv profile': pv_profile.get('name', ''),
+                           'month': list(calendar.month_abbr).index(entry['month']),
+                           }
+                    row.update(entry.get('params', {}))
+                    row.update({attribute: getattr(record, attribute) for attribute in self.SUMMARY_ATTRIBUTES})
+
+                    rows.append(row)
+
+                n_completed += n_models
+        finally:
+            if self._executor is not None:
+                if cancel_event is not None and cancel_event.is_set():
+                    # Jobs that have not started are dropped.
+                    for future in self._executor_futures:
+                        future.cancel()
+
+                self._executor.shutdown()
+                self._executor = None
+                self._executor_futures = ()
+
+        key_columns = ['rate structure', 'load profile', 'pv profile', 'month']
+        param_columns = sorted(set(name for row in rows for name in row) - set(key_columns) - set(self.SUMMARY_ATTRIBUTES))
+        summary = pd.DataFrame(rows).reindex(columns=key_columns + param_columns + list(self.SUMMARY_ATTRIBUTES))
+
+        logging.info('Op Handler: Finished processing the portfolio of {0} combinations.'.format(len(combinations)))
+        return summary, handler_status
+
+    @staticmethod
+    def _is_sweep(param_set):
+        """Returns True if param_set can be solved by updating one model in place, i.e., every entry sets the same mutable parameters."""
+        if len(param_set) < 2 or not all(param_set):
+            return False
+
+        keys = set(param_set[0])
+
+        return keys <= BtmOptimizer.SWEEP_PARAMS and all(set(params) == keys for params in param_set)
+
+    def _solve_model(self, op, progress=None, label='', params=None):
+        """Builds and solves the BtmOptimizer op, reporting to progress once it has been built."""
+        op.solver = self.solver_name
+        op.instantiate_model()
+        op.populate_model()
+
+        if progress is not None:
+            progress.report('built', label, params)
+
+        op.resolve()
+
+        return op
+
+    def _solve_stacks(self, stack_jobs, progress=None):
+        """Builds a BtmOptimizer for each (month, op_inputs, params) in stack_jobs and solves them stack_size at a time as block-diagonal models.
+
+        If a stacked model cannot be solved to optimality, e.g., because one of the models is infeasible, each of its models is solved individually so that its outcome can be reported. Returns a list with the solved BtmOptimizer or the raised exception for each job; jobs not solved because progress was cancelled are None. The outcome of each job is reported to progress as each stack is solved.
+        """
+        outcomes = [None]*len(stack_jobs)
+
+        for start in range(0, len(stack_jobs), self.stack_size):
+            if progress is not None and progress.cancelled():
+                break
+
+            ops = []
+
+            for ix, (month, op_inputs, params) in enumerate(stack_jobs[start:start + self.stack_size], start=start):
+                outcomes[ix] = self._get_cached(op_inputs, params)
+
+                if outcomes[ix] is not None:
+                    if progress is not None:
+                        progress.report('cached', month, params)
+
+                    continue
+
+                try:
+                    op = BtmOptimizer(**op_inputs)
+                    op.solver = self.solver_name
+
+                    if params:
+                        op.set_model_parameters(**params)
+
+                    op.instantiate_model()
+                    op.populate_model()
                 except IncompatibleDataException as e:
-                    # Data exception raised by BtmOptimizer
-                    logging.error(e)
-                    handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
-                except AssertionError as e:
-                    # An optimal solution could not be found as reported by the solver
-                    logging.error('Op Handler: {error}'.format(error=e))
-                    handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
+                    outcomes[ix] = e
+
+                    if progress is not None:
+                        progress.report('failed', month, params)
                 else:
-                    solved_op = self._save_to_solved_ops(solved_op, month, params)
-                    solved_requests.append(solved_op)
+                    ops.append((ix, op))
 
-        logging.info('Op Handler: Finished processing requested jobs.')
-        return solved_requests, handler_status
+                    if progress is not None:
+                        progress.report('built', month, params)
+
+            if solve_stacked([op for ix, op in ops]):
+                for ix, op in ops:
+                    outcomes[ix] = op
+                    self._put_cached(stack_jobs[ix][1], stack_jobs[ix][2], op)
+            else:
+                for ix, op in ops:
+                    try:
+                        op.resolve()
+                    except (pyutilib.common._exceptions.ApplicationError, IncompatibleDataException, AssertionError) as e:
+                        outcomes[ix] = e
+                    else:
+                        outcomes[ix] = op
+                        self._put_cached(stack_jobs[ix][1], stack_jobs[ix][2], op)
+
+            if progress is not None:
+                for ix, op in ops:
+                    month, op_inputs, params = stack_jobs[ix]
+                    progress.report('failed' if isinstance(outcomes[ix], Exception) else 'solved', month, params)
+
+        return outcomes
+
+    def _solve_in_workers(self, jobs, n_workers, sweep=False, progress=None):
+        """Solves the BtmOptimizer for each (month, op_inputs, params) in jobs with n_workers worker processes.
+
+        Each worker receives only the model inputs of its month, i.e., the monthly slices of the profiles and rate calendar without the metadata. In sweep mode, the parameter sets of each month are split into chunks that each update one model in place so that every worker has something to do. Returns a list with the BtmOptimizer with its results restored or the raised exception for each job; jobs not solved because progress was cancelled are None. The outcome of each job is reported to progress as the results are gathered in month order.
+        """
+        if sweep:
+            n_months = len(set(month for month, op_inputs, params in jobs))
+            n_chunks = -(-n_workers // n_months)
+            groups = []
+
+            for month, month_jobs in itertools.groupby(range(len(jobs)), key=lambda ix: jobs[ix][0]):
+                month_jobs = list(month_jobs)
+                groups.extend(month_jobs[chunk::n_chunks] for chunk in range(min(n_chunks, len(month_jobs))))
+        else:
+            groups = [[ix] for ix in range(len(jobs))]
+
+        logging.info('Op Handler: Solving {0} jobs with {1} worker processes.'.format(len(jobs), n_workers))
 
-    def _solve_model(self, op):
+        outcomes = [None]*len(jobs)
+        executor = self._executor or ProcessPoolExecutor(max_workers=n_workers)
+        futures = []
+
+        try:
+            futures = [executor.submit(_solve_btm_job, self.solver_name, _model_inputs(jobs[group[0]][1]),
+                                       [jobs[ix][2] for ix in group], sweep, self.solve_cache)
+                       for group in groups]
+
+            if executor is self._executor:
+                self._executor_futures.extend(futures)
+
+            for group, future in zip(groups, futures):
+                for ix, outcome in zip(group, future.result()):
+                    month, op_inputs, params = jobs[ix]
+
+                    if not isinstance(outcome, Exception):
+                        outcome = self._restore(op_inputs, params, outcome)
+
+                    outcomes[ix] = outcome
+
+                    if progress is not None:
+                        progress.report('failed' if isinstance(outcome, Exception) else 'solved', month, params)
+
+                if progress is not None and progress.cancelled():
+                    break
+        finally:
+            if progress is not None and progress.cancelled():
+                # Jobs that have not started are dropped.
+                for future in futures:
+                    future.cancel()
+
+            if executor is not self._executor:
+                executor.shutdown()
+
+        return outcomes
+
+    def _cache_key(self, op_inputs, params):
+        """Returns the solve cache key of the BtmOptimizer built with op_inputs and params; metadata does not affect the model and is not part of the key."""
+        return _cache_key(self.solver_name, op_inputs, params)
+
+    def _restore(self, op_inputs, params, results):
+        """Returns a BtmOptimizer built with op_inputs and params with the results of a solved model, e.g., from the solve cache or a worker process, restored."""
+        op = BtmOptimizer(**op_inputs)
         op.solver = self.solver_name
-        op.run()
+
+        if params:
+            op.set_model_parameters(**params)
+
+        for attribute, value in results.items():
+            setattr(op, attribute, value)
 
         return op
 
+    def _get_cached(self, op_inputs, params):
+        """Returns a BtmOptimizer with the results cached for op_inputs and params restored, or None if there are none."""
+        if self.solve_cache is None:
+            return None
+
+        cached_results = self.solve_cache.get(self._cache_key(op_inputs, params))
+
+        if cached_results is None:
+            return None
+
+        return self._restore(op_inputs, params, cached_results)
+
+    def _put_cached(self, op_inputs, params, op):
+        """Saves the results of the solved BtmOptimizer op to the solve cache."""
+        if self.solve_cache is not None:
+            self.solve_cache.put(self._cache_key(op_inputs, params), _get_results(op))
+
+    @staticmethod
+    def _report_error(e, month, year, handler_status):
+        """Logs the exception e raised while solving the model for month and adds its description to handler_status."""
+        if isinstance(e, pyutilib.common._exceptions.ApplicationError):
+            logging.error('Op Handler: {error}'.format(error=e))
+
+            if 'No executable found' in e.args[0]:
+                # Could not locate solver executable
+                handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
+            else:
+                handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
+        elif isinstance(e, IncompatibleDataException):
+            # Data exception raised by BtmOptimizer
+            logging.error(e)
+            handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
+        else:
+            # An optimal solution could not be found as reported by the solver
+            logging.error('Op Handler: {error}'.format(error=e))
+            handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
+
     @staticmethod
     def _save_to_solved_ops(op, month, param_set):
+        """Saves a compact record of the solved BtmOptimizer op, without its model, to solved_ops and returns its name and record."""
+        op = BtmRecord.from_optimizer(op)
+
         # time_finished = datetime.now().strftime('%A, %B %d, %Y %H:%M:%S')
         time_finished = datetime.now().strftime('%b %d, %Y %H:%M:%S')
 
@@ -171,11 +597,82 @@ class BtmOptimizerHandler:
 
         BtmOptimizerHandler.solved_ops.append(results_dict)
 
+        limit = BtmOptimizerHandler.solved_ops_limit
+
+        if limit and len(BtmOptimizerHandler.solved_ops) > limit:
+            del BtmOptimizerHandler.solved_ops[:-limit]
+
         return (name, op)
     
     def get_solved_ops(self):
-        """Returns the list of solved Optimizer objects in reverse chronological order."""
+        """Returns the list of solved Optimizer records in reverse chronological order."""
         return_list = reversed(self.solved_ops)
 
         return return_list
-    
\ No newline at end of file
+    
+
+
+def _model_inputs(op_inputs):
+    """Returns the BtmOptimizer inputs that define the model, i.e., without the metadata."""
+    return {key: value for key, value in op_inputs.items() if not key.endswith('_metadata')}
+
+
+def _cache_key(solver_name, op_inputs, params):
+    """Returns the solve cache key of the BtmOptimizer built with the given arguments; metadata does not affect the model and is not part of the key."""
+    return make_key('btm', solver_name, _model_inputs(op_inputs), params or {})
+
+
+def _get_results(op):
+    """Returns the dictionary of the results of the solved BtmOptimizer op that are cached or returned by worker processes."""
+    return {attribute: getattr(op, attribute) for attribute in BtmOptimizerHandler.CACHED_ATTRIBUTES}
+
+
+def _solve_btm_job(solver_name, model_inputs, param_list, sweep=False, solve_cache=None):
+    """Builds and solves a BtmOptimizer for each parameter set in param_list; used in a worker process.
+
+    In sweep mode, the model is built once and each subsequent parameter set is applied in place before re-solving. Parameter sets with results in solve_cache, if given, are not solved again. Returns a list with the results dictionary (see _get_results()) or the raised exception for each parameter set. Pyomo models built with rule closures cannot be pickled, so the optimizers themselves are not returned.
+    """
+    outcomes = []
+    op = None
+
+    for params in param_list:
+        if solve_cache is not None:
+            key = _cache_key(solver_name, model_inputs, params)
+            outcome = solve_cache.get(key)
+
+            if outcome is not None:
+                outcomes.append(outcome)
+                continue
+
+        try:
+            if op is None:
+                op = BtmOptimizer(**model_inputs)
+                op.solver = solver_name
+                op.sweep_mode = sweep
+
+                if params:
+                    op.set_model_parameters(**params)
+
+                try:
+                    op.instantiate_model()
+                    op.populate_model()
+                    op.resolve()
+                except Exception:
+                    # Rebuild for the next parameter set.
+                    op = None
+                    raise
+            else:
+                op.update_parameters(**params)
+                op.resolve()
+
+            outcomes.append(_get_results(op))
+
+            if not sweep:
+                op = None
+        except (pyutilib.common._exceptions.ApplicationError, IncompatibleDataException, AssertionError) as e:
+            outcomes.append(e)
+        else:
+            if solve_cache is not None:
+                solve_cache.put(key, outcomes[-1])
+
+    return outcomes
@@ -417,8 +417,8 @@ class BtmCostSavingsReportScreen(ReportScreen):
             solved_op = op[1]
             results = solved_op.results
 
-            pfpk_with_es = solved_op.model.pfpk.value
-            pfpk_without_es = max(solved_op.model.pnet)
+            pfpk_with_es = solved_op.peak_demand_with_es
+            pfpk_without_es = solved_op.peak_demand_without_es
 
             bar_group = [['without ES', rgba_to_fraction(colors[0]), int(pfpk_without_es)]]
             bar_group.append(['with ES', rgba_to_fraction(colors[1]), int(pfpk_with_es)])
@@ -432,7 +432,7 @@ class BtmCostSavingsReportScreen(ReportScreen):
         report_templates = [
         ]
 
-        if all(op[1].model.flt_dr == 0 for op in self.chart_data):
+        if all(op[1].flat_demand_rate == 0 for op in self.chart_data):
             report_templates.append("For this rate structure, there were no flat demand charges.")
 
         self.desc.text += ' '.join(report_templates)
@@ -598,8 +598,8 @@ class BtmCostSavingsGenerateReportMenu(ModalView):
         executive_summary_strings.append(demand_charge_summary)
         demand_charge_strings = []
 
-        peak_demand_without_es = max(max(op[1].model.pnet for op in chart_data))
-        peak_demand_with_es = max(op[1].model.pfpk.value for op in chart_data)
+        peak_demand_without_es = max(op[1].peak_demand_without_es for op in chart_data)
+        peak_demand_with_es = max(op[1].peak_demand_with_es for op in chart_data)
 
         demand_charge_strings.append("Without energy storage, the peak demand observed during the evaluation period was <b>{peak_demand_without_es:.2f} kW</b>. By adding energy storage, this value was changed to <b>{peak_demand_with_es:.2f} kW</b>.".format(
             peak_demand_without_es=peak_demand_without_es,
@@ -9,6 +9,7 @@ from kivy.app import App
 from es_gui.tools.valuation.valuation_dms import ValuationDMS
 from es_gui.resources.widgets.common import WarningPopup, NavigationButton
 from es_gui.proving_grounds.help_carousel import HelpCarouselModalView
+from es_gui.tools.solve_cache import SolveCache
 from .op_handler import ValuationOptimizerHandler
 
 
@@ -26,6 +27,24 @@ class ValuationHomeScreen(Screen):
                                 home_path='data')
         self.handler = ValuationOptimizerHandler(App.get_running_app().config.get('optimization', 'solver'))
         self.handler.dms = self.dms
+        self.configure_handler()
+
+        if App.get_running_app().config.getint('optimization', 'solve_cache'):
+            self.handler.solve_cache = SolveCache('solve_cache',
+                                                  max_size=App.get_running_app().config.getint('optimization', 'solve_cache_size')*1000000)
+
+        ValuationOptimizerHandler.solved_ops_limit = App.get_running_app().config.getint('optimization', 'solved_ops_limit')
+
+    def configure_handler(self):
+        """Applies the current optimization settings to the handler and returns it."""
+        config = App.get_running_app().config
+
+        self.handler.solver_name = config.get('optimization', 'solver')
+        self.handler.n_workers = config.getint('optimization', 'n_workers')
+        self.handler.stack_size = config.getint('optimization', 'stack_size')
+        self.handler.backend = config.get('valuation', 'valuation_backend')
+
+        return self.handler
 
     def on_enter(self):
         ab = self.manager.nav_bar
@@ -3,20 +3,29 @@ from __future__ import absolute_import
 import logging
 from datetime import datetime
 import calendar
+from concurrent.futures import ProcessPoolExecutor
 import pyutilib
 
-from kivy.clock import mainthread
-
-from es_gui.tools.valuation.valuation_optimizer import ValuationOptimizer, BadParameterException, IncompatibleDataException
+from es_gui.tools.optimizer import solve_stacked
+from es_gui.tools.progress import RunProgress
+from es_gui.tools.solve_cache import make_key
+from es_gui.tools.valuation.valuation_optimizer import ValuationOptimizer, ValuationRecord, BadParameterException, IncompatibleDataException
 
 
 class ValuationOptimizerHandler:
     """A handler for creating and solving ValuationOptimizer instances as requested."""
     dms = None
+    solve_cache = None
     solved_ops = []
 
-    def __init__(self, solver_name):
+    # The maximum number of records kept in solved_ops; the oldest are discarded first. Unlimited if None or 0.
+    solved_ops_limit = None
+
+    def __init__(self, solver_name, n_workers=1, backend='pyomo', stack_size=1):
         self._solver_name = solver_name
+        self._n_workers = n_workers
+        self._backend = backend
+        self._stack_size = stack_size
 
     @property
     def solver_name(self):
@@ -27,10 +36,45 @@ class ValuationOptimizerHandler:
     def solver_name(self, value):
         self._solver_name = value
 
-    def process_requests(self, requests, *args):
-        """Generates and solves ValuationOptimizer models based on the given requests."""
-        dms = self.dms
+    @property
+    def n_workers(self):
+        """The number of worker processes used to solve models; models are solved in-process if less than two."""
+        return self._n_workers
+
+    @n_workers.setter
+    def n_workers(self, value):
+        try:
+            self._n_workers = max(int(value), 1)
+        except (TypeError, ValueError):
+            raise ValueError('n_workers must be a positive integer.')
+
+    @property
+    def stack_size(self):
+        """The maximum number of independent models stacked into one block-diagonal model per solver call; models are solved one at a time if less than two."""
+        return self._stack_size
+
+    @stack_size.setter
+    def stack_size(self, value):
+        try:
+            self._stack_size = max(int(value), 1)
+        except (TypeError, ValueError):
+            raise ValueError('stack_size must be a positive integer.')
 
+    @property
+    def backend(self):
+        """The ValuationOptimizer model building backend, 'pyomo', 'matrix', or 'dp'."""
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        self._backend = value
+
+    def process_requests(self, requests, *args, progress_callback=None, cancel_event=None):
+        """Generates and solves ValuationOptimizer models based on the given requests.
+
+        :param progress_callback: A callable that receives an event as each model is solved or fails; see RunProgress.
+        :param cancel_event: A threading.Event; once set, no further models are solved and the models solved so far are returned.
+        """
         iso = requests['iso']
         market_type = requests['market type']
         node_id = str(requests['node id'])
@@ -41,113 +85,224 @@ class ValuationOptimizerHandler:
 
         handler_status = set()
 
+        # Parameter sweeps over the same model parameters reuse one model per month when possible.
+        sweep = self._is_sweep(param_set)
+
+        # Build the list of jobs in request order; each job is a month of data and a list of parameter sets to solve.
+        jobs = []
+
         for month, year in requests['months']:
-            param_set_iterator = iter(param_set)
-            continue_param_loop = True
+            op_inputs = self._get_op_inputs(iso, year, month, node_id, node_name)
 
-            while continue_param_loop:
-                try:
-                    params = next(param_set_iterator)
-                except StopIteration:
-                    break
+            if sweep:
+                jobs.append((month, year, op_inputs, list(param_set)))
+            else:
+                param_set_iterator = iter(param_set)
+                continue_param_loop = True
 
-                op = ValuationOptimizer(market_type=market_type)
-
-                if iso == 'PJM':
-                    #lmp_da, RUP, RDW, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_name)
-                    lmp_da, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_id)
-
-                    op.price_electricity = lmp_da
-                    op.mileage_mult = MR
-                    # op.mileage_slow = RA
-                    # op.mileage_fast = RD
-                    op.price_regulation = RegCCP
-                    op.price_reg_service = RegPCP
-                    #op.fraction_reg_up = RUP
-                    #op.fraction_reg_down = RDW
-                elif iso == 'ERCOT':
-                    lmp_da, rd, ru = dms.get_ercot_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    op.price_reg_up = ru
-                    op.price_reg_down = rd
-                elif iso == 'MISO':
-                    lmp_da, regMCP = dms.get_miso_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    # op.price_reg_service = regMCP
-                    op.price_regulation = regMCP
-                elif iso == 'ISONE':
-                    daLMP, RegCCP, RegPCP, miMULT = dms.get_isone_data(year, month, node_id)
-
-                    op.price_electricity = daLMP
-                    op.price_regulation = RegCCP
-                    op.price_reg_service = RegPCP
-                    op.mileage_mult = miMULT
-                ########################################################################################################
-                elif iso == 'NYISO':
-                    lbmp_da, rcap_da = dms.get_nyiso_data(year, month, node_id)
-
-                    op.price_electricity = lbmp_da
-                    op.price_regulation = rcap_da
-                elif iso == 'SPP':
-                    lmp_da, mcpru_da, mcprd_da = dms.get_spp_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    op.price_reg_up = mcpru_da
-                    op.price_reg_down = mcprd_da
-                elif iso == 'CAISO':
-                    lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = dms.get_caiso_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    op.price_reg_up = aspru_da
-                    op.price_reg_down = asprd_da
-                    op.price_reg_serv_up = asprmu_da
-                    op.price_reg_serv_down = asprmd_da
-                    op.mileage_mult_ru = rmu_mm
-                    op.mileage_mult_rd = rmd_mm
-                    op.perf_score_ru = rmu_pacc # TODO: give the option to the user to override this
-                    op.perf_score_rd = rmd_pacc
-                else:
-                    logging.error('ValOp Handler: Invalid ISO provided.')
-                    raise ValueError('Invalid ISO provided to ValuationOptimizer handler.')
+                while continue_param_loop:
+                    try:
+                        params = next(param_set_iterator)
+                    except StopIteration:
+                        break
 
-                if params:
-                    op.set_model_parameters(**params)
-                else:
-                    continue_param_loop = False
+                    if not params:
+                        continue_param_loop = False
 
-                try:
-                    solved_op = self._solve_model(op)
-                except pyutilib.common._exceptions.ApplicationError as e:
-                    logging.error('Op Handler: {error}'.format(error=e))
+                    jobs.append((month, year, op_inputs, [params]))
 
-                    if 'No executable found' in e.args[0]:
-                        # Could not locate solver executable
-                        handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
-                    else:
-                        handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
-                except IncompatibleDataException as e:
-                    # Data exception raised by ValuationOptimizer
-                    logging.error(e)
-                    handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
-                except AssertionError as e:
-                    # An optimal solution could not be found as reported by the solver
-                    logging.error('Op Handler: {error}'.format(error=e))
-                    handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
+        # Persist the data loaded for this batch once instead of on every insert.
+        self.dms.save_state()
+
+        progress = RunProgress(sum(len(param_list) for month, year, op_inputs, param_list in jobs),
+                               callback=progress_callback, cancel_event=cancel_event)
+
+        # No more worker processes than models.
+        n_workers = min(self.n_workers, progress.total)
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+
+        if sweep and executor is not None:
+            # Split each month's sweep into contiguous chunks so that every worker has something to do and the outcomes stay in parameter order.
+            n_chunks = -(-n_workers // len(jobs))
+            chunk_jobs = []
+
+            for month, year, op_inputs, param_list in jobs:
+                n = min(n_chunks, len(param_list))
+                chunk_jobs.extend((month, year, op_inputs, param_list[len(param_list)*ix//n:len(param_list)*(ix + 1)//n])
+                                  for ix in range(n))
+
+            jobs = chunk_jobs
+
+        # Independent jobs are stacked into block-diagonal models to share the fixed cost of each solver call.
+        stack_size = self.stack_size if self.backend == 'pyomo' and not sweep else 1
+
+        if executor is not None:
+            # Keep every worker busy.
+            stack_size = min(stack_size, -(-len(jobs) // n_workers))
+
+        futures = []
+
+        try:
+            if stack_size > 1:
+                stacks = [jobs[ix:ix + stack_size] for ix in range(0, len(jobs), stack_size)]
+                logging.info('Op Handler: Solving {0} jobs in {1} stacked models.'.format(len(jobs), len(stacks)))
+
+                stack_jobs = [[(op_inputs, param_list[0]) for month, year, op_inputs, param_list in stack] for stack in stacks]
+
+                if executor is not None:
+                    futures = [executor.submit(_solve_valuation_stack, market_type, self.solver_name, stack_job, self.solve_cache)
+                               for stack_job in stack_jobs]
+                    stack_outcomes = (future.result() for future in futures)
                 else:
-                    solved_op = self._save_to_solved_ops(solved_op, iso, market_type, node_name,
-                                                        year, month, params)
-                    solved_requests.append(solved_op)
+                    stack_outcomes = (_solve_valuation_stack(market_type, self.solver_name, stack_job, self.solve_cache)
+                                      for stack_job in stack_jobs)
+
+                job_outcomes = ([outcome] for outcomes in stack_outcomes for outcome in outcomes)
+            elif executor is not None:
+                logging.info('Op Handler: Solving {0} jobs with {1} worker processes.'.format(len(jobs), n_workers))
+
+                futures = [executor.submit(_solve_valuation_job, market_type, self.solver_name, self.backend, op_inputs, param_list, sweep, self.solve_cache)
+                           for month, year, op_inputs, param_list in jobs]
+                job_outcomes = (future.result() for future in futures)
+            else:
+                job_outcomes = (_solve_valuation_job(market_type, self.solver_name, self.backend, op_inputs, param_list, sweep, self.solve_cache)
+                                for month, year, op_inputs, param_list in jobs)
+
+            # Collect outcomes in submission order so that solved_ops is deterministic.
+            for (month, year, op_inputs, param_list), outcomes in zip(jobs, job_outcomes):
+                label = ' '.join([calendar.month_abbr[int(month)], year])
+
+                for params, outcome in zip(param_list, outcomes):
+                    solved_op = None
+
+                    try:
+                        if isinstance(outcome, Exception):
+                            raise outcome
+
+                        results, gross_revenue = outcome
+                        solved_op = ValuationRecord(results, market_type=market_type, gross_revenue=gross_revenue)
+                    except pyutilib.common._exceptions.ApplicationError as e:
+                        logging.error('Op Handler: {error}'.format(error=e))
+
+                        if 'No executable found' in e.args[0]:
+                            # Could not locate solver executable
+                            handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
+                        else:
+                            handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
+                    except IncompatibleDataException as e:
+                        # Data exception raised by ValuationOptimizer
+                        logging.error(e)
+                        handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
+                    except AssertionError as e:
+                        # An optimal solution could not be found as reported by the solver
+                        logging.error('Op Handler: {error}'.format(error=e))
+                        handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
+                    else:
+                        solved_op = self._save_to_solved_ops(solved_op, iso, market_type, node_name,
+                                                            year, month, params)
+                        solved_requests.append(solved_op)
+
+                    progress.report('solved' if solved_op is not None else 'failed', label, params)
+
+                if progress.cancelled() and progress.completed < progress.total:
+                    logging.info('Op Handler: Cancelled after {0} of {1} models.'.format(progress.completed, progress.total))
+                    handler_status.add('* The run was cancelled; only the models solved before then are included.')
+                    break
+        finally:
+            if progress.cancelled():
+                # Jobs that have not started are dropped.
+                for future in futures:
+                    future.cancel()
+
+            if executor is not None:
+                executor.shutdown()
+
+            if self.solve_cache is not None:
+                self.solve_cache.evict()
 
         logging.info('Op Handler: Finished processing requested jobs.')
         return solved_requests, handler_status
 
-    def _solve_model(self, op):
-        op.solver = self.solver_name
-        op.run()
+    def _is_sweep(self, param_set):
+        """Returns True if param_set can be solved by updating one model in place, i.e., every entry sets the same mutable parameters."""
+        if self.backend != 'pyomo' or len(param_set) < 2 or not all(param_set):
+            return False
+
+        keys = set(param_set[0])
 
-        return op
+        return keys <= ValuationOptimizer.SWEEP_PARAMS and all(set(params) == keys for params in param_set)
+
+    def _get_op_inputs(self, iso, year, month, node_id, node_name):
+        """Retrieves the time series data for the given ISO, month, and node as ValuationOptimizer keyword arguments."""
+        dms = self.dms
+
+        if iso == 'PJM':
+            #lmp_da, RUP, RDW, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_name)
+            lmp_da, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_id)
+
+            op_inputs = {'price_electricity': lmp_da,
+                         'mileage_mult': MR,
+                         'price_regulation': RegCCP,
+                         'price_reg_service': RegPCP,
+                         }
+            # mileage_slow = RA
+            # mileage_fast = RD
+            # fraction_reg_up = RUP
+            # fraction_reg_down = RDW
+        elif iso == 'ERCOT':
+            lmp_da, rd, ru = dms.get_ercot_data(year, month, node_name)
+
+            op_inputs = {'price_electricity': lmp_da,
+                         'price_reg_up': ru,
+                         'price_reg_down': rd,
+                         }
+        elif iso == 'MISO':
+            lmp_da, regMCP = dms.get_miso_data(year, month, node_name)
+
+            op_inputs = {'price_electricity': lmp_da,
+                         'price_regulation': regMCP,
+                         }
+            # price_reg_service = regMCP
+        elif iso == 'ISONE':
+            daLMP, RegCCP, RegPCP, miMULT = dms.get_isone_data(year, month, node_id)
+
+            op_inputs = {'price_electricity': daLMP,
+                         'price_regulation': RegCCP,
+                         'price_reg_service': RegPCP,
+                         'mileage_mult': miMULT,
+                         }
+        ########################################################################################################
+        elif iso == 'NYISO':
+            lbmp_da, rcap_da = dms.get_nyiso_data(year, month, node_id)
+
+            op_inputs = {'price_electricity': lbmp_da,
+                         'price_regulation': rcap_da,
+                         }
+        elif iso == 'SPP':
+            lmp_da, mcpru_da, mcprd_da = dms.get_spp_data(year, month, node_name)
+
+            op_inputs = {'price_electricity': lmp_da,
+                         'price_reg_up': mcpru_da,
+                         'price_reg_down': mcprd_da,
+                         }
+        elif iso == 'CAISO':
+            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = dms.get_caiso_data(year, month, node_name)
+
+            op_inputs = {'price_electricity': lmp_da,
+                         'price_reg_up': aspru_da,
+                         'price_reg_down': asprd_da,
+                         'price_reg_serv_up': asprmu_da,
+                         'price_reg_serv_down': asprmd_da,
+                         'mileage_mult_ru': rmu_mm,
+                         'mileage_mult_rd': rmd_mm,
+                         'perf_score_ru': rmu_pacc,  # TODO: give the option to the user to override this
+                         'perf_score_rd': rmd_pacc,
+                         }
+        else:
+            logging.error('ValOp Handler: Invalid ISO provided.')
+            raise ValueError('Invalid ISO provided to ValuationOptimizer handler.')
+
+        return op_inputs
 
     @staticmethod
     def _save_to_solved_ops(op, iso, market_type, node_name, year, month, param_set):
@@ -171,14 +326,118 @@ class ValuationOptimizerHandler:
 
         ValuationOptimizerHandler.solved_ops.append(results_dict)
 
+        limit = ValuationOptimizerHandler.solved_ops_limit
+
+        if limit and len(ValuationOptimizerHandler.solved_ops) > limit:
+            del ValuationOptimizerHandler.solved_ops[:-limit]
+
         return (name, op)
     
     def get_solved_ops(self):
-        """Returns the list of solved Optimizer objects in reverse chronological order."""
+        """Returns the list of solved Optimizer records in reverse chronological order."""
         return_list = reversed(self.solved_ops)
 
         return return_list
 
+
+def _cache_key(market_type, solver_name, backend, op_inputs, params):
+    """Returns the solve cache key of the ValuationOptimizer built with the given arguments."""
+    return make_key('valuation', market_type, solver_name, backend, op_inputs, params or {})
+
+
+def _solve_valuation_job(market_type, solver_name, backend, op_inputs, param_list, sweep=False, solve_cache=None):
+    """Builds and solves a ValuationOptimizer for each parameter set in param_list; used in-process or in a worker process.
+
+    In sweep mode, the model is built once and each subsequent parameter set is applied in place before re-solving. Parameter sets with results in solve_cache, if given, are not solved again. Returns a list with the (results, gross_revenue) tuple or the raised exception for each parameter set. Pyomo models built with rule closures cannot be pickled, so the optimizers themselves are not returned.
+    """
+    outcomes = []
+    op = None
+
+    for params in param_list:
+        if solve_cache is not None:
+            key = _cache_key(market_type, solver_name, backend, op_inputs, params)
+            outcome = solve_cache.get(key)
+
+            if outcome is not None:
+                outcomes.append(outcome)
+                continue
+
+        try:
+            if op is None:
+                op = ValuationOptimizer(market_type=market_type, solver=solver_name, backend=backend, **op_inputs)
+                op.sweep_mode = sweep
+
+                if params:
+                    op.set_model_parameters(**params)
+
+                try:
+                    outcomes.append(op.run())
+                except Exception:
+                    # Rebuild for the next parameter set.
+                    op = None
+                    raise
+
+                if not sweep:
+                    op = None
+            else:
+                op.update_parameters(**params)
+                outcomes.append(op.resolve())
+        except (pyutilib.common._exceptions.ApplicationError, IncompatibleDataException, AssertionError) as e:
+            outcomes.append(e)
+        else:
+            if solve_cache is not None:
+                solve_cache.put(key, outcomes[-1])
+
+    return outcomes
+
+
+def _solve_valuation_stack(market_type, solver_name, stack_job, solve_cache=None):
+    """Builds a ValuationOptimizer for each (op_inputs, params) pair in stack_job and solves them together as one block-diagonal model; used in-process or in a worker process.
+
+    If the stacked model cannot be solved to optimality, e.g., because one of the models is infeasible, each model is solved individually so that its outcome can be reported. Pairs with results in solve_cache, if given, are not solved again. Returns a list with the (results, gross_revenue) tuple or the raised exception for each pair.
+    """
+    outcomes = [None]*len(stack_job)
+    ops = []
+
+    for ix, (op_inputs, params) in enumerate(stack_job):
+        if solve_cache is not None:
+            outcomes[ix] = solve_cache.get(_cache_key(market_type, solver_name, 'pyomo', op_inputs, params))
+
+            if outcomes[ix] is not None:
+                continue
+
+        try:
+            op = ValuationOptimizer(market_type=market_type, solver=solver_name, **op_inputs)
+
+            if params:
+                op.set_model_parameters(**params)
+
+            op.instantiate_model()
+            op.populate_model()
+        except IncompatibleDataException as e:
+            outcomes[ix] = e
+        else:
+            ops.append((ix, op))
+
+    if solve_stacked([op for ix, op in ops]):
+        for ix, op in ops:
+            outcomes[ix] = op.get_results()
+    else:
+        for ix, op in ops:
+            try:
+                outcomes[ix] = op.resolve()
+            except (pyutilib.common._exceptions.ApplicationError, IncompatibleDataException, AssertionError) as e:
+                outcomes[ix] = e
+
+    if solve_cache is not None:
+        for ix, op in ops:
+            if not isinstance(outcomes[ix], Exception):
+                op_inputs, params = stack_job[ix]
+                solve_cache.put(_cache_key(market_type, solver_name, 'pyomo', op_inputs, params), outcomes[ix])
+
+    return outcomes
+
+
 if __name__ == '__main__':
     with open('valuation_optimizer.log', 'w'):
         pass
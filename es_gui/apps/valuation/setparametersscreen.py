@@ -97,10 +97,7 @@ class SetParametersScreen(Screen):
             popup.popup_text.text = str(e)
             popup.open()
         else:
-            solver_name = App.get_running_app().config.get('optimization', 'solver')
-
-            handler = self.manager.get_screen('valuation_home').handler
-            handler.solver_name = solver_name
+            handler = self.manager.get_screen('valuation_home').configure_handler()
 
             try:
                 _, handler_status = handler.process_requests(requests)
@@ -65,9 +65,7 @@ class ValuationScreen(Screen):
             self.pw.title = 'Running optimization'
             self.pw.run_button.disabled = True
 
-            solver_name = App.get_running_app().config.get('optimization', 'solver')
-            handler = self.manager.get_screen('valuation_home').handler
-            handler.solver_name = solver_name
+            handler = self.manager.get_screen('valuation_home').configure_handler()
             handler.process_requests(requests)
 
             self.pw.update_window('Finished!', 100, anim_duration=0)
@@ -27,7 +27,7 @@ from kivy.uix.modalview import ModalView
 from kivy.uix.textinput import TextInput
 
 from es_gui.apps.valuation.reporting import ValuationReport
-from es_gui.resources.widgets.common import MyPopup, WarningPopup, WizardCompletePopup, TileButton, RecycleViewRow, BASE_TRANSITION_DUR, BUTTON_FLASH_DUR, ANIM_STAGGER,FADEIN_DUR, SLIDER_DUR, fade_in_animation
+from es_gui.resources.widgets.common import MyPopup, WarningPopup, WizardCompletePopup, WizardExecuteScreen, TileButton, RecycleViewRow, BASE_TRANSITION_DUR, BUTTON_FLASH_DUR, ANIM_STAGGER,FADEIN_DUR, SLIDER_DUR, fade_in_animation
 
 
 class ValuationWizard(Screen):
@@ -914,7 +914,7 @@ class ValuationWizardSelectionSummary(Screen):
         self.manager.current = 'execute'
 
 
-class ValuationWizardExecute(Screen):
+class ValuationWizardExecute(WizardExecuteScreen):
     """The screen for executing the prescribed optimizations for the valuation wizard."""
     solved_ops = []
     report_attributes = {}
@@ -923,6 +923,8 @@ class ValuationWizardExecute(Screen):
         self.execute_run()
 
     def on_leave(self):
+        super(ValuationWizardExecute, self).on_leave()
+
         self.progress_label.text = 'This may take a while. Please wait patiently!'
 
     def execute_run(self):
@@ -950,9 +952,31 @@ class ValuationWizardExecute(Screen):
                                          for param in device}]
 
         # Send requests to ValOp handler.
-        valop_handler = valuation_home.handler
-        valop_handler.solver_name = App.get_running_app().config.get('optimization', 'solver')
-        self.solved_ops, handler_status = valop_handler.process_requests(handler_requests)
+        valop_handler = valuation_home.configure_handler()
+
+        # Save selection summary details to pass to report generator.
+        deviceSelectionButtons = self.manager.get_screen('device_select').device_select.children
+        selectedDeviceName = [x.text for x in deviceSelectionButtons if x.state == "down"][0]
+
+        self.report_attributes = {'market area': iso,
+                                  'pricing node': node,
+                                  'selected device': selectedDeviceName,
+                                  'dates analyzed': ' to '.join([
+                                      ' '.join([calendar.month_name[int(hist_data[0]['month'])], hist_data[0]['year']]),
+                                      ' '.join([calendar.month_name[int(hist_data[-1]['month'])], hist_data[-1]['year']]),
+                                      ]),
+                                  'revenue streams': wiz_selections['rev_streams'],
+                                  'market type': rev_streams,
+                                 }
+
+        for param in device:
+            self.report_attributes[param.desc['attr name']] = param.param_slider.value
+
+        self.start_run(valop_handler, handler_requests)
+
+    def finish_run(self, solved_ops, handler_status):
+        """Shows the outcome of the run and proceeds to the report."""
+        self.solved_ops = solved_ops
 
         popup = WizardCompletePopup()
 
@@ -983,24 +1007,6 @@ class ValuationWizardExecute(Screen):
         popup.bind(on_dismiss=self._next_screen)
         popup.open()
 
-        # Save selection summary details to pass to report generator.
-        deviceSelectionButtons = self.manager.get_screen('device_select').device_select.children
-        selectedDeviceName = [x.text for x in deviceSelectionButtons if x.state == "down"][0]
-
-        self.report_attributes = {'market area': iso,
-                                  'pricing node': node,
-                                  'selected device': selectedDeviceName,
-                                  'dates analyzed': ' to '.join([
-                                      ' '.join([calendar.month_name[int(hist_data[0]['month'])], hist_data[0]['year']]),
-                                      ' '.join([calendar.month_name[int(hist_data[-1]['month'])], hist_data[-1]['year']]),
-                                      ]),
-                                  'revenue streams': wiz_selections['rev_streams'],
-                                  'market type': rev_streams,
-                                 }
-
-        for param in device:
-            self.report_attributes[param.desc['attr name']] = param.param_slider.value
-
     def _next_screen(self, *args):
         """Adds the report screen if it does not exist and changes screens to it."""
         report = ValuationReport(name='report', chart_data=self.solved_ops, market=self.report_attributes['market type'], report_attributes=self.report_attributes)
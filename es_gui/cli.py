@@ -0,0 +1,422 @@
+"""
+A headless command-line batch runner for valuation and behind-the-meter (BTM) studies.
+
+Jobs are described by a JSON (or YAML, if PyYAML is installed) job spec and solved with ValuationOptimizerHandler or BtmOptimizerHandler without importing Kivy. The results DataFrame of each solved model is written to a .csv file in the output directory along with a summary.csv of every solved model.
+
+A valuation job spec::
+
+    {
+        "type": "valuation",
+        "iso": "PJM",
+        "market type": "pjm_pfp",
+        "nodes": ["51217"],
+        "months": [[1, 2019], [2, 2019]],
+        "params": {"Energy_capacity": 8},
+        "param grid": {"Power_rating": [1, 2, 4]}
+    }
+
+A BTM job spec::
+
+    {
+        "type": "btm",
+        "rate structure": "data/rate_structures/my_rate.json",
+        "load profile": "data/load/commercial/.../profile.csv",
+        "pv profile": "data/pv/my_pv_profile.json",
+        "param grid": {"Power_rating": {"min": 50, "max": 200, "num": 4}}
+    }
+
+A BTM portfolio job spec solves every combination of rate structures, load profiles, and PV profiles; each entry is a file or a directory of files::
+
+    {
+        "type": "btm portfolio",
+        "rate structures": "data/rate_structures",
+        "load profiles": ["data/load/commercial", "data/load/imported/my_building.csv"],
+        "pv profiles": ["data/pv/my_pv_profile.json"],
+        "params": {"Power_rating": 100, "Energy_capacity": 400}
+    }
+
+Its summary.csv is a table of the bills with and without energy storage of every month of every combination; the results of each model are not written.
+
+Parameter grid entries are either lists of values or {"min", "max", "num"} ranges, and the cross product of every entry, each combined with "params", is solved. Alternatively, "param set" gives the list of parameter dictionaries to solve explicitly. The "pv profile" (or "pv profiles") is optional, as are the "year" of the BTM rate calendar (2019 by default) and the "timestep" of the BTM models in minutes (15, 30, or 60; 60 by default). The "solver", "n workers", "stack size", and "backend" (valuation only) of the handler may also be given in the job spec; the command-line options take precedence.
+
+Usage::
+
+    quest-batch job.json --out results --solver glpk
+"""
+from __future__ import absolute_import
+
+import argparse
+import calendar
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from es_gui.tools.solve_cache import SolveCache
+
+
+class JobSpecError(Exception):
+    pass
+
+
+def load_job_spec(path):
+    """Reads the job spec at path; YAML job specs (.yml/.yaml) require PyYAML."""
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in ('.yml', '.yaml'):
+            try:
+                import yaml
+            except ImportError:
+                raise JobSpecError('PyYAML is required to read YAML job specs; install it or use a JSON job spec.')
+
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if not isinstance(spec, dict):
+        raise JobSpecError('The job spec must be a mapping of job settings.')
+
+    return spec
+
+
+def get_param_set(spec):
+    """Returns the list of parameter dictionaries to solve for the job spec."""
+    if 'param set' in spec:
+        return [dict(params) for params in spec['param set']] or [None]
+
+    base_params = dict(spec.get('params', {}))
+    param_grid = spec.get('param grid', {})
+
+    if not param_grid:
+        return [base_params or None]
+
+    names = sorted(param_grid)
+    values = []
+
+    for name in names:
+        grid_values = param_grid[name]
+
+        if isinstance(grid_values, dict):
+            try:
+                grid_values = np.linspace(float(grid_values['min']), float(grid_values['max']), num=int(grid_values['num'])).tolist()
+            except KeyError as e:
+                raise JobSpecError('The range for "{0}" in the parameter grid is missing {1}.'.format(name, e))
+
+        values.append([float(value) for value in grid_values])
+
+    return [dict(base_params, **dict(zip(names, combination))) for combination in itertools.product(*values)]
+
+
+def _require(spec, key):
+    try:
+        return spec[key]
+    except KeyError:
+        raise JobSpecError('The job spec is missing "{0}".'.format(key))
+
+
+def _get_months(spec):
+    """Returns the list of (month, year) string tuples of a valuation job spec; months may be given as [month, year] pairs or as month numbers with "year"."""
+    months = []
+
+    for entry in _require(spec, 'months'):
+        if isinstance(entry, (list, tuple)):
+            month, year = entry
+        else:
+            month, year = entry, _require(spec, 'year')
+
+        months.append((str(int(month)), str(int(year))))
+
+    return months
+
+
+def _param_columns(entries):
+    """Returns the sorted names of the parameters set in any of the solved_ops entries."""
+    return sorted(set(name for entry in entries for name in entry.get('params', {})))
+
+
+def _write_results(out_dir, fname, record):
+    record.results.to_csv(os.path.join(out_dir, fname), index=False)
+
+    return fname
+
+
+def _write_summary(out_dir, columns, rows):
+    fpath = os.path.join(out_dir, 'summary.csv')
+
+    with open(fpath, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    return fpath
+
+
+def run_valuation_job(spec, out_dir, solver_name, n_workers=1, stack_size=1, backend='pyomo', data_bank='data', solve_cache=None):
+    """Solves the valuation job spec and writes the results to out_dir.
+
+    :return: A tuple of the number of models solved and the set of issues reported by the handler.
+    """
+    from es_gui.apps.valuation.op_handler import ValuationOptimizerHandler
+    from es_gui.tools.valuation.valuation_dms import ValuationDMS
+
+    iso = _require(spec, 'iso')
+    market_type = _require(spec, 'market type')
+    nodes = spec.get('nodes', [spec['node id']] if 'node id' in spec else None)
+
+    if not nodes:
+        raise JobSpecError('The job spec is missing "nodes".')
+
+    months = _get_months(spec)
+    param_set = get_param_set(spec)
+
+    handler = ValuationOptimizerHandler(solver_name, n_workers=n_workers, backend=backend, stack_size=stack_size)
+    handler.dms = ValuationDMS(home_path=data_bank, save_name='valuation_dms.p')
+    handler.solve_cache = solve_cache
+    # The records of every solved model are needed for the summary.
+    ValuationOptimizerHandler.solved_ops_limit = None
+
+    # The daily MISO and NYISO files hold every node; parse them once per month for all of the nodes in the batch.
+    bulk_loaders = {'MISO': handler.dms.get_miso_data_bulk, 'NYISO': handler.dms.get_nyiso_data_bulk}
+
+    if iso in bulk_loaders and len(nodes) > 1:
+        for month, year in months:
+            bulk_loaders[iso](year, month, [str(node_id) for node_id in nodes])
+
+    handler_status = set()
+    entries = []
+
+    for node_id in nodes:
+        requests = {'iso': iso,
+                    'market type': market_type,
+                    'months': months,
+                    'node id': str(node_id),
+                    'param set': param_set,
+                    }
+
+        n_solved_ops = len(ValuationOptimizerHandler.solved_ops)
+        solved_requests, node_status = handler.process_requests(requests)
+
+        entries.extend(ValuationOptimizerHandler.solved_ops[n_solved_ops:])
+        handler_status |= node_status
+
+    param_columns = _param_columns(entries)
+    rows = []
+
+    for ix, entry in enumerate(entries):
+        record = entry['optimizer']
+        month = list(calendar.month_name).index(entry['month'])
+        fname = '{0}_{1}_{2}_{3:02d}_{4:04d}.csv'.format(iso, entry['node'], entry['year'], month, ix)
+
+        row = {'iso': iso, 'node': entry['node'], 'year': entry['year'], 'month': month, 'market type': market_type}
+        row.update({name: entry.get('params', {}).get(name, '') for name in param_columns})
+        row['gross revenue'] = record.gross_revenue
+        row['results file'] = _write_results(out_dir, fname, record)
+
+        rows.append(row)
+
+    _write_summary(out_dir, ['iso', 'node', 'year', 'month', 'market type'] + param_columns + ['gross revenue', 'results file'], rows)
+
+    return len(entries), handler_status
+
+
+def _profile_metadata(path):
+    """Returns the profile metadata used by the cost savings wizard for the profile at path."""
+    if not path:
+        return {}
+
+    return {'name': os.path.splitext(os.path.basename(path))[0], 'path': path}
+
+
+def run_btm_job(spec, out_dir, solver_name, n_workers=1, stack_size=1, data_bank='data', solve_cache=None):
+    """Solves the BTM job spec and writes the results to out_dir.
+
+    :return: A tuple of the number of models solved and the set of issues reported by the handler.
+    """
+    from es_gui.apps.btm.op_handler import BtmOptimizerHandler
+    from es_gui.tools.btm.btm_dms import BtmDMS
+
+    with open(_require(spec, 'rate structure')) as f:
+        rate_structure = json.load(f)
+
+    op_handler_requests = {'rate_structure': rate_structure,
+                           'load_profile': _profile_metadata(_require(spec, 'load profile')),
+                           'pv_profile': _profile_metadata(spec.get('pv profile')),
+                           'params': [params or {} for params in get_param_set(spec)],
+                           }
+
+    for key in ('year', 'timestep'):
+        if key in spec:
+            op_handler_requests[key] = int(spec[key])
+
+    handler = BtmOptimizerHandler(solver_name, n_workers=n_workers, stack_size=stack_size)
+    handler.dms = BtmDMS(home_path=data_bank, save_name='btm_dms.p')
+    handler.solve_cache = solve_cache
+    # The records of every solved model are needed for the summary.
+    BtmOptimizerHandler.solved_ops_limit = None
+
+    n_solved_ops = len(BtmOptimizerHandler.solved_ops)
+    solved_requests, handler_status = handler.process_requests(op_handler_requests)
+    entries = BtmOptimizerHandler.solved_ops[n_solved_ops:]
+
+    param_columns = _param_columns(entries)
+    rows = []
+
+    for ix, entry in enumerate(entries):
+        record = entry['optimizer']
+        month = list(calendar.month_abbr).index(entry['month'])
+        fname = 'btm_{0:02d}_{1:04d}.csv'.format(month, ix)
+
+        row = {'rate structure': rate_structure.get('name', ''),
+               'load profile': op_handler_requests['load_profile'].get('name', ''),
+               'pv profile': op_handler_requests['pv_profile'].get('name', ''),
+               'month': month,
+               }
+        row.update({name: entry.get('params', {}).get(name, '') for name in param_columns})
+        row.update({attribute: getattr(record, attribute) for attribute in BtmOptimizerHandler.SUMMARY_ATTRIBUTES})
+        row['results file'] = _write_results(out_dir, fname, record)
+
+        rows.append(row)
+
+    _write_summary(out_dir, ['rate structure', 'load profile', 'pv profile', 'month'] + param_columns + list(BtmOptimizerHandler.SUMMARY_ATTRIBUTES) + ['results file'], rows)
+
+    return len(entries), handler_status
+
+
+def _find_files(paths, extension):
+    """Returns the sorted list of files in paths, a path or list of paths, with directories replaced by the files with the extension that they contain."""
+    if isinstance(paths, str):
+        paths = [paths]
+
+    fpaths = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, fnames in os.walk(path):
+                fpaths.extend(os.path.join(root, fname) for fname in fnames
+                              if fname.lower().endswith(extension) and not fname.startswith('.'))
+        else:
+            fpaths.append(path)
+
+    return sorted(fpaths)
+
+
+def run_btm_portfolio_job(spec, out_dir, solver_name, n_workers=1, stack_size=1, data_bank='data', solve_cache=None):
+    """Solves every combination of the rate structures, load profiles, and PV profiles of the BTM portfolio job spec and writes the summary to out_dir.
+
+    :return: A tuple of the number of models solved and the set of issues reported by the handler.
+    """
+    from es_gui.apps.btm.op_handler import BtmOptimizerHandler
+    from es_gui.tools.btm.btm_dms import BtmDMS
+
+    rate_structures = []
+
+    for fpath in _find_files(_require(spec, 'rate structures'), '.json'):
+        with open(fpath) as f:
+            rate_structures.append(json.load(f))
+
+    load_profiles = [_profile_metadata(fpath) for fpath in _find_files(_require(spec, 'load profiles'), '.csv')]
+    pv_profiles = [_profile_metadata(fpath) for fpath in _find_files(spec.get('pv profiles', []), '.json')]
+
+    if not rate_structures or not load_profiles:
+        raise JobSpecError('The portfolio needs at least one rate structure and one load profile.')
+
+    portfolio_requests = {'rate_structures': rate_structures,
+                          'load_profiles': load_profiles,
+                          'pv_profiles': pv_profiles or [{}],
+                          'params': [params or {} for params in get_param_set(spec)],
+                          }
+
+    for key in ('year', 'timestep'):
+        if key in spec:
+            portfolio_requests[key] = int(spec[key])
+
+    handler = BtmOptimizerHandler(solver_name, n_workers=n_workers, stack_size=stack_size)
+    handler.dms = BtmDMS(home_path=data_bank, save_name='btm_dms.p')
+    handler.solve_cache = solve_cache
+    # Only the summary is written, so the records of the solved models are not kept.
+    BtmOptimizerHandler.solved_ops_limit = 1
+
+    logging.info('Solving {0} combinations of rate structures and profiles.'.format(len(rate_structures)*len(load_profiles)*len(pv_profiles or [{}])))
+
+    summary, handler_status = handler.process_portfolio(portfolio_requests)
+    summary.to_csv(os.path.join(out_dir, 'summary.csv'), index=False)
+
+    return len(summary), handler_status
+
+
+def _option(value, spec, key, default):
+    """Returns the command-line option value if given, else the job spec value for key, else default."""
+    if value is not None:
+        return value
+
+    return spec.get(key, default)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve a batch of valuation or behind-the-meter models described by a job spec without the GUI.')
+    parser.add_argument('job_spec', help='Path to the JSON or YAML job spec.')
+    parser.add_argument('--out', default='results', help='Directory to write the results to.')
+    parser.add_argument('--solver', default=None, help='Name of the solver to use, e.g., glpk, cbc, or highs.')
+    parser.add_argument('--n-workers', type=int, default=None, help='Number of worker processes to solve models with.')
+    parser.add_argument('--stack-size', type=int, default=None, help='Number of independent models to combine into one model for each call to the solver.')
+    parser.add_argument('--backend', default=None, choices=['pyomo', 'matrix', 'dp'], help='Valuation model building backend.')
+    parser.add_argument('--data-bank', default='data', help='Path to the root of the data bank.')
+    parser.add_argument('--cache-dir', default=None, help='Directory of a solve cache to reuse the results of previously solved models.')
+    parser.add_argument('--log-level', default='INFO', help='Logging level.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    try:
+        spec = load_job_spec(args.job_spec)
+    except (OSError, ValueError, JobSpecError) as e:
+        logging.error('Could not read the job spec {0}. ({1})'.format(args.job_spec, e))
+        return 2
+
+    job_type = spec.get('type', 'valuation')
+    solver_name = _option(args.solver, spec, 'solver', 'glpk')
+    n_workers = _option(args.n_workers, spec, 'n workers', 1)
+    stack_size = _option(args.stack_size, spec, 'stack size', 1)
+    solve_cache = SolveCache(args.cache_dir) if args.cache_dir else None
+
+    os.makedirs(args.out, exist_ok=True)
+
+    try:
+        if job_type == 'valuation':
+            n_solved, handler_status = run_valuation_job(spec, args.out, solver_name,
+                                                         n_workers=n_workers,
+                                                         stack_size=stack_size,
+                                                         backend=_option(args.backend, spec, 'backend', 'pyomo'),
+                                                         data_bank=args.data_bank,
+                                                         solve_cache=solve_cache)
+        elif job_type == 'btm':
+            n_solved, handler_status = run_btm_job(spec, args.out, solver_name,
+                                                   n_workers=n_workers,
+                                                   stack_size=stack_size,
+                                                   data_bank=args.data_bank,
+                                                   solve_cache=solve_cache)
+        elif job_type == 'btm portfolio':
+            n_solved, handler_status = run_btm_portfolio_job(spec, args.out, solver_name,
+                                                             n_workers=n_workers,
+                                                             stack_size=stack_size,
+                                                             data_bank=args.data_bank,
+                                                             solve_cache=solve_cache)
+        else:
+            raise JobSpecError('Unknown job type "{0}"; use "valuation", "btm", or "btm portfolio".'.format(job_type))
+    except (OSError, ValueError, JobSpecError) as e:
+        logging.error('Could not run the job. ({0})'.format(e))
+        return 2
+
+    for issue in sorted(handler_status):
+        logging.warning(issue.lstrip('* '))
+
+    logging.info('Solved {0} models; results written to {1}'.format(n_solved, os.path.abspath(args.out)))
+
+    return 0 if n_solved else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,13 +5,15 @@ import copy
 from functools import partial
 from random import choice
 import textwrap
+import logging
+import threading
 
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 mpl.use('module://kivy.garden.matplotlib.backend_kivy')
 from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg
 from kivy.app import App
-from kivy.clock import Clock
+from kivy.clock import Clock, mainthread
 from kivy.utils import get_color_from_hex
 from kivy.core.window import Window
 from kivy.animation import Animation
@@ -261,6 +263,82 @@ class WizardCompletePopup(MyPopup):
     pass
 
 
+class WizardExecuteScreen(Screen):
+    """
+    The base screen for executing the optimizations of a wizard. The handler processes the requests in a background thread so that the screen can show the progress of each model and offer to cancel the run; finish_run() is called on the main thread with the results.
+
+    Subclasses provide the progress_label, progress_bar, and cancel_button widgets.
+    """
+    # The number of the most recent progress events shown.
+    N_PROGRESS_LINES = 20
+
+    # Progress event descriptions by status; see RunProgress.
+    PROGRESS_TEMPLATES = {'built': '{label}: built in {time:.1f} s',
+                          'solved': '{label}: solved in {time:.1f} s',
+                          'cached': '{label}: loaded from previous results',
+                          'failed': '{label}: could not be solved ({time:.1f} s)',
+                          }
+
+    cancel_event = None
+
+    def on_leave(self):
+        # Do not keep solving models for a wizard that has been left.
+        self.cancel_run()
+
+    def start_run(self, handler, requests):
+        """Processes requests with handler in a background thread."""
+        self.cancel_event = threading.Event()
+        self._progress_lines = collections.deque(maxlen=self.N_PROGRESS_LINES)
+
+        self.progress_bar.value = 0
+        self.cancel_button.disabled = False
+
+        def _process_requests():
+            try:
+                solved_ops, handler_status = handler.process_requests(requests, progress_callback=self._update_progress, cancel_event=self.cancel_event)
+            except Exception as e:
+                logging.error('Wizard: {error}'.format(error=e))
+                solved_ops, handler_status = [], {'* {0}'.format(e)}
+
+            self._finish_run(solved_ops, handler_status)
+
+        thread = threading.Thread(target=_process_requests, daemon=True)
+        thread.start()
+
+    def cancel_run(self):
+        """Requests that no further models be solved; the run finishes after the current model with the models solved so far."""
+        if self.cancel_event is not None and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.cancel_button.disabled = True
+
+            self._progress_lines.append('Cancelling after the current model...')
+            self.progress_label.text = '\n'.join(self._progress_lines)
+
+    @mainthread
+    def _update_progress(self, event):
+        """Shows the progress event from RunProgress."""
+        self._progress_lines.append(self.PROGRESS_TEMPLATES[event['status']].format(**event))
+        self.progress_label.text = '\n'.join(self._progress_lines)
+
+        if event['total']:
+            self.progress_bar.value = self.progress_bar.max*event['completed']/event['total']
+
+    @mainthread
+    def _finish_run(self, solved_ops, handler_status):
+        self.cancel_button.disabled = True
+        cancelled, self.cancel_event = self.cancel_event.is_set(), None
+
+        if cancelled and (self.manager is None or self.manager.current_screen is not self):
+            # Cancelled by leaving the screen.
+            return
+
+        self.finish_run(solved_ops, handler_status)
+
+    def finish_run(self, solved_ops, handler_status):
+        """Called on the main thread with the solved ops and the handler status once the run has finished or been cancelled."""
+        pass
+
+
 class WizardReportInterface(Screen):
     def on_enter(self):
         def _start(*args):
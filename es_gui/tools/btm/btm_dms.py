@@ -21,32 +21,45 @@ class BtmDMS(DataManagementSystem):
         self.home_path = home_path
         self.delimiter = ' @ '  # delimiter used to split information in id_key
     
-    def get_load_profile_data(self, path, month):
-        """Retrieves commercial or residential load profile data."""
+    def _get_or_load(self, key, load):
+        """Retrieves the data for key, calling load() to load it the first time it is requested."""
+        try:
+            return self.get_data(key)
+        except KeyError:
+            def _load():
+                data = load()
+                self.add_data(data, key)
+
+                return data
+
+            # concurrent requests for the same data share one load; a load that finished since the miss above is not repeated
+            return self.load_once(key, _load, lambda: self.get_data(key))
+
+    def _get_annual_profile(self, path, reader, timestep=60):
+        """Retrieves the annual profile array at path with one value per timestep [minutes]. The file is parsed with reader() the first time it is requested; a profile with a different timestep is resampled once and kept as well."""
+        profile = self._get_or_load(self.delimiter.join([path, 'annual']), lambda: reader(path))
+
+        if get_profile_timestep(len(profile)) == timestep:
+            return profile
+
+        return self._get_or_load(self.delimiter.join([path, 'annual', str(timestep)]), lambda: resample_profile(profile, timestep))
+
+    def get_annual_load_profile_data(self, path, timestep=60):
+        """Retrieves the commercial or residential load profile data of every timestep [minutes] of the year."""
         logging.info('DMS: Loading load profile data')
 
-        month = str(month)
-        load_profile_key = self.delimiter.join([path, month])
+        return self._get_annual_profile(path, read_annual_load_profile, timestep)
 
-        try:
-            load_profile = self.get_data(load_profile_key)
-        except KeyError:
-            load_profile = read_load_profile(path, month)
-            self.add_data(load_profile, load_profile_key)
-        finally:
-            return load_profile
-    
-    def get_pv_profile_data(self, path, month):
-        """Retrieves PV profile data."""
+    def get_annual_pv_profile_data(self, path, timestep=60):
+        """Retrieves the PV profile data of every timestep [minutes] of the year."""
         logging.info('DMS: Loading PV profile data')
 
-        month = str(month)
-        pv_profile_key = self.delimiter.join([path, month])
+        return self._get_annual_profile(path, read_annual_pv_profile, timestep)
 
-        try:
-            pv_profile = self.get_data(pv_profile_key)
-        except KeyError:
-            pv_profile = read_pv_profile(path, month)
-            self.add_data(pv_profile, pv_profile_key)
-        finally:
-            return pv_profile
\ No newline at end of file
+    def get_load_profile_data(self, path, month, year=2019, timestep=60):
+        """Retrieves commercial or residential load profile data for the given month. The file is parsed once; each month is a view of the annual profile."""
+        return get_month_profile(self.get_annual_load_profile_data(path, timestep), month, year=year, timestep=timestep)
+
+    def get_pv_profile_data(self, path, month, year=2019, timestep=60):
+        """Retrieves PV profile data for the given month. The file is parsed once; each month is a view of the annual profile."""
+        return get_month_profile(self.get_annual_pv_profile_data(path, timestep), month, year=year, timestep=timestep)
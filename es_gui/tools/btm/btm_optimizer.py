@@ -8,20 +8,56 @@ import numpy as np
 
 from es_gui.tools import optimizer
 from es_gui.tools.btm.constraints import ExpressionsBlock
+from es_gui.tools.btm.matrix_model import MatrixModel
 
 
-class BtmOptimizer(optimizer.Optimizer):
+class BillChargesMixin(object):
+    """Queries on the bill components with and without energy storage, shared by BtmOptimizer and BtmRecord."""
+    __slots__ = ()
+
+    def has_energy_charges(self):
+        """Returns True if there are energy charges (savings)."""
+        if abs(self.energy_charge_with_es - self.energy_charge_without_es) > 1e-4:
+            return True
+        else:
+            return False
+    
+    def has_demand_charges(self):
+        """Returns True if there are demand charges (savings)."""
+        if abs(self.demand_charge_with_es - self.demand_charge_without_es) > 1e-4:
+            return True
+        else:
+            return False
+    
+    def has_nem_charges(self):
+        """Returns True if there are net metering charges (savings)."""
+        if abs(self.nem_charge_with_es - self.nem_charge_without_es) > 1e-4:
+            return True
+        else:
+            return False
+
+
+class BtmOptimizer(BillChargesMixin, optimizer.Optimizer):
     """A framework wrapper class for creating Pyomo ConcreteModels for behind the meter valuation."""
 
+    # Model parameters that can be updated in place in sweep mode.
+    SWEEP_PARAMS = {'Transformer_rating', 'Power_rating', 'Energy_capacity', 'Self_discharge_efficiency',
+                    'Round_trip_efficiency', 'State_of_charge_min', 'State_of_charge_max', 'State_of_charge_init'}
+
+    # Model parameters that are fractions; values greater than 1.0 are interpreted as percentages.
+    FRACTION_PARAMS = {'Self_discharge_efficiency', 'Round_trip_efficiency',
+                       'State_of_charge_min', 'State_of_charge_max', 'State_of_charge_init'}
+
     def __init__(self, tou_energy_schedule = None, tou_energy_rate=None, 
                  tou_demand_schedule=None, tou_demand_rate=None, flat_demand_rate=None,
                  nem_type=1, nem_rate=None, load_profile=None, pv_profile=None, 
                  rate_structure_metadata=None, load_profile_metadata=None, pv_profile_metadata=None,
-                 cost_charge=None, cost_discharge=None,
-                 solver='glpk'):
+                 cost_charge=None, cost_discharge=None, timestep=60,
+                 solver='glpk', backend=None):
         
         self._model = ConcreteModel()
         self._solver = solver
+        self.backend = backend
 
         self._expressions_block = None
         
@@ -41,10 +77,14 @@ class BtmOptimizer(optimizer.Optimizer):
         self._rate_structure_metadata = rate_structure_metadata # type: dict 
         self._load_profile_metadata = load_profile_metadata # type: dict 
         self._pv_profile_metadata = pv_profile_metadata # type: dict
+
+        self._timestep = None
+        self.timestep = timestep
         
 #        self._cost_charge = cost_charge
 #        self._cost_discharge = cost_discharge
         self._results = None
+        self._solution = None
 
         self._total_bill_with_es = 0
         self._total_bill_without_es = 0
@@ -54,6 +94,8 @@ class BtmOptimizer(optimizer.Optimizer):
         self._demand_charge_without_es = 0
         self._nem_charge_with_es = 0
         self._nem_charge_without_es = 0
+        self._peak_demand_with_es = 0
+        self._peak_demand_without_es = 0
         
  #---------------------------------------------------   
     @property
@@ -121,6 +163,18 @@ class BtmOptimizer(optimizer.Optimizer):
     @nem_rate.setter
     def nem_rate(self, value):
         self._nem_rate = value 
+ #---------------------------------------------------
+    @property
+    def timestep(self):
+        """The length of each time period of the time series [minutes], defaults to 60; must evenly divide an hour, e.g., 15, 30, or 60."""
+        return self._timestep
+
+    @timestep.setter
+    def timestep(self, value):
+        if int(value) <= 0 or 60 % int(value) != 0:
+            raise BadParameterException('timestep must evenly divide an hour, e.g., 15, 30, or 60 minutes.')
+
+        self._timestep = int(value)
  #--------------------------------------------------- 
     @property
     def load_profile(self):
@@ -194,6 +248,21 @@ class BtmOptimizer(optimizer.Optimizer):
     def solver(self, value):
         self._solver = value
  #--------------------------------------------------- 
+    @property
+    def backend(self):
+        """The model building backend: 'pyomo' for a Pyomo ConcreteModel solved by the selected solver or 'matrix' for a sparse matrix LP solved by HiGHS in-process, defaults to 'matrix' for sub-hourly timesteps and 'pyomo' otherwise."""
+        if self._backend is None:
+            return 'matrix' if self.timestep < 60 else 'pyomo'
+
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        if value in {None, 'pyomo', 'matrix'}:
+            self._backend = value
+        else:
+            raise ValueError("backend must be one of 'pyomo' or 'matrix'.")
+
     @property
     def expressions_block(self):
         """ExpressionsBlock object for setting model objectives and constraints."""
@@ -288,12 +357,30 @@ class BtmOptimizer(optimizer.Optimizer):
     def nem_charge_without_es(self, value):
         self._nem_charge_without_es = value
 
+    @property
+    def peak_demand_with_es(self):
+        """Peak net demand over the month with energy storage [kW]."""
+        return self._peak_demand_with_es
+
+    @peak_demand_with_es.setter
+    def peak_demand_with_es(self, value):
+        self._peak_demand_with_es = value
+
+    @property
+    def peak_demand_without_es(self):
+        """Peak net demand over the month without energy storage [kW]."""
+        return self._peak_demand_without_es
+
+    @peak_demand_without_es.setter
+    def peak_demand_without_es(self, value):
+        self._peak_demand_without_es = value
+
     def _set_model_param(self):
         """Sets the model params for the Pyomo ConcreteModel."""
         m = self.model
         
         # Check if params common to all formulations are set.
-        if not hasattr(m, 'Transfomer_rating'):
+        if not hasattr(m, 'Transformer_rating'):
             # Transformer rating; equivalently, the maximum power can be exchanged [kW].
             logging.debug('Optimizer: No Transformer_rating provided, setting default...')
             m.Transformer_rating = 1000000
@@ -309,7 +396,7 @@ class BtmOptimizer(optimizer.Optimizer):
             m.Energy_capacity = 100
 
         if not hasattr(m, 'Self_discharge_efficiency'):
-            # Fraction of energy maintained over one time period.
+            # Fraction of energy maintained over one hour.
             logging.debug('Optimizer: No Self_discharge_efficiency provided, setting default...')
             m.Self_discharge_efficiency = 1.00     
         elif getattr(m, 'Self_discharge_efficiency') > 1.0:
@@ -367,35 +454,35 @@ class BtmOptimizer(optimizer.Optimizer):
                 """The discharge power vector [kW]"""
                 return 0.0
 
-            m.pdis = Var(m.time, initialize= _pdis_init, domain = NonNegativeReals, bounds=(0,m.Power_rating))
+            m.pdis = Var(m.time, initialize= _pdis_init, domain = NonNegativeReals, bounds=(0,value(m.Power_rating)))
         
         if not hasattr(m, 'pcha'):
             def _pcha_init(_m, t):
                 """The charge power vector [kW]"""
                 return 0.0
 
-            m.pcha = Var(m.time, initialize= _pcha_init, domain = NonNegativeReals, bounds=(0,m.Power_rating))
+            m.pcha = Var(m.time, initialize= _pcha_init, domain = NonNegativeReals, bounds=(0,value(m.Power_rating)))
         
         if not hasattr(m, 'pfpk'):
             def _pfpk_init(_m):
                 """Peak demand of a month [kW]"""
                 return 0.0
 
-            m.pfpk = Var(initialize= _pfpk_init, domain = NonNegativeReals, bounds=(0,m.Transformer_rating))
+            m.pfpk = Var(initialize= _pfpk_init, domain = NonNegativeReals, bounds=(0,value(m.Transformer_rating)))
             
         if not hasattr(m, 'ptpk'):
             def _ptpk_init(_m, p):
                 """Peak demand of different time-of-use periods of a month [kW]"""
                 return 0.0
 
-            m.ptpk = Var(m.period, initialize= _ptpk_init, domain = NonNegativeReals,bounds=(0,m.Transformer_rating))
+            m.ptpk = Var(m.period, initialize= _ptpk_init, domain = NonNegativeReals,bounds=(0,value(m.Transformer_rating)))
         
         if not hasattr(m, 'xnet'):
             def _xnet_init(_m, t):
                 """Xnet[i]=Max{Pload[i]-Ppv[i]+Pcha[i]-Pdis[i],0} [kW]"""
                 return 0.0
 
-            m.xnet = Var(m.time, initialize= _xnet_init, domain = NonNegativeReals,bounds=(0,m.Transformer_rating))
+            m.xnet = Var(m.time, initialize= _xnet_init, domain = NonNegativeReals,bounds=(0,value(m.Transformer_rating)))
         
     def instantiate_model(self):
         """Instantiates the Pyomo ConcreteModel and populates it with supplied time series data."""
@@ -405,6 +492,9 @@ class BtmOptimizer(optimizer.Optimizer):
         m = self.model
         m.nhr = len(self.tou_energy_schedule)
         m.dml = len(self.tou_demand_rate)
+
+        # Length of each time period [h]; energy is power times dt.
+        m.dt = self.timestep/60
         
         try:
             m.time = RangeSet(0, m.nhr - 1)
@@ -420,16 +510,20 @@ class BtmOptimizer(optimizer.Optimizer):
             # self.tou_demand_rate is of type 'NoneType'
             m.period = []
         
-        m.tou_er = [self.tou_energy_rate[self.tou_energy_schedule[t]] for t in range(m.nhr)]
+        tou_energy_schedule = np.asarray(self.tou_energy_schedule, dtype=int)[:m.nhr]
+        tou_demand_schedule = np.asarray(self.tou_demand_schedule, dtype=int)[:m.nhr]
+
+        m.tou_er = np.asarray(self.tou_energy_rate, dtype=float)[tou_energy_schedule].tolist()
         
         m.tou_dr = self.tou_demand_rate
         
-        mask_ds = []
-        for i in range(m.dml):
-            listi=[int(self.tou_demand_schedule[t]==i) for t in range(m.nhr)]
-            mask_ds.append(listi)
+        # mask_ds[p, t] is 1 if time period t is in demand period p.
+        mask_ds = (tou_demand_schedule[np.newaxis, :] == np.arange(m.dml)[:, np.newaxis]).astype(int)
        
         m.mask_ds = mask_ds
+
+        # (period, time period) pairs covered by each demand period, for the sparse TOU demand constraints.
+        m.period_time = Set(dimen=2, ordered=True, initialize=[(int(p), int(t)) for p, t in zip(*np.nonzero(mask_ds))])
         
         m.flt_dr = self.flat_demand_rate
         
@@ -442,7 +536,7 @@ class BtmOptimizer(optimizer.Optimizer):
         
         m.pld = self.load_profile
         m.ppv = self.pv_profile
-        m.pnet= [m.pld[t]-m.ppv[t] for t in range(m.nhr)]
+        m.pnet= (np.asarray(m.pld, dtype=float)[:m.nhr] - np.asarray(m.ppv, dtype=float)[:m.nhr]).tolist()
         
 #        m.cost_cha = self.cost_charge
 #        m.cost_dis = self.cost_discharge
@@ -453,6 +547,16 @@ class BtmOptimizer(optimizer.Optimizer):
         self.model.objective_expr = 0.0
 
         self._set_model_param()
+
+        if self.sweep_mode:
+            self._make_params_mutable(['Transformer_rating', 'Power_rating', 'Energy_capacity',
+                                       'Self_discharge_efficiency', 'Round_trip_efficiency',
+                                       'State_of_charge_min', 'State_of_charge_max', 'State_of_charge_init'])
+
+        if self.backend == 'matrix':
+            # The sparse matrix LP is assembled from the model parameters when it is solved.
+            return
+
         self._set_model_var()
 
         self.expressions_block = ExpressionsBlock()
@@ -465,30 +569,89 @@ class BtmOptimizer(optimizer.Optimizer):
         else:
             self.model.objective = Objective(expr=self.model.objective_expr)
 
+    def _normalize_param(self, name, value):
+        """Interprets fractional model parameters greater than 1.0 as percentages."""
+        if name in self.FRACTION_PARAMS and value > 1.0:
+            logging.warning('Optimizer: {0} provided is greater than 1.0, interpreting as percentage...'.format(name))
+            return value/100
+
+        return value
+
+    def _update_model_bounds(self):
+        """Updates the variable bounds derived from the device and transformer ratings."""
+        m = self.model
+
+        m.smin = value(m.State_of_charge_min*m.Energy_capacity)
+        m.smax = value(m.State_of_charge_max*m.Energy_capacity)
+
+        if self.backend == 'matrix':
+            return
+
+        for t in m.time:
+            m.s[t].setlb(m.smin)
+            m.s[t].setub(m.smax)
+            m.pdis[t].setub(value(m.Power_rating))
+            m.pcha[t].setub(value(m.Power_rating))
+            m.xnet[t].setub(value(m.Transformer_rating))
+
+        m.pfpk.setub(value(m.Transformer_rating))
+
+        for p in m.period:
+            m.ptpk[p].setub(value(m.Transformer_rating))
+
+    def _solve(self):
+        """Solves the populated model using the selected backend, checks for optimality, and processes the results."""
+        if self.backend == 'matrix':
+            try:
+                native_model = MatrixModel(self.model)
+            except IndexError:
+                # Array-like object(s) do(es) not match the length of the month.
+                raise(IncompatibleDataException('At least one of the array-like parameter objects is not the expected length. (It should match the length of the tou_energy_schedule object.)'))
+
+            self._solution = native_model.solve()
+            self._process_results()
+        else:
+            self._solution = None
+
+            super(BtmOptimizer, self)._solve()
+
     def _process_results(self):
         """Processes optimization results for further evaluation."""
         m = self.model
 
-        pcha = [m.pcha[n].value for n in m.time]
-        pdis = [m.pdis[n].value for n in m.time]
-        ptot = [m.pnet[n] + m.pcha[n].value - m.pdis[n].value for n in m.time]
-        soc  = [m.s[n].value for n in m.time]
-        pfpk_without_es = max(m.pnet)
-        ptpk_without_es = [max(m.pnet[n]*m.mask_ds[p][n] for n in m.time) for p in m.period]
-        
-        demand_charge_with_es=m.pfpk.value*m.flt_dr+sum(m.ptpk[p].value*m.tou_dr[p] for p in m.period)
-        demand_charge_without_es=pfpk_without_es*m.flt_dr+sum(ptpk_without_es[p]*m.tou_dr[p] for p in m.period)
-        
-        energy_charge_with_es=sum(max(0,ptot[n])*m.tou_er[n] for n in m.time)
-        energy_charge_without_es=sum(max(0,m.pnet[n])*m.tou_er[n] for n in m.time)
-        
-        nem_charge_with_es=sum(min(0,ptot[n])*m.nem_sr[n] for n in m.time) #negative since it is credit
-        nem_charge_without_es=sum(min(0,m.pnet[n])*m.nem_sr[n] for n in m.time) #negative since it is credit
-        
+        if self._solution is not None:
+            # Solved by the matrix backend.
+            solution = self._solution
+        else:
+            solution = {var: optimizer.get_var_values(getattr(m, var)) for var in ('pcha', 'pdis', 's', 'ptpk')}
+            solution['pfpk'] = m.pfpk.value
+
+        pcha, pdis, soc, ptpk, pfpk = (solution[var] for var in ('pcha', 'pdis', 's', 'ptpk', 'pfpk'))
+
+        pnet = np.asarray(m.pnet, dtype=float)
+        ptot = pnet + pcha - pdis
+
+        tou_er = np.asarray(m.tou_er, dtype=float)
+        tou_dr = np.asarray(m.tou_dr, dtype=float)
+        nem_sr = np.asarray(m.nem_sr, dtype=float)
+        mask_ds = np.asarray(m.mask_ds, dtype=float).reshape(m.dml, m.nhr)
+
+        pfpk_without_es = pnet.max()
+        ptpk_without_es = (mask_ds*pnet).max(axis=1) if m.nhr else np.zeros(m.dml)
+
+        demand_charge_with_es = pfpk*m.flt_dr + ptpk.dot(tou_dr)
+        demand_charge_without_es = pfpk_without_es*m.flt_dr + ptpk_without_es.dot(tou_dr)
+
+        energy_charge_with_es = np.maximum(ptot, 0).dot(tou_er)*m.dt
+        energy_charge_without_es = np.maximum(pnet, 0).dot(tou_er)*m.dt
+
+        nem_charge_with_es = np.minimum(ptot, 0).dot(nem_sr)*m.dt #negative since it is credit
+        nem_charge_without_es = np.minimum(pnet, 0).dot(nem_sr)*m.dt #negative since it is credit
+
         tot_bill_with_es=demand_charge_with_es + energy_charge_with_es + nem_charge_with_es
         tot_bill_without_es=demand_charge_without_es + energy_charge_without_es + nem_charge_without_es
-        
-        run_results = {'time': m.time, 'Pload': m.pld, 'Ppv': m.ppv, 'Pcharge': pcha, 'Pdischarge': pdis, 'Ptotal': ptot,
+
+        run_results = {'time': np.arange(m.nhr), 'Pload': m.pld, 'Ppv': m.ppv, 'Pcharge': pcha, 'Pdischarge': pdis, 'Ptotal': ptot,
                        'state of charge': soc, 'energy_charge_with_es': energy_charge_with_es,'nem_charge_with_es': nem_charge_with_es, 
                        'demand_charge_with_es':demand_charge_with_es, 'total_bill_with_es': tot_bill_with_es, 
                        'energy_charge_without_es': energy_charge_without_es,'nem_charge_without_es': nem_charge_without_es, 
@@ -507,32 +670,29 @@ class BtmOptimizer(optimizer.Optimizer):
         self.nem_charge_with_es = nem_charge_with_es
         self.nem_charge_without_es = nem_charge_without_es
 
+        self.peak_demand_with_es = pfpk
+        self.peak_demand_without_es = pfpk_without_es
+
         # self.results.to_csv('resultssss.csv')
         
     def get_results(self):
         """Returns the decision variables and derived quantities in a DataFrame"""
         return self.results
-    
-    def has_energy_charges(self):
-        """Returns True if there are energy charges (savings)."""
-        if abs(self.energy_charge_with_es - self.energy_charge_without_es) > 1e-4:
-            return True
-        else:
-            return False
-    
-    def has_demand_charges(self):
-        """Returns True if there are demand charges (savings)."""
-        if abs(self.demand_charge_with_es - self.demand_charge_without_es) > 1e-4:
-            return True
-        else:
-            return False
-    
-    def has_nem_charges(self):
-        """Returns True if there are net metering charges (savings)."""
-        if abs(self.nem_charge_with_es - self.nem_charge_without_es) > 1e-4:
-            return True
-        else:
-            return False
+
+
+class BtmRecord(BillChargesMixin, optimizer.OptimizerRecord):
+    """A compact record of a solved BtmOptimizer for results viewers and reports."""
+    __slots__ = ATTRIBUTES = ('total_bill_with_es', 'total_bill_without_es',
+                              'energy_charge_with_es', 'energy_charge_without_es',
+                              'demand_charge_with_es', 'demand_charge_without_es',
+                              'nem_charge_with_es', 'nem_charge_without_es',
+                              'peak_demand_with_es', 'peak_demand_without_es',
+                              'nem_type', 'nem_rate', 'flat_demand_rate', 'pv_profile',
+                              'rate_structure_metadata', 'load_profile_metadata', 'pv_profile_metadata')
+
+    def get_results(self):
+        """Returns the decision variables and derived quantities in a DataFrame"""
+        return self.results
 
 
 class BadParameterException(Exception):
@@ -544,8 +704,68 @@ class IncompatibleDataException(Exception):
 
 
 if __name__ == '__main__':
+    # Benchmarks building and solving a month of the model at each supported timestep, e.g.:
+    # python -m es_gui.tools.btm.btm_optimizer --solver glpk
+    import argparse
+    import time
+
+    from es_gui.tools.btm.readutdata import rate_calendar
+
     with open('btm_optimizer.log', 'w'):
         pass
 
     logging.basicConfig(filename='btm_optimizer.log', format='[%(levelname)s] %(asctime)s: %(message)s',
-                        level=logging.INFO)
\ No newline at end of file
+                        level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Benchmark building and solving a month of BtmOptimizer at 60, 30, and 15 minute timesteps with their default backends, and at 15 minutes with the pyomo backend for reference.')
+    parser.add_argument('--solver', default='glpk', help='Name of the solver to use for the pyomo backend.')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of times to build and solve each model; the fastest is reported.')
+    args = parser.parse_args()
+
+    # Afternoon peak periods for energy and demand.
+    schedule = [[1 if 12 <= hour < 18 else 0 for hour in range(24)] for month in range(12)]
+    rng = np.random.RandomState(0)
+    load_profiles = {}
+    timings = {}
+    bills = {}
+
+    for timestep, backend in ((60, None), (30, None), (15, None), (15, 'pyomo')):
+        tou_schedule, _ = rate_calendar(2019, schedule, schedule, schedule, schedule, timestep=timestep).get_month(1)
+        hours = np.arange(len(tou_schedule))*timestep/60
+
+        if timestep not in load_profiles:
+            load_profiles[timestep] = 60 + 25*np.sin(2*np.pi*(hours - 9)/24) + rng.normal(0, 5, len(hours))
+
+        pv_profile = np.maximum(40*np.sin(2*np.pi*(hours - 6)/24), 0)
+
+        build_times = []
+        solve_times = []
+
+        for _ in range(args.repeats):
+            op = BtmOptimizer(tou_energy_schedule=tou_schedule, tou_energy_rate=[0.08, 0.20],
+                              tou_demand_schedule=tou_schedule, tou_demand_rate=[5.0, 12.0], flat_demand_rate=8.0,
+                              nem_type=1, nem_rate=0.03, load_profile=load_profiles[timestep], pv_profile=pv_profile,
+                              timestep=timestep, solver=args.solver, backend=backend)
+            op.set_model_parameters(Power_rating=50, Energy_capacity=200)
+
+            start = time.perf_counter()
+            op.instantiate_model()
+            op.populate_model()
+            built = time.perf_counter()
+            op.resolve()
+            solved = time.perf_counter()
+
+            build_times.append(built - start)
+            solve_times.append(solved - built)
+
+        key = (timestep, op.backend)
+        timings[key] = (min(build_times), min(solve_times))
+        bills[key] = op.total_bill_with_es
+
+        print('{0:2d} minutes, {1:6s}: {2:5d} periods, build {3:.3f} s, solve {4:.3f} s, bill {5:.2f} (without storage {6:.2f})'.format(
+            timestep, op.backend, len(tou_schedule), timings[key][0], timings[key][1], op.total_bill_with_es, op.total_bill_without_es))
+
+    # The matrix LP is assembled and solved in resolve(), so the totals are the fair comparison.
+    print('15 minutes (matrix) relative to 60 minutes (pyomo): build {0:.2f}x, solve {1:.2f}x, total {2:.2f}x; bill difference from the pyomo backend {3:.1e}'.format(
+        timings[15, 'matrix'][0]/timings[60, 'pyomo'][0], timings[15, 'matrix'][1]/timings[60, 'pyomo'][1],
+        sum(timings[15, 'matrix'])/sum(timings[60, 'pyomo']), abs(bills[15, 'matrix'] - bills[15, 'pyomo'])))
@@ -34,8 +34,9 @@ def eq_objective_btm(m):
     
     mp = m.parent_block()
     
+    # Demand charges are on the peak power [kW]; energy charges are on the energy [kWh] of each time period of length dt [h].
     _expr = mp.pfpk*mp.flt_dr + sum(mp.ptpk[p]*mp.tou_dr[p] for p in mp.period) +\
-    sum(mp.xnet[t]*(mp.tou_er[t]-mp.nem_sr[t])+(mp.pnet[t]+mp.pcha[t]-mp.pdis[t])*mp.nem_sr[t] for t in mp.time)
+    mp.dt*sum(mp.xnet[t]*(mp.tou_er[t]-mp.nem_sr[t])+(mp.pnet[t]+mp.pcha[t]-mp.pdis[t])*mp.nem_sr[t] for t in mp.time)
     
 #    _expr = mp.pfpk*mp.flt_dr +\
 #    sum(mp.xnet[t]*(mp.tou_er[t]-mp.nem_sr[t])+(mp.pnet[t]+mp.pcha[t]-mp.pdis[t])*mp.nem_sr[t] for t in mp.time)
@@ -45,16 +46,19 @@ def eq_objective_btm(m):
 
 
 def eq_stateofcharge(m):
-    """Definition of state of charge"""
+    """Definition of state of charge; the power charged and discharged over each time period of length dt [h] changes the energy stored by dt times as much"""
     mp = m.parent_block()
+
+    # Self_discharge_efficiency is the fraction of energy maintained over one hour.
+    sd = mp.Self_discharge_efficiency if mp.dt == 1 else mp.Self_discharge_efficiency**mp.dt
    
     def _eq_stateofcharge(_m, t):
         if t==0:
             spre=mp.State_of_charge_init*mp.Energy_capacity
         else:
             spre=mp.s[t-1]
-        return mp.Self_discharge_efficiency * spre + mp.Round_trip_efficiency * mp.pcha[t] \
-            - mp.pdis[t] == mp.s[t]       
+        return sd * spre + mp.dt * (mp.Round_trip_efficiency * mp.pcha[t] \
+            - mp.pdis[t]) == mp.s[t]       
 
     m.stateofcharge = Constraint(mp.time, rule=_eq_stateofcharge)
 
@@ -62,9 +66,7 @@ def eq_stateofcharge_final(m):
     """Requires the final state of charge of the energy storage device to equal its initial value."""
     mp = m.parent_block()
     T  = mp.nhr-1
-    def _eq_stateofcharge_final(_m, t):
-        return mp.s[T] == mp.State_of_charge_init*mp.Energy_capacity
-    m.stateofcharge_final = Constraint(mp.time, rule=_eq_stateofcharge_final)
+    m.stateofcharge_final = Constraint(expr=mp.s[T] == mp.State_of_charge_init*mp.Energy_capacity)
 
 
 def ineq_peak_demand(m):
@@ -75,11 +77,11 @@ def ineq_peak_demand(m):
     m.peak_demand = Constraint(mp.time, rule=_ineq_peak_demand)
 
 def ineq_tou_demand(m):
-    """Requires all net power at time t period p less the peak demand of period p"""
+    """Requires all net power at time t period p less the peak demand of period p; only the hours t in period p have a constraint"""
     mp = m.parent_block()
     def _ineq_tou_demand(_m, p, t):
-        return mp.mask_ds[p][t]*(mp.pnet[t]+mp.pcha[t]-mp.pdis[t])<=mp.ptpk[p]
-    m.tou_demand = Constraint(mp.period, mp.time, rule=_ineq_tou_demand)
+        return mp.pnet[t]+mp.pcha[t]-mp.pdis[t]<=mp.ptpk[p]
+    m.tou_demand = Constraint(mp.period_time, rule=_ineq_tou_demand)
     
 def ineq_nem_xnet(m):
     """Requires all net power at time t less the peak demand"""
@@ -0,0 +1,267 @@
+from __future__ import division, absolute_import
+
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from pyomo.environ import value
+
+from es_gui.tools.optimizer import LINPROG_METHOD
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+
+# Decision variables in column order; 'pfpk' is a scalar, 'ptpk' is indexed over period, and the rest over time.
+VARIABLES = ('s', 'pcha', 'pdis', 'xnet', 'pfpk', 'ptpk')
+
+
+class MatrixModel:
+    """The behind-the-meter LP assembled as sparse matrices for a direct LP interface.
+
+    The formulation mirrors the ExpressionsBlock in constraints.py without the constant net load term of the objective. If highspy is installed, the LP is solved by HiGHS in-process; otherwise, it is solved through scipy.optimize.linprog, i.e., by HiGHS from SciPy 1.6. The LP of a sub-hourly timestep is reduced to the LP of the same month averaged over each hour, which is a quarter of the size at 15 minutes: if the net load and rates are constant within each hour, e.g., for hourly profiles resampled to the timestep, and there is no self-discharge, the hourly solution is optimal; otherwise, the optimal basis of the hourly LP is the starting basis of the sub-hourly LP if highspy is installed.
+    """
+
+    def __init__(self, model):
+        m = model
+
+        self.n_time = m.nhr
+        self.n_period = m.dml
+        self.dt = m.dt
+
+        self.power = value(m.Power_rating)
+        self.transformer = value(m.Transformer_rating)
+        self.sd = value(m.Self_discharge_efficiency)
+        self.rte = value(m.Round_trip_efficiency)
+        self.soc_min = value(m.smin)
+        self.soc_max = value(m.smax)
+        self.soc_init = value(m.State_of_charge_init*m.Energy_capacity)
+
+        self.flt_dr = float(m.flt_dr)
+        self.tou_dr = np.asarray(m.tou_dr, dtype=float)
+
+        try:
+            self.pnet = np.asarray(m.pnet, dtype=float)
+            self.tou_er = np.asarray(m.tou_er, dtype=float)
+            self.nem_sr = np.asarray(m.nem_sr, dtype=float)
+            self.mask_ds = np.asarray(m.mask_ds, dtype=bool).reshape(self.n_period, self.n_time)
+        except ValueError:
+            raise IndexError('The time series could not be converted to arrays of the length of the month.')
+
+        if not len(self.pnet) == len(self.tou_er) == len(self.nem_sr) == self.n_time:
+            raise IndexError('At least one time series is not the length of the month.')
+
+    def _slice(self, var):
+        """Returns the column slice for the decision variable var of an LP of n_time timesteps."""
+        T = self.n_time
+
+        if var == 'pfpk':
+            return slice(4*T, 4*T + 1)
+        elif var == 'ptpk':
+            return slice(4*T + 1, 4*T + 1 + self.n_period)
+
+        start = T*VARIABLES.index(var)
+
+        return slice(start, start + T)
+
+    def _build(self, dt, pnet, tou_er, nem_sr, mask_ds):
+        """Assembles the LP of the given timestep length dt [h] and time series.
+
+        The rows are the state of charge equations, the final state of charge, the peak demand, the TOU demand of each (period, time) pair in mask_ds, and the net export. Returns a dictionary of the objective vector c, the constraint matrix A in CSC format, and the row and column bounds; the first n_eq rows are equations.
+        """
+        T = len(pnet)
+        P = self.n_period
+        n_vars = 4*T + 1 + P
+
+        # Self_discharge_efficiency is the fraction of energy maintained over one hour.
+        sd = self.sd if dt == 1 else self.sd**dt
+
+        # Demand charges are on the peak power [kW]; energy charges are on the energy [kWh] of each time period.
+        c = np.concatenate([np.zeros(T), dt*nem_sr, -dt*nem_sr, dt*(tou_er - nem_sr), [self.flt_dr], self.tou_dr])
+
+        col_lower = np.zeros(n_vars)
+        col_upper = np.full(n_vars, self.transformer)
+        col_lower[:T] = max(self.soc_min, 0)
+        col_upper[:T] = self.soc_max
+        col_upper[T:3*T] = self.power
+
+        eye = sp.identity(T, format='csr')
+        zero = sp.csr_matrix((T, T))
+
+        # State of charge: s[t] - sd*s[t-1] - dt*rte*pcha[t] + dt*pdis[t] == 0, with sd*s[-1] on the right-hand side.
+        soc_rows = sp.hstack([eye - sd*sp.eye(T, k=-1), -dt*self.rte*eye, dt*eye, zero, sp.csr_matrix((T, 1 + P))])
+        final_row = sp.csr_matrix(([1.0], ([0], [T - 1])), shape=(1, n_vars))
+
+        # Net power: pnet[t] + pcha[t] - pdis[t] <= (pfpk, ptpk[p], or xnet[t]).
+        net = sp.hstack([zero, eye, -eye])
+        period, time = np.nonzero(mask_ds)
+        tou_time = sp.csr_matrix((np.ones(len(time)), (np.arange(len(time)), time)), shape=(len(time), T))
+        tou_period = sp.csr_matrix((np.ones(len(time)), (np.arange(len(time)), period)), shape=(len(time), P))
+
+        peak_rows = sp.hstack([net, zero, -sp.csr_matrix(np.ones((T, 1))), sp.csr_matrix((T, P))])
+        tou_rows = sp.hstack([tou_time*net, sp.csr_matrix((len(time), T + 1)), -tou_period])
+        xnet_rows = sp.hstack([net, -eye, sp.csr_matrix((T, 1 + P))])
+
+        A = sp.vstack([soc_rows, final_row, peak_rows, tou_rows, xnet_rows], format='csc')
+
+        b_eq = np.zeros(T + 1)
+        b_eq[0] = sd*self.soc_init
+        b_eq[-1] = self.soc_init
+        b_ub = -np.concatenate([pnet, pnet[time], pnet])
+
+        return {'c': c, 'A': A, 'n_eq': T + 1,
+                'row_lower': np.concatenate([b_eq, np.full(len(b_ub), -np.inf)]), 'row_upper': np.concatenate([b_eq, b_ub]),
+                'col_lower': col_lower, 'col_upper': col_upper}
+
+    def _hourly_maps(self, n_sub):
+        """Returns the hourly LP and, for each column and row of the LP, the index of its counterpart in the hourly LP, or None if the TOU demand periods change within an hour."""
+        T = self.n_time
+        T_hourly = T//n_sub
+        hour = np.arange(T)//n_sub
+
+        mask_ds = self.mask_ds[:, ::n_sub]
+
+        if not np.array_equal(self.mask_ds, np.repeat(mask_ds, n_sub, axis=1)):
+            return None
+
+        hourly_lp = self._build(1.0, self.pnet.reshape(T_hourly, n_sub).mean(axis=1),
+                                self.tou_er[::n_sub], self.nem_sr[::n_sub], mask_ds)
+
+        col_map = np.concatenate([block*T_hourly + hour for block in range(4)]
+                                 + [4*T_hourly + np.arange(1 + self.n_period)])
+
+        # TOU demand rows are ordered by (period, time).
+        tou_index = np.full(mask_ds.shape, -1)
+        tou_index[mask_ds] = np.arange(mask_ds.sum())
+        period, time = np.nonzero(self.mask_ds)
+
+        n_tou_hourly = len(tou_index[mask_ds])
+        row_map = np.concatenate([hour, [T_hourly], T_hourly + 1 + hour,
+                                  2*T_hourly + 1 + tou_index[period, time//n_sub],
+                                  2*T_hourly + 1 + n_tou_hourly + hour])
+
+        return hourly_lp, col_map, row_map
+
+    def _is_hourly(self, n_sub):
+        """Returns True if the LP is the hourly LP with each hour split into n_sub timesteps, i.e., the net load and rates are constant within each hour and there is no self-discharge."""
+        T_hourly = self.n_time//n_sub
+
+        return self.sd == 1 and all(np.all(series.reshape(T_hourly, n_sub) == series[::n_sub, np.newaxis])
+                                    for series in (self.pnet, self.tou_er, self.nem_sr))
+
+    def _spread(self, x_hourly, col_map, n_sub):
+        """Returns the column values of the LP that spread the hourly LP column values x_hourly evenly over each hour."""
+        T_hourly = self.n_time//n_sub
+        x = x_hourly[col_map]
+
+        # The state of charge changes linearly within each hour.
+        s_hourly = np.concatenate([[self.soc_init], x_hourly[:T_hourly]])
+        fraction = (np.arange(self.n_time) % n_sub + 1)/n_sub
+        hour = np.arange(self.n_time)//n_sub
+
+        x[self._slice('s')] = s_hourly[hour] + fraction*(s_hourly[hour + 1] - s_hourly[hour])
+
+        return x
+
+    def solve(self):
+        """Solves the LP with HiGHS and returns a dictionary of decision variable arrays."""
+        n_sub = int(round(1/self.dt))
+        hourly = None
+
+        if n_sub > 1 and np.isclose(n_sub*self.dt, 1) and self.n_time % n_sub == 0:
+            hourly = self._hourly_maps(n_sub)
+
+        if hourly is not None and self._is_hourly(n_sub):
+            # The hourly LP solution spread evenly over each hour is optimal: the hourly dual values, with the inequality duals scaled by dt, satisfy the dual constraints of the LP and give the same objective.
+            hourly_lp, col_map, _ = hourly
+
+            x_hourly = _solve_linprog(hourly_lp) if highspy is None else _solve_highs(hourly_lp)[0]
+            x = self._spread(x_hourly, col_map, n_sub)
+        else:
+            lp = self._build(self.dt, self.pnet, self.tou_er, self.nem_sr, self.mask_ds)
+
+            if highspy is None:
+                x = _solve_linprog(lp)
+            else:
+                basis = None
+
+                if hourly is not None:
+                    hourly_lp, col_map, row_map = hourly
+
+                    # The hourly LP only provides a starting point; it is not required to be solvable.
+                    try:
+                        _, hourly_basis = _solve_highs(hourly_lp)
+                    except AssertionError:
+                        logging.info('MatrixModel: The hourly LP could not be solved, solving without a starting basis...')
+                    else:
+                        # The status lists are copied on each access.
+                        col_status = hourly_basis.col_status
+                        row_status = hourly_basis.row_status
+
+                        basis = highspy.HighsBasis()
+                        basis.col_status = [col_status[ix] for ix in col_map]
+                        basis.row_status = [row_status[ix] for ix in row_map]
+                        basis.valid = True
+
+                x, _ = _solve_highs(lp, basis)
+
+        solution = {var: x[self._slice(var)] for var in VARIABLES}
+        solution['pfpk'] = float(solution['pfpk'][0])
+
+        return solution
+
+
+def _solve_linprog(lp):
+    """Solves the LP dictionary lp (see MatrixModel._build()) with scipy.optimize.linprog and returns the optimal column values."""
+    n_eq = lp['n_eq']
+    A = lp['A'].tocsr()
+
+    res = linprog(lp['c'], A_ub=A[n_eq:], b_ub=lp['row_upper'][n_eq:], A_eq=A[:n_eq], b_eq=lp['row_upper'][:n_eq],
+                  bounds=np.column_stack([lp['col_lower'], lp['col_upper']]), method=LINPROG_METHOD)
+
+    if res.status != 0:
+        logging.error('MatrixModel: An optimal solution could not be obtained. (solver status: {0})'.format(res.message))
+        raise(AssertionError('An optimal solution could not be obtained. (solver status: {0})'.format(res.message)))
+
+    return res.x
+
+
+def _solve_highs(lp, basis=None):
+    """Solves the LP dictionary lp (see MatrixModel._build()) with highspy, starting from basis if given, and returns the optimal column values and basis."""
+    A = lp['A']
+
+    highs_lp = highspy.HighsLp()
+    highs_lp.num_col_, highs_lp.num_row_ = A.shape[1], A.shape[0]
+    highs_lp.col_cost_ = lp['c']
+    highs_lp.col_lower_ = lp['col_lower']
+    highs_lp.col_upper_ = lp['col_upper']
+    highs_lp.row_lower_ = lp['row_lower']
+    highs_lp.row_upper_ = lp['row_upper']
+    highs_lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    highs_lp.a_matrix_.start_ = A.indptr
+    highs_lp.a_matrix_.index_ = A.indices
+    highs_lp.a_matrix_.value_ = A.data
+
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    h.passModel(highs_lp)
+
+    if basis is not None:
+        if h.setBasis(basis) == highspy.HighsStatus.kOk:
+            # Computing the exact steepest edge weights of a basis that is not all slacks takes longer than the warm-started solve.
+            h.setOptionValue('simplex_dual_edge_weight_strategy', 1)
+        else:
+            logging.info('MatrixModel: The starting basis was rejected, solving without it...')
+
+    h.run()
+    model_status = h.getModelStatus()
+
+    if model_status != highspy.HighsModelStatus.kOptimal:
+        status = h.modelStatusToString(model_status)
+        logging.error('MatrixModel: An optimal solution could not be obtained. (solver status: {0})'.format(status))
+        raise(AssertionError('An optimal solution could not be obtained. (solver status: {0})'.format(status)))
+
+    return np.asarray(h.getSolution().col_value), h.getBasis()
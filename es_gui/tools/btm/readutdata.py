@@ -4,12 +4,14 @@ Created on Tue Nov 13 14:48:42 2018
 
 @author: tunguy
 """
+import logging
 import urllib.request
 import os
 import pandas as pd
 from pandas.io.json import json_normalize
 import numpy as np
 import json
+import functools
 import holidays
 from datetime import datetime
 import datetime as dt
@@ -183,52 +185,90 @@ def find_utschld(**kwargs):
 #    schld_data=json_normalize(schld['items'])
     return schld['items'] # this is a list of schedules in which each element contains the full details of a schedule.
 
-def read_load_profile(path, month):
-    """Reads the annual load profile file located at path and returns the array of the load profile for the given month."""
+def read_annual_load_profile(path):
+    """Reads the annual load profile file located at path and returns the array of the load profile of every time period of the year, e.g., every hour; see get_profile_timestep()."""
     load_df = pd.read_csv(path)
 
-    if isinstance(month, str):
-        month = int(month)
-
-    # Assumptions: column 0 is datetime, column 1 is data
-    datetime_column_name = load_df.columns[0]
-    data_column_name = load_df.columns[-1]
-
-    # Overwrite DateTime column (esp. for data obtained from OpenEI)
-    datetime_start = datetime(2019, 1, 1, 0)
-    hour_range = pd.date_range(start=datetime_start, periods=len(load_df), freq="H")
-    load_df[datetime_column_name] = hour_range
-
-    # Filter by given month.
-    datetime_column = pd.to_datetime(load_df[datetime_column_name])
-    load_df_month = load_df.loc[datetime_column.apply(lambda x: x.month == month)]
-    load_profile = load_df_month[data_column_name].values
+    # Assumptions: column 0 is datetime, column 1 is data; the datetimes are ignored (esp. for data obtained from OpenEI) and the rows are taken to be consecutive time periods starting January 1.
+    load_profile = load_df[load_df.columns[-1]].to_numpy(dtype=float)
+    load_profile.setflags(write=False)
 
     return load_profile
 
-def read_pv_profile(path, month):
-    """Reads the annual PV profile file located at path and returns the array of the PV profile for the given month."""
-    if isinstance(month, str):
-        month = int(month)
-    
+def read_annual_pv_profile(path):
+    """Reads the annual PV profile file located at path and returns the array of the PV profile (kW) of every time period of the year, e.g., every hour; see get_profile_timestep()."""
     with open(path) as f:
         profile_obj = json.load(f)
-        
-    pv_output_w = profile_obj['outputs']['ac']
 
     # Convert to kW.
-    df_pv_output = pd.DataFrame(pv_output_w, columns=['kW'])*1e-3
+    pv_output_kw = np.asarray(profile_obj['outputs']['ac'], dtype=float)*1e-3
+    pv_output_kw.setflags(write=False)
 
-    # Apply datetime index for filtering.
-    datetime_start = datetime(2019, 1, 1, 0)
-    hour_range = pd.date_range(start=datetime_start, periods=len(pv_output_w), freq='H')
-    df_pv_output['dt'] = hour_range
+    return pv_output_kw
 
-    # Filter by given month.
-    df_pv_month = df_pv_output.loc[df_pv_output['dt'].apply(lambda x: x.month == month)]
-    pv_output_kw = df_pv_month['kW'].values
+def get_profile_timestep(n_values):
+    """Returns the timestep [minutes] of an annual profile with n_values values, e.g., 60 for 8760 or 8784 values or 15 for 35040 values. Profiles that do not cover a whole year at a timestep that evenly divides an hour are taken to be hourly."""
+    for n_days in (365, 366):
+        if n_values and (n_days*24*60) % n_values == 0 and 60 % ((n_days*24*60)//n_values) == 0:
+            return (n_days*24*60)//n_values
 
-    return pv_output_kw
+    return 60
+
+def resample_profile(profile, timestep=60):
+    """Returns the annual profile array resampled to one value per timestep [minutes]; see get_profile_timestep(). Values are repeated for shorter timesteps and averaged over longer ones so that the energy of each time period is preserved. The profile itself is returned if it already has the timestep."""
+    profile_timestep = get_profile_timestep(len(profile))
+
+    if profile_timestep == timestep:
+        return profile
+    elif profile_timestep % timestep == 0:
+        resampled = np.repeat(profile, profile_timestep//timestep)
+    elif timestep % profile_timestep == 0:
+        n_steps = timestep//profile_timestep
+        resampled = np.asarray(profile)[:len(profile)//n_steps*n_steps].reshape(-1, n_steps).mean(axis=1)
+    else:
+        raise ValueError('Cannot resample a profile with a timestep of {0} minutes to {1} minutes.'.format(profile_timestep, timestep))
+
+    resampled.setflags(write=False)
+
+    return resampled
+
+def get_month_profile(profile, month, year=2019, timestep=60):
+    """Returns the given month of the annual profile array, which has one value per timestep [minutes] starting January 1 of year.
+
+    The months are located by the profile's own year length. If the profile covers 365 days and year is a leap year, the last day of February is repeated for February 29; if it covers 366 days and year is not, February 29 is dropped. Otherwise, the month is a view of the profile.
+    """
+    month = int(month)
+    steps_per_day = 24*60//timestep
+    offsets = month_offsets(year, timestep)
+
+    year_days = offsets[-1]//steps_per_day
+    profile_days = len(profile)//steps_per_day
+
+    if len(profile) % steps_per_day or profile_days not in (365, 366) or profile_days == year_days:
+        return profile[offsets[month - 1]:offsets[month]]
+
+    # Any year with the profile's length has the same month lengths.
+    profile_offsets = month_offsets(2020 if profile_days == 366 else 2019, timestep)
+    month_profile = profile[profile_offsets[month - 1]:profile_offsets[month]]
+
+    if month == 2:
+        if profile_days < year_days:
+            logging.warning('readutdata: The profile covers {0} days but {1} has {2}; repeating February 28 for February 29.'.format(profile_days, year, year_days))
+            month_profile = np.concatenate([month_profile, month_profile[-steps_per_day:]])
+            month_profile.setflags(write=False)
+        else:
+            logging.warning('readutdata: The profile covers {0} days but {1} has {2}; dropping February 29.'.format(profile_days, year, year_days))
+            month_profile = month_profile[:-steps_per_day]
+
+    return month_profile
+
+def read_load_profile(path, month, timestep=60):
+    """Reads the annual load profile file located at path and returns the array of the load profile for the given month with one value per timestep [minutes]."""
+    return get_month_profile(resample_profile(read_annual_load_profile(path), timestep), month, timestep=timestep)
+
+def read_pv_profile(path, month, timestep=60):
+    """Reads the annual PV profile file located at path and returns the array of the PV profile for the given month with one value per timestep [minutes]."""
+    return get_month_profile(resample_profile(read_annual_pv_profile(path), timestep), month, timestep=timestep)
 
 def get_pv_profile_string(path):
     """Reads the PV profile JSON object and returns a list of string descriptors."""
@@ -265,7 +305,148 @@ def get_pv_profile_string(path):
     return descriptors
 
 
-def input_df(year,wkday_eschld,wkend_eschld,wkday_dschld,wkend_dschld):
+# Number of (year, timestep, schedules) rate calendars kept in memory.
+RATE_CALENDAR_CACHE_SIZE = 64
+
+
+class RateCalendar:
+    """
+    The time-of-use energy and demand periods of every timestep of a year, as arrays.
+
+    :ivar month: The month (1-12) of each timestep.
+    :ivar day: The day of the month of each timestep.
+    :ivar hour: The hour (1-24) of each timestep.
+    :ivar minute: The minute of the hour at the start of each timestep.
+    :ivar tou_energy_schedule: The time-of-use energy period of each timestep.
+    :ivar tou_demand_schedule: The time-of-use demand period of each timestep.
+    :ivar month_offsets: The index of the first timestep of each month; month m spans month_offsets[m-1]:month_offsets[m].
+    """
+    __slots__ = ('year', 'timestep', 'month', 'day', 'hour', 'minute',
+                 'tou_energy_schedule', 'tou_demand_schedule', 'month_offsets')
+
+    def get_month(self, month):
+        """Returns read-only views of the time-of-use energy and demand periods of the given month."""
+        month_slice = slice(self.month_offsets[month - 1], self.month_offsets[month])
+
+        return self.tou_energy_schedule[month_slice], self.tou_demand_schedule[month_slice]
+
+    def to_dataframe(self):
+        """Returns the calendar as a DataFrame with the template |year|month|day|hour|tou_energy_schedule|tou_demand_schedule|, plus a minute column for sub-hourly timesteps."""
+        columns = {'year': np.full(len(self.month), self.year), 'month': self.month, 'day': self.day, 'hour': self.hour}
+
+        if self.timestep < 60:
+            columns['minute'] = self.minute
+
+        columns['tou_energy_schedule'] = self.tou_energy_schedule
+        columns['tou_demand_schedule'] = self.tou_demand_schedule
+
+        return pd.DataFrame(columns)
+
+
+@functools.lru_cache(maxsize=None)
+def _year_calendar(year, timestep):
+    """Returns the month, day, hour, minute, and weekend-or-holiday arrays of each timestep of year; memoized per (year, timestep)."""
+    days = np.arange(np.datetime64('{0:04d}-01-01'.format(year)), np.datetime64('{0:04d}-01-01'.format(year + 1)), dtype='datetime64[D]')
+
+    # 1970-01-01 was a Thursday; Monday is 0.
+    day_of_week = (days.astype(np.int64) + 3) % 7
+
+    us_holidays = np.array([date for date in holidays.UnitedStates(years=year)], dtype='datetime64[D]')
+    is_weekend_day = (day_of_week > 4) | np.isin(days, us_holidays)
+
+    month_of_day = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    day_of_month = (days - days.astype('datetime64[M]')).astype(np.int64) + 1
+
+    steps_per_day = 24*60//timestep
+    step_minutes = np.arange(steps_per_day)*timestep
+
+    calendar = {'month': np.repeat(month_of_day, steps_per_day),
+                'day': np.repeat(day_of_month, steps_per_day),
+                'hour': np.tile(step_minutes//60 + 1, len(days)),
+                'minute': np.tile(step_minutes % 60, len(days)),
+                'is_weekend': np.repeat(is_weekend_day, steps_per_day),
+                }
+
+    for array in calendar.values():
+        array.setflags(write=False)
+
+    return calendar
+
+
+@functools.lru_cache(maxsize=None)
+def month_offsets(year, timestep=60):
+    """Returns the index of the first timestep of each month of year; month m spans month_offsets[m-1]:month_offsets[m]. Memoized per (year, timestep)."""
+    offsets = np.searchsorted(_year_calendar(int(year), int(timestep))['month'], np.arange(1, 14))
+    offsets.setflags(write=False)
+
+    return offsets
+
+
+def _schedule_key(schedule):
+    """Returns the 12x24 schedule as a tuple of tuples to key the memoized calendars by, or None if no schedule is given."""
+    if len(schedule) > 1:
+        return tuple(tuple(int(period) for period in row) for row in schedule)
+
+
+@functools.lru_cache(maxsize=RATE_CALENDAR_CACHE_SIZE)
+def _rate_calendar(year, timestep, wkday_eschld, wkend_eschld, wkday_dschld, wkend_dschld):
+    """Returns the RateCalendar of the schedules given as tuples of tuples; memoized per (year, timestep, schedules)."""
+    year_calendar = _year_calendar(year, timestep)
+
+    month_ix = year_calendar['month'] - 1
+    hour_ix = year_calendar['hour'] - 1
+    is_weekend = year_calendar['is_weekend']
+
+    def _gather(weekday_schedule, weekend_schedule):
+        # Missing (e.g., empty demand) schedules are period 0.
+        weekday_periods = np.asarray(weekday_schedule)[month_ix, hour_ix] if weekday_schedule is not None else 0
+        weekend_periods = np.asarray(weekend_schedule)[month_ix, hour_ix] if weekend_schedule is not None else 0
+
+        periods = np.where(is_weekend, weekend_periods, weekday_periods)
+        periods.setflags(write=False)
+
+        return periods
+
+    rate_calendar = RateCalendar()
+    rate_calendar.year = year
+    rate_calendar.timestep = timestep
+    rate_calendar.month = year_calendar['month']
+    rate_calendar.day = year_calendar['day']
+    rate_calendar.hour = year_calendar['hour']
+    rate_calendar.minute = year_calendar['minute']
+    rate_calendar.tou_energy_schedule = _gather(wkday_eschld, wkend_eschld)
+    rate_calendar.tou_demand_schedule = _gather(wkday_dschld, wkend_dschld)
+    rate_calendar.month_offsets = month_offsets(year, timestep)
+
+    return rate_calendar
+
+
+def rate_calendar(year, wkday_eschld, wkend_eschld, wkday_dschld, wkend_dschld, timestep=60):
+    """
+    Builds the time-of-use calendar of a rate structure for every timestep of the given year from its 12x24 weekday and weekend schedules.
+
+    Weekends and US holidays use the weekend schedules; an empty demand schedule is period 0 throughout. Calendars are memoized per year, timestep, and schedules, so repeated runs with the same rate structure do not rebuild them.
+
+    :param year: The year of the calendar.
+    :param wkday_eschld: A 12x24 array-like, wkday_eschld[i][j] is the tou energy schedule of hour j+1 in a weekday of month i+1
+    :param wkend_eschld: A 12x24 array-like, wkend_eschld[i][j] is the tou energy schedule of hour j+1 in a weekend day or a holiday of month i+1
+    :param wkday_dschld: A 12x24 array-like, wkday_dschld[i][j] is the tou demand schedule of hour j+1 in a weekday of month i+1
+    :param wkend_dschld: A 12x24 array-like, wkend_dschld[i][j] is the tou demand schedule of hour j+1 in a weekend day or a holiday of month i+1
+    :param timestep: The length of each timestep in minutes; must divide an hour evenly, e.g., 15, 30, or 60.
+    :return: A RateCalendar; its arrays are shared between calls and read-only.
+    """
+    year = int(year)
+    timestep = int(timestep)
+
+    if timestep <= 0 or 60 % timestep != 0:
+        raise ValueError('The timestep must evenly divide an hour, e.g., 15, 30, or 60 minutes.')
+
+    schedules = [_schedule_key(schedule) for schedule in (wkday_eschld, wkend_eschld, wkday_dschld, wkend_dschld)]
+
+    return _rate_calendar(year, timestep, *schedules)
+
+
+def input_df(year,wkday_eschld,wkend_eschld,wkday_dschld,wkend_dschld,timestep=60):
     """
     Generate a Pandas dataframe from the downloaded rate schedule data.
     :param year: an integer.
@@ -273,37 +454,11 @@ def input_df(year,wkday_eschld,wkend_eschld,wkday_dschld,wkend_dschld):
     :param wkend_eschld: a 12x24 NumPy array, wkend_schld[i][j] is the tou energy schedule of hour j+1 in a weekend day or a holiday of month i+1
     :param wkday_dschld: a 12x24 NumPy array, wkday_schld[i][j] is the tou demand schedule of hour j+1 in a weekday of month i+1
     :param wkend_dschld: a 12x24 NumPy array, wkend_schld[i][j] is the tou demand schedule of hour j+1 in a weekend day or a holiday of month i+1
+    :param timestep: the length of each row in minutes; see rate_calendar().
     
-    :return opt_df: a Pandas dataframe with the following template:|year|month|day|hour|tou_energy_schedule|tou_demand_schedule|
+    :return opt_df: a Pandas dataframe with the following template:|year|month|day|hour|tou_energy_schedule|tou_demand_schedule|, plus a minute column for sub-hourly timesteps
     """
-    column_list=['year','month','day','hour','tou_energy_schedule','tou_demand_schedule']
-    data_list=[]
-    nday={1:31,2:28,3:31,4:30,5:31,6:30,7:31,8:31,9:30,10:31,11:30,12:31}
-    
-    if int(year)%4==0:
-        nday[2]=29
-        
-    us_holidays=holidays.UnitedStates()
-    for month in range(1,13):
-        for day in range(1,nday[month]+1):
-            date=datetime(year, month, day)
-            dayofweek = date.weekday()
-            for hour in range(1,25):
-                if (date in us_holidays) or (dayofweek>4):
-                    if len(wkend_dschld)>1:  
-                        row=[year,month,day,hour,wkend_eschld[month-1][hour-1],wkend_dschld[month-1][hour-1]]
-                    else:
-                        row=[year,month,day,hour,wkend_eschld[month-1][hour-1],0]
-                else:
-                    if len(wkday_dschld)>1:  
-                        row=[year,month,day,hour,wkday_eschld[month-1][hour-1],wkday_dschld[month-1][hour-1]]
-                    else:
-                        row=[year,month,day,hour,wkday_eschld[month-1][hour-1],0]
-                    
-                data_list.append(row)
-    opt_df=pd.DataFrame(data=data_list,columns=column_list)
-
-    return opt_df
+    return rate_calendar(year, wkday_eschld, wkend_eschld, wkday_dschld, wkend_dschld, timestep=timestep).to_dataframe()
                     
 # Example             
 #utdataframe = download_utdata(https_proxy="wwwproxy.sandia.gov:80")
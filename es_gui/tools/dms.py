@@ -1,92 +1,405 @@
 from __future__ import print_function, absolute_import
 
+import ast
 from collections import OrderedDict
+import functools
+import hashlib
+import json
 import pickle
 import logging
 import os
+import sys
+import threading
 
 import numpy as np
 
 
+def _synchronized(method):
+    """Decorates a DataManagementSystem method to hold the instance's lock while it runs."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class _InFlightLoad():
+    """The shared outcome of a load that callers for the same key wait on."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Shard():
+    """A placeholder for an entry persisted on disk that has not been loaded yet."""
+    __slots__ = ('fname', 'size')
+
+    def __init__(self, fname, size):
+        self.fname = fname
+        self.size = size
+
+
 class DataManagementSystem():
     """
-    A class used to store processed DataFrames as NumPy ndarrays and manage memory consumed. Data is stored in nested dictionaries up to a depth of 2: {key_0: {key_0_0: data}}. When the calculated memory exceeds max_memory, the dictionary at depth 1 at the front of the queue is popped out of the dictionary until the memory consumption is less than the maximum. The queue is determined by time of accessing. Accessing or adding to the structure at any depth will push the depth 1 dictionary to the back of the queue.
+    A class used to store processed DataFrames as NumPy ndarrays and manage memory consumed. Data is stored in nested dictionaries up to a depth of 2: {key_0: {key_0_0: data}}. When the memory occupied exceeds max_memory, the dictionary at depth 1 at the front of the queue is popped out of the dictionary until the memory consumption is less than the maximum. The queue is determined by time of accessing. Accessing or adding to the structure at any depth will push the depth 1 dictionary to the back of the queue.
+
+    The size of each depth 1 entry is computed once when it is added, so the memory used is maintained incrementally and adding, retrieving, and evicting entries take constant time. Data is not saved when it is added; call save_state() to persist the data, e.g., after a batch of requests has been processed.
+
+    Persisted data is sharded: each depth 1 entry is saved as its own file (.npy for ndarrays, a pickle otherwise) in a directory named after save_name, with a manifest recording the keys, files, sizes, and queue order. On startup only the manifest is read; each entry is loaded, memory-mapped for ndarrays, the first time it is retrieved. Saving only writes the entries added since the last save and removes the files of evicted entries.
+
+    All operations on the data are thread-safe. Use load_once() to load data so that concurrent requests for the same data share a single load.
 
-    :param save_name: The path/filename to pickle the DMS's data.
+    :param save_name: The path/filename to save the DMS's data; the shards are saved in a directory with the same name without the extension.
     :param max_memory: The maximum amount of memory, in bytes, that the contained ndarrays may collectively occupy.
     """
+    MANIFEST_NAME = 'manifest.json'
+
     def __init__(self, save_name, save_data=False, max_memory=500000):
         self.memory_used = 0
         self.max_memory = max_memory
         self.save_data = save_data
         self.save_name = save_name
+        self.save_dir = os.path.splitext(save_name)[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Guards self.data and the bookkeeping below; reentrant because, e.g., add_data() evicts with pop().
+        self._lock = threading.RLock()
+
+        # Loads in progress keyed by id_key.
+        self._in_flight = {}
+
+        # Size in bytes of each depth 1 entry.
+        self._sizes = {}
+
+        # Shard file of each persisted entry, keys added since the last save, and shard files of entries removed since the last save.
+        self._shard_fnames = {}
+        self._unsaved_keys = set()
+        self._removed_files = set()
+
+        # True if self.data has changed since it was last saved.
+        self._modified = False
+
+        self.data = OrderedDict()
 
         try:
-            with open(self.save_name, 'rb') as pfile:
-                self.data = pickle.load(pfile)
-                logging.info('DMS: Successfully loaded {fname}.'.format(fname=self.save_name))
-        except FileNotFoundError:
+            self._load_manifest()
+        except (IOError, OSError, ValueError, KeyError, SyntaxError):
+            logging.error('DMS: Could not read the manifest; purging and restarting DMS.')
+            self.delete_shards()
             self.data = OrderedDict()
-        except pickle.PickleError:
+            self._shard_fnames = {}
+
+        if os.path.isfile(self.save_name):
+            self._load_pickle()
+
+        for key, value in self.data.items():
+            self._sizes[key] = self._compute_size(value)
+
+        self.memory_used = sum(self._sizes.values())
+
+    def _load_manifest(self):
+        """Reads the queue of persisted entries from the manifest without loading any of the entries."""
+        manifest_path = os.path.join(self.save_dir, self.MANIFEST_NAME)
+
+        if not os.path.exists(manifest_path):
+            return
+
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+        for encoded_key, fname, size in manifest['entries']:
+            key = self._decode_key(encoded_key)
+            self.data[key] = _Shard(fname, size)
+            self._shard_fnames[key] = fname
+
+        logging.info('DMS: Successfully loaded {fname}.'.format(fname=manifest_path))
+
+    def _load_pickle(self):
+        """Loads data persisted as a single pickle by previous versions; it is re-saved as shards on the next save."""
+        try:
+            with open(self.save_name, 'rb') as pfile:
+                legacy_data = pickle.load(pfile)
+        except (pickle.PickleError, EOFError):
             logging.error('DMS: Could not unpickle data; purging and restarting DMS.')
             self.delete_pickle()
-            self.data = OrderedDict()
-    
+            return
+
+        logging.info('DMS: Successfully loaded {fname}.'.format(fname=self.save_name))
+
+        for key, value in legacy_data.items():
+            if key not in self.data:
+                self.data[key] = value
+                self._unsaved_keys.add(key)
+                self._modified = True
+
+    @property
+    def stats(self):
+        """A dictionary of cache statistics: entries, memory used (bytes), hits, misses, and evictions."""
+        return {'entries': len(self.data),
+                'memory_used': self.memory_used,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                }
+
     def delete_pickle(self):
-        """Deletes the pickle file used for self.data object persistence."""
-        os.remove(self.save_data)
+        """Deletes the pickle file used for self.data object persistence by previous versions."""
+        os.remove(self.save_name)
+
+    def delete_shards(self):
+        """Deletes the manifest and every shard file used for self.data object persistence."""
+        if not os.path.isdir(self.save_dir):
+            return
+
+        for fname in os.listdir(self.save_dir):
+            os.remove(os.path.join(self.save_dir, fname))
+
+    @staticmethod
+    def _encode_key(key):
+        """Returns key as a JSON value for the manifest. Strings are saved as is; other keys, e.g., tuples, are saved as their repr so that they are restored with the same type."""
+        if isinstance(key, str):
+            return key
+
+        encoded_key = repr(key)
+
+        try:
+            round_trips = ast.literal_eval(encoded_key) == key
+        except (ValueError, SyntaxError):
+            round_trips = False
+
+        if not round_trips:
+            raise TypeError('Cannot persist the DMS key {0}; keys must be strings or literals such as numbers and tuples thereof.'.format(encoded_key))
+
+        return {'repr': encoded_key}
+
+    @staticmethod
+    def _decode_key(encoded_key):
+        """Returns the key saved in the manifest as encoded_key."""
+        if isinstance(encoded_key, dict):
+            return ast.literal_eval(encoded_key['repr'])
+
+        return encoded_key
+
+    @staticmethod
+    def _shard_name(key):
+        """Returns the base file name of the shard for key."""
+        # Non-string keys are tagged with their type so that, e.g., 7 and '7' do not share a shard.
+        name = key if isinstance(key, str) else repr((type(key).__name__, key))
 
+        return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+    def _write_shard(self, key, value):
+        """Saves value to its own file in save_dir and returns the file name."""
+        if isinstance(value, np.ndarray):
+            fname = self._shard_name(key) + '.npy'
+        else:
+            fname = self._shard_name(key) + '.p'
+
+        fpath = os.path.join(self.save_dir, fname)
+
+        # Write to a temporary file first so that a crash never leaves a partially written shard.
+        with open(fpath + '.tmp', 'wb') as f:
+            if isinstance(value, np.ndarray):
+                np.save(f, value)
+            else:
+                pickle.dump(value, f, protocol=3)
+
+        os.replace(fpath + '.tmp', fpath)
+
+        return fname
+
+    def _load_shard(self, key):
+        """Replaces the placeholder for key with the persisted entry. ndarrays are memory-mapped."""
+        shard = self.data[key]
+        fpath = os.path.join(self.save_dir, shard.fname)
+
+        try:
+            if shard.fname.endswith('.npy'):
+                value = np.load(fpath, mmap_mode='r')
+            else:
+                with open(fpath, 'rb') as f:
+                    value = pickle.load(f)
+        except (IOError, OSError, pickle.PickleError, EOFError, ValueError):
+            logging.error('DMS: Could not load the shard for {0}; discarding it.'.format(key))
+            self.data.pop(key)
+            self.memory_used -= self._sizes.pop(key, 0)
+            self._modified = True
+            raise KeyError(key)
+
+        self.data[key] = value
+
+    @_synchronized
     def save_state(self):
-        """Pickles self.data at self.save_name."""
-        if self.save_data:
-            logging.info('DMS: Saving {0}.'.format(self.save_name))
-            with open(self.save_name, 'wb') as pfile:
-                pickle.dump(self.data, pfile, protocol=3)
+        """Saves the entries added since the last save as shards in save_dir and updates the manifest if self.data has changed since it was last saved."""
+        if not (self.save_data and self._modified):
+            return
+
+        logging.info('DMS: Saving {0}.'.format(self.save_dir))
+        os.makedirs(self.save_dir, exist_ok=True)
+
+        entries = []
+
+        for key, value in self.data.items():
+            try:
+                encoded_key = self._encode_key(key)
+            except TypeError as e:
+                logging.warning('DMS: {0} Not saving it.'.format(e))
+                continue
+
+            if isinstance(value, _Shard):
+                fname = value.fname
+            elif key in self._unsaved_keys or key not in self._shard_fnames:
+                fname = self._write_shard(key, value)
+            else:
+                fname = self._shard_fnames[key]
+
+            entries.append([key, encoded_key, fname])
+
+        manifest_path = os.path.join(self.save_dir, self.MANIFEST_NAME)
+
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump({'entries': [[encoded_key, fname, self._sizes[key]] for key, encoded_key, fname in entries]}, f)
+
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        self._shard_fnames = {key: fname for key, encoded_key, fname in entries}
+
+        # Remove the files of evicted entries that are not referenced anymore.
+        self._removed_files -= set(self._shard_fnames.values())
+
+        for fname in list(self._removed_files):
+            try:
+                os.remove(os.path.join(self.save_dir, fname))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # The file may still be memory-mapped, e.g., on Windows; try again on the next save.
+                continue
 
+            self._removed_files.discard(fname)
+
+        if os.path.isfile(self.save_name):
+            # The data persisted by previous versions has been migrated to shards.
+            self.delete_pickle()
+
+        self._unsaved_keys.clear()
+        self._modified = False
+
+    @_synchronized
     def pop(self):
         """Shortcut for popping the queue of the OrderedDict."""
         k, v = self.data.popitem(last=False)
-        print('Popped: ', (k))
+        self.memory_used -= self._sizes.pop(k, 0)
+        self._unsaved_keys.discard(k)
+
+        if k in self._shard_fnames:
+            self._removed_files.add(self._shard_fnames[k])
+        self.evictions += 1
+        self._modified = True
+        logging.info('DMS: Popped {0}'.format(k))
+
+        return k, v
 
+    @_synchronized
     def requeue(self, key):
         """Moves self.data[key] to the back of the queue for being purged."""
 
         if key in self.data:
-            to_requeue = self.data.pop(key)
-            self.data[key] = to_requeue
+            self.data.move_to_end(key)
 
+    @_synchronized
     def manage_memory(self):
         """Pops entries from the queue until occupied memory is less than the maximum allocated."""
-        dms_sz = self.compute_memory()
+        if self.memory_used > self.max_memory:
+            logging.info('DMS: Memory limit exceeded ({0} of {1} bytes used). Purging old data...'.format(self.memory_used, self.max_memory))
 
-        while dms_sz > self.max_memory:
-            print('Memory limit exceeded. Purging old data...')
-            print('Currently using: ', dms_sz, 'bytes')
-            print('Maximum allowed: ', self.max_memory, 'bytes')
-            self.pop()
-            dms_sz = self.compute_memory()
-            print('Now using: ', dms_sz, 'bytes')
+            while self.memory_used > self.max_memory and self.data:
+                self.pop()
 
-        self.save_state()
+            logging.info('DMS: Now using {0} bytes.'.format(self.memory_used))
 
+    @staticmethod
+    def _compute_size(value):
+        """Computes the memory footprint of a single entry."""
+        if isinstance(value, _Shard):
+            return value.size
+        elif isinstance(value, np.ndarray):
+            return value.nbytes
+        elif isinstance(value, dict):
+            return sum(DataManagementSystem._compute_size(v) for v in value.values())
+        elif hasattr(value, 'memory_usage'):
+            # pandas objects
+            return int(np.sum(value.memory_usage(deep=True)))
+        else:
+            return sys.getsizeof(value)
+
+    @_synchronized
     def compute_memory(self):
-        """Computes the memory footprint of the entire data structure."""
-        def _compute_memory(coll):
-            dms_sz = 0
+        """Recomputes the memory footprint of the entire data structure."""
+        for key, value in self.data.items():
+            self._sizes[key] = self._compute_size(value)
+
+        self.memory_used = sum(self._sizes.values())
+        return self.memory_used
+
+    def load_once(self, key, loader, lookup=None):
+        """Calls loader() to load the data identified by key and returns its result. If a load for the same key is already in progress in another thread, waits for it and returns its result instead of loading the data again.
+
+        loader is responsible for adding the data to the DMS, e.g., with add_data(). It is called without holding the lock so that loads of different keys run concurrently. If given, lookup() is called before loader() and its result is returned unless it raises KeyError; it should retrieve the data from the DMS in case a load finished after the caller last looked.
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+
+            if in_flight is None:
+                in_flight = self._in_flight[key] = _InFlightLoad()
+                is_loader = True
+            else:
+                is_loader = False
 
-            for value in coll.values():
-                if isinstance(value, np.ndarray):
-                    array_sz = value.nbytes
-                else:
-                    array_sz = _compute_memory(value)
+        if not is_loader:
+            logging.info('DMS: Waiting for data already being loaded...')
+            in_flight.done.wait()
 
-                dms_sz += array_sz
-            return dms_sz
+            if in_flight.error is not None:
+                raise in_flight.error
 
-        dms_sz = _compute_memory(self.data)
-        self.memory_used = dms_sz
-        return dms_sz
+            return in_flight.value
 
+        try:
+            try:
+                if lookup is None:
+                    raise KeyError(key)
+
+                with self._lock:
+                    misses = self.misses
+
+                    try:
+                        in_flight.value = lookup()
+                    except KeyError:
+                        # The caller has already counted this miss.
+                        self.misses = misses
+                        raise
+            except KeyError:
+                in_flight.value = loader()
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+            in_flight.done.set()
+
+        return in_flight.value
+
+    @_synchronized
     def add_data(self, value, *args):
         """Adds value to self.data[arg[0]][...][arg[N-1]]. Requeues self.data[arg[0]] after updating."""
 
@@ -112,13 +425,33 @@ class DataManagementSystem():
         #         tmp_dict = value
         #     finally:
         #         self.data[args[0]] = tmp_dict
-        self.data[args[0]] = value
+        key = args[0]
 
-        self.requeue(args[0])
+        self.memory_used -= self._sizes.get(key, 0)
+
+        if key in self._shard_fnames:
+            # The persisted shard is replaced on the next save.
+            self._removed_files.add(self._shard_fnames[key])
+
+        self.data[key] = value
+        self._sizes[key] = self._compute_size(value)
+        self.memory_used += self._sizes[key]
+        self._unsaved_keys.add(key)
+        self._modified = True
+
+        self.requeue(key)
         self.manage_memory()
 
+    @_synchronized
     def get_data(self, *args):
         """Retrieves NumPy ndarray from self.data according to provided sequence of keys."""
+        if isinstance(self.data.get(args[0]), _Shard):
+            try:
+                self._load_shard(args[0])
+            except KeyError:
+                self.misses += 1
+                raise(KeyError('KeyError when retrieving: {0}'.format(args[0])))
+
         tmp = self.data
 
         for key in args:
@@ -131,9 +464,11 @@ class DataManagementSystem():
                 try:
                     tmp = tmp[key]
                 except KeyError:
+                    self.misses += 1
                     logging.info('DMS: Data not yet in DMS, loading...')
                     raise(KeyError('KeyError when retrieving: {0}'.format(key)))
 
+        self.hits += 1
         self.requeue(args[0])
         logging.info('DMS: Data located in DMS, retrieving...')
         return tmp
@@ -2,9 +2,123 @@ from abc import ABCMeta, abstractmethod, abstractproperty
 import logging
 import pyutilib
 
+import numpy as np
+import pandas as pd
+import scipy
 from six import with_metaclass
 from pyomo.environ import *
 
+# Persistent solver interfaces for re-solving models in sweep mode, keyed by the solver setting.
+PERSISTENT_SOLVERS = {'gurobi': 'appsi_gurobi',
+                      'cplex': 'appsi_cplex',
+                      'cbc': 'appsi_cbc',
+                      'ipopt': 'appsi_ipopt',
+                      'highs': 'appsi_highs',
+                      }
+
+# The scipy.optimize.linprog method for sparse matrix LPs: HiGHS from SciPy 1.6, otherwise the interior-point method, e.g., for Python 3.6.
+LINPROG_METHOD = 'highs' if tuple(int(part) for part in scipy.__version__.split('.')[:2]) >= (1, 6) else 'interior-point'
+
+# Solvers called in-process through their Python bindings, keyed by the solver setting; models are passed in memory instead of through LP/NL files.
+IN_PROCESS_SOLVERS = {'highs': 'appsi_highs',
+                      }
+
+
+def get_solver(solver_name):
+    """Returns a Pyomo solver for the solver setting solver_name, using the in-process interface if there is one."""
+    if solver_name in IN_PROCESS_SOLVERS:
+        solver = SolverFactory(IN_PROCESS_SOLVERS[solver_name])
+
+        try:
+            solver_available = solver.available()
+        except Exception:
+            solver_available = False
+
+        if not solver_available:
+            # Reported the same way as a missing solver executable.
+            raise pyutilib.common._exceptions.ApplicationError('No executable found for solver \'{0}\'; its Python package (e.g., highspy for HiGHS) is not installed.'.format(solver_name))
+
+        return solver
+
+    return SolverFactory(solver_name)
+
+
+def solve_with(solver, model, **kwargs):
+    """Solves model with the Pyomo solver and returns the results.
+
+    In-process interfaces raise a RuntimeError instead of reporting a termination condition when no solution was found; it is re-raised as an AssertionError like other non-optimal solves.
+    """
+    try:
+        return solver.solve(model, **kwargs)
+    except RuntimeError as e:
+        logging.error('Optimizer: {error}'.format(error=e))
+        raise(AssertionError('An optimal solution could not be obtained. ({0})'.format(e)))
+
+
+def get_termination_condition(results):
+    """Returns the name of the solver termination condition in results, e.g., 'optimal'."""
+    termination_condition = results.solver.termination_condition
+
+    # Pyomo<5.7 uses pyutilib Enums with a key attribute; later versions use Python Enums.
+    return getattr(termination_condition, 'key', None) or getattr(termination_condition, 'name', str(termination_condition))
+
+
+def get_var_values(var):
+    """Returns the values of the indexed Pyomo Var var as a float array in index order; unset values are NaN."""
+    return np.array(list(var.extract_values().values()), dtype=float)
+
+
+def solve_stacked(optimizers):
+    """Solves the populated models of optimizers as one block-diagonal model with a single solver call.
+
+    Each model is attached as an independent block of a stacked model whose objective is the sum of their objectives, so the stacked optimum is the optimum of every model. The results of each optimizer are processed as if it was solved by itself. The solver of the first optimizer is used.
+
+    :param optimizers: A list of Optimizer objects with populated models that share an objective sense.
+    :return: True if the stacked model was solved to optimality; otherwise, False and the optimizers should be solved individually.
+    """
+    if not optimizers:
+        return True
+
+    solver_name = optimizers[0].solver
+
+    if solver_name == 'neos' or len({op.model.objective.sense for op in optimizers}) > 1:
+        return False
+
+    stacked_model = ConcreteModel()
+    block_names = []
+
+    for ix, op in enumerate(optimizers):
+        block_name = 'block_{0}'.format(ix)
+
+        op.model.objective.deactivate()
+        stacked_model.add_component(block_name, op.model)
+        block_names.append(block_name)
+
+    stacked_model.objective = Objective(expr=sum(op.model.objective.expr for op in optimizers),
+                                        sense=optimizers[0].model.objective.sense)
+
+    try:
+        results = solve_with(get_solver(solver_name), stacked_model, tee=False, keepfiles=False)
+        termination_condition = get_termination_condition(results)
+    except Exception as e:
+        # Let the individual solves report the error.
+        logging.warning('Optimizer: The stacked model could not be solved, solving individually... ({0})'.format(e))
+        termination_condition = None
+    finally:
+        # Detach the models so that each optimizer owns its model again.
+        for op, block_name in zip(optimizers, block_names):
+            stacked_model.del_component(block_name)
+            op.model.objective.activate()
+
+    if termination_condition != 'optimal':
+        logging.info('Optimizer: The stacked model was not solved to optimality (solver termination condition: {0}), solving individually...'.format(termination_condition))
+        return False
+
+    for op in optimizers:
+        op._process_results()
+
+    return True
+
 
 class Optimizer(with_metaclass(ABCMeta)):
     """Abstract base class for Pyomo ConcreteModel optimization framework."""
@@ -30,6 +144,15 @@ class Optimizer(with_metaclass(ABCMeta)):
         """A results DataFrame containing series of indices, decision variables, and/or model parameters or derived quantities."""
         return self._results
 
+    @property
+    def sweep_mode(self):
+        """True if model parameters are built as mutable Pyomo Params so that the model can be updated with update_parameters() and re-solved with resolve() instead of being rebuilt."""
+        return getattr(self, '_sweep_mode', False)
+
+    @sweep_mode.setter
+    def sweep_mode(self, value):
+        self._sweep_mode = bool(value)
+
     @abstractmethod
     def _set_model_param(self):
         """A method for assigning model parameters and their default values to the model."""
@@ -57,10 +180,10 @@ class Optimizer(with_metaclass(ABCMeta)):
             solver_manager = SolverManagerFactory('neos')
             results = solver_manager.solve(self.model, opt=opt)
         else:
-            solver = SolverFactory(self.solver)
-            results = solver.solve(self.model, tee=False, keepfiles=False)
+            solver = get_solver(self.solver)
+            results = solve_with(solver, self.model, tee=False, keepfiles=False)
 
-        assert (results.solver.termination_condition.key == 'optimal')
+        assert (get_termination_condition(results) == 'optimal')
 
         self._process_results()
 
@@ -79,32 +202,158 @@ class Optimizer(with_metaclass(ABCMeta)):
         self.instantiate_model()
         self.populate_model()
 
+        self._solve()
+
+        return self.get_results()
+
+    def resolve(self):
+        """Re-solves the model after its parameters have been changed in place with update_parameters(). Requires sweep_mode and a previous call to run()."""
+        self._solve()
+
+        return self.get_results()
+
+    def _solve(self):
+        """Solves the populated model, checks for optimality, and processes the results."""
         if self.solver == 'neos':
             opt = SolverFactory('cbc')
             solver_manager = SolverManagerFactory('neos')
             results = solver_manager.solve(self.model, opt=opt)
+        elif self.sweep_mode and self._get_persistent_solver() is not None:
+            # Persistent solvers keep the solver instance (and its basis) between solves and only receive parameter updates.
+            try:
+                results = self._get_persistent_solver().solve(self.model)
+            except RuntimeError as e:
+                # Persistent interfaces refuse to load a solution when none was found.
+                logging.error('Optimizer: {error}'.format(error=e))
+                raise(AssertionError('An optimal solution could not be obtained. ({0})'.format(e)))
         else:
-            solver = SolverFactory(self.solver)
+            solver = get_solver(self.solver)
 
             try:
                 solver.available()
             except pyutilib.common._exceptions.ApplicationError as e:
                 logging.error('Optimizer: {error}'.format(error=e))
             else:
-                results = solver.solve(self.model, tee=True, keepfiles=False)
+                results = solve_with(solver, self.model, tee=True, keepfiles=False)
+
+        termination_condition = get_termination_condition(results)
 
         try:
-            assert (results.solver.termination_condition.key == 'optimal')
+            assert (termination_condition == 'optimal')
         except AssertionError:
-            logging.error('Optimizer: An optimal solution could not be obtained. (solver termination condition: {0})'.format(results.solver.termination_condition.key))
-            raise(AssertionError('An optimal solution could not be obtained. (solver termination condition: {0})'.format(results.solver.termination_condition.key)))
+            logging.error('Optimizer: An optimal solution could not be obtained. (solver termination condition: {0})'.format(termination_condition))
+            raise(AssertionError('An optimal solution could not be obtained. (solver termination condition: {0})'.format(termination_condition)))
         else:
             self._process_results()
 
-        return self.get_results()
+    def _get_persistent_solver(self):
+        """Returns a persistent solver instance for the selected solver if one is available, otherwise None."""
+        # False records that this optimizer found no persistent interface, so that it is only looked up once per model.
+        solver = getattr(self, '_persistent_solver', None)
+
+        if solver is None:
+            solver_name = PERSISTENT_SOLVERS.get(self.solver)
+
+            if solver_name is None:
+                return None
+
+            try:
+                solver = SolverFactory(solver_name)
+                solver_available = solver.available()
+            except Exception:
+                # The persistent interface is not registered or its Python bindings are not installed.
+                solver_available = False
+
+            if not solver_available:
+                logging.info('Optimizer: No persistent interface available for {0}, re-solving with {0}...'.format(self.solver))
+                solver = False
+
+            self._persistent_solver = solver
+
+        return None if solver is False else solver
+
+    def _make_params_mutable(self, names, index_set=None):
+        """Replaces the model attributes in names with mutable Pyomo Params so that they can be updated in place.
+
+        Scalar values become scalar Params. Array-like values become Params indexed by index_set.
+        """
+        m = self.model
+
+        for name in names:
+            value = getattr(m, name, None)
+
+            if value is None or isinstance(value, Param):
+                continue
+
+            delattr(m, name)
+
+            if np.ndim(value):
+                m.add_component(name, Param(index_set, initialize=dict(zip(index_set, value)), mutable=True))
+            else:
+                m.add_component(name, Param(initialize=value, mutable=True))
+
+    def _normalize_param(self, name, value):
+        """Returns the value of the model parameter name as it should be stored in the model, e.g., converting percentages to fractions."""
+        return value
+
+    def _update_model_bounds(self):
+        """Updates variable bounds that depend on model parameters after update_parameters()."""
+        pass
+
+    def update_parameters(self, **kwargs):
+        """Updates mutable model parameters in kwargs to their respective values in place. Requires sweep_mode and a populated model."""
+        m = self.model
+
+        for kw_key, kw_value in kwargs.items():
+            param = getattr(m, kw_key, None)
+
+            if not isinstance(param, Param) or not param.mutable:
+                raise ValueError('{0} is not a mutable parameter of the model; it cannot be updated in place.'.format(kw_key))
+
+            logging.info('Optimizer: Updating {param} to {value}'.format(param=kw_key, value=kw_value))
+            kw_value = self._normalize_param(kw_key, kw_value)
+
+            if param.is_indexed():
+                if np.ndim(kw_value):
+                    param.store_values(dict(zip(param.index_set(), kw_value)))
+                else:
+                    param.store_values(kw_value)
+            else:
+                param.set_value(kw_value)
+
+        self._update_model_bounds()
 
     def set_model_parameters(self, **kwargs):
         """Sets model parameters in kwargs to their respective values."""
         for kw_key, kw_value in kwargs.items():
             logging.info('Optimizer: Setting {param} to {value}'.format(param=kw_key, value=kw_value))
-            setattr(self.model, kw_key, kw_value)
\ No newline at end of file
+            setattr(self.model, kw_key, kw_value)
+
+class OptimizerRecord(object):
+    """
+    A compact record of a solved Optimizer that keeps its results and the attributes listed in ATTRIBUTES but not its Pyomo model.
+
+    The results are stored column by column as NumPy arrays; the results property rebuilds the DataFrame on access. Subclasses declare the attributes to keep as both ATTRIBUTES and __slots__.
+
+    :param results: The results DataFrame of the solved Optimizer.
+    :param kwargs: The values of the attributes in ATTRIBUTES.
+    """
+    __slots__ = ('_result_columns', '_result_values')
+    ATTRIBUTES = ()
+
+    def __init__(self, results, **kwargs):
+        self._result_columns = tuple(results.columns)
+        self._result_values = tuple(results[column].to_numpy() for column in self._result_columns)
+
+        for attribute in self.ATTRIBUTES:
+            setattr(self, attribute, kwargs.get(attribute))
+
+    @classmethod
+    def from_optimizer(cls, op):
+        """Returns a record of the results and ATTRIBUTES of the solved Optimizer (or record) op."""
+        return cls(op.results, **{attribute: getattr(op, attribute) for attribute in cls.ATTRIBUTES})
+
+    @property
+    def results(self):
+        """A results DataFrame containing series of indices, decision variables, and/or model parameters or derived quantities."""
+        return pd.DataFrame(dict(zip(self._result_columns, self._result_values)), columns=list(self._result_columns))
@@ -0,0 +1,52 @@
+from __future__ import absolute_import
+
+import logging
+import time
+
+
+class RunProgress:
+    """
+    Tracks the models of a batch processed by an optimizer handler, reports an event for each of them to a callback, and relays requests to cancel the batch.
+
+    Each event is a dictionary with the 'status' of the model ('built', 'solved', 'cached', or 'failed'), its 'label' and 'params', the 'time' in seconds since the previous event, and the number of models 'completed' (solved, cached, or failed) out of the 'total'.
+
+    :param total: The number of models in the batch.
+    :param callback: A callable that receives each event, or None. It is called from the thread processing the batch.
+    :param cancel_event: A threading.Event that is set to request that no further models be solved, or None.
+    """
+    def __init__(self, total, callback=None, cancel_event=None):
+        self.total = total
+        self.completed = 0
+
+        self._callback = callback
+        self._cancel_event = cancel_event
+        self._last_time = time.perf_counter()
+
+    def cancelled(self):
+        """Returns True if the batch has been cancelled."""
+        return self._cancel_event is not None and self._cancel_event.is_set()
+
+    def report(self, status, label, params=None):
+        """Reports the event for the model with the given label and parameters."""
+        now = time.perf_counter()
+        elapsed, self._last_time = now - self._last_time, now
+
+        if status != 'built':
+            self.completed += 1
+
+        if self._callback is None:
+            return
+
+        event = {'status': status,
+                 'label': label,
+                 'params': params,
+                 'time': elapsed,
+                 'completed': self.completed,
+                 'total': self.total,
+                 }
+
+        try:
+            self._callback(event)
+        except Exception as e:
+            # Progress reporting must not interrupt the batch.
+            logging.warning('RunProgress: Progress callback failed. ({0})'.format(e))
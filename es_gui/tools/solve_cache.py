@@ -0,0 +1,168 @@
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+# Incremented when the models or the cached results change so that stale results are not reused.
+CACHE_VERSION = 1
+
+
+def _update_hash(h, obj):
+    """Feeds a canonical serialization of obj into the hash object h."""
+    if obj is None or isinstance(obj, (bool, int, float, str, np.generic)):
+        h.update(repr((type(obj).__name__, obj.item() if isinstance(obj, np.generic) else obj)).encode())
+    elif isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+
+        h.update(repr(('ndarray', arr.dtype.str, arr.shape)).encode())
+
+        if arr.dtype.hasobject:
+            for item in arr.ravel():
+                _update_hash(h, item)
+        else:
+            h.update(arr.tobytes())
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        _update_hash(h, obj.values)
+    elif isinstance(obj, dict):
+        h.update(repr(('dict', len(obj))).encode())
+
+        for key in sorted(obj, key=repr):
+            _update_hash(h, key)
+            _update_hash(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(repr((type(obj).__name__, len(obj))).encode())
+
+        for item in obj:
+            _update_hash(h, item)
+    else:
+        raise TypeError('Cannot hash an object of type {0} for the solve cache.'.format(type(obj).__name__))
+
+
+def make_key(*parts):
+    """Returns a stable hexadecimal digest of parts, which may contain scalars, strings, NumPy arrays, pandas Series, and nested dictionaries, lists, and tuples thereof."""
+    h = hashlib.sha256()
+
+    _update_hash(h, CACHE_VERSION)
+
+    for part in parts:
+        _update_hash(h, part)
+
+    return h.hexdigest()
+
+
+class SolveCache:
+    """
+    A persistent cache of optimization results on disk keyed by a content hash of the model inputs, parameters, and solver.
+
+    Each result is pickled to its own file in root. Retrieving a result marks it as recently used; when the files in the cache exceed max_size, the least recently used results are removed by evict(). Results are written atomically, so a cache can be shared by worker processes.
+
+    :param root: A string indicating the path to the cache directory.
+    :param max_size: The maximum size, in bytes, of the cached results.
+    """
+    EXTENSION = '.p'
+
+    def __init__(self, root, max_size=500000000):
+        self.root = root
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+    def _fpath(self, key):
+        return os.path.join(self.root, key + self.EXTENSION)
+
+    def get(self, key):
+        """Returns the result cached under key, or None if there is none."""
+        fpath = self._fpath(key)
+
+        try:
+            with open(fpath, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            # Unreadable, e.g., written by an incompatible version.
+            logging.warning('SolveCache: Could not read {0}, ignoring... ({1})'.format(fpath, e))
+            self.misses += 1
+            return None
+
+        try:
+            # Mark as recently used.
+            os.utime(fpath)
+        except OSError:
+            pass
+
+        self.hits += 1
+
+        return result
+
+    def put(self, key, result):
+        """Caches result under key."""
+        fpath = self._fpath(key)
+        tmp_fpath = '{0}.{1}.tmp'.format(fpath, os.getpid())
+
+        try:
+            os.makedirs(self.root, exist_ok=True)
+
+            with open(tmp_fpath, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmp_fpath, fpath)
+        except (OSError, pickle.PicklingError) as e:
+            logging.warning('SolveCache: Could not save {0}. ({1})'.format(fpath, e))
+
+    def evict(self):
+        """Removes the least recently used results until the cache occupies at most max_size bytes.
+
+        :return: The number of results removed.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.root) if entry.name.endswith(self.EXTENSION)]
+        except FileNotFoundError:
+            return 0
+
+        stats = []
+
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            stats.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(st_size for _, st_size, _ in stats)
+        n_removed = 0
+
+        for _, st_size, fpath in sorted(stats):
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(fpath)
+            except FileNotFoundError:
+                pass
+
+            size -= st_size
+            n_removed += 1
+
+        if n_removed:
+            logging.info('SolveCache: Evicted {0} results.'.format(n_removed))
+
+        return n_removed
+
+    def clear(self):
+        """Removes every cached result."""
+        max_size, self.max_size = self.max_size, -1
+
+        try:
+            self.evict()
+        finally:
+            self.max_size = max_size
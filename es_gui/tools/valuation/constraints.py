@@ -63,10 +63,6 @@ class ExpressionsBlock:
 
     def _constraints_arb(self, block):
         eq_stateofcharge_arb(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
-        ineq_stateofcharge_minimum(block)
-        ineq_stateofcharge_maximum(block)
         ineq_power_limit(block)
         #ineq_charge_limit(block)
         #ineq_discharge_limit(block)
@@ -76,8 +72,6 @@ class ExpressionsBlock:
 
     def _constraints_ercot_arbreg(self, block):
         eq_stateofcharge_ercot_arbreg(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_twoprod(block)
         ineq_stateofcharge_maximum_reserve_twoprod(block)
         ineq_power_limit_twoprod(block)
@@ -89,8 +83,6 @@ class ExpressionsBlock:
 
     def _constraints_pjm_pfp(self, block):
         eq_stateofcharge_pjm_pfp(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_oneprod(block)
         ineq_stateofcharge_maximum_reserve_oneprod(block)
         ineq_power_limit_oneprod(block)
@@ -102,8 +94,6 @@ class ExpressionsBlock:
 
     def _constraints_miso_pfp(self, block):
         eq_stateofcharge_miso_pfp(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_oneprod(block)
         ineq_stateofcharge_maximum_reserve_oneprod(block)
         ineq_power_limit_oneprod(block)
@@ -115,8 +105,6 @@ class ExpressionsBlock:
 
     def _constraints_isone_pfp(self, block):
         eq_stateofcharge_isone_pfp(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_oneprod(block)
         ineq_stateofcharge_maximum_reserve_oneprod(block)
         ineq_power_limit_oneprod(block)
@@ -131,8 +119,6 @@ class ExpressionsBlock:
 
     def _constraints_nyiso_pfp(self, block):
         eq_stateofcharge_nyiso_pfp(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_oneprod(block)
         ineq_stateofcharge_maximum_reserve_oneprod(block)
         ineq_power_limit_oneprod(block)
@@ -147,8 +133,6 @@ class ExpressionsBlock:
 
     def _constraints_spp_pfp(self, block):
         eq_stateofcharge_spp_pfp(block)
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_twoprod(block)
         ineq_stateofcharge_maximum_reserve_twoprod(block)
         ineq_power_limit_twoprod(block)
@@ -163,8 +147,6 @@ class ExpressionsBlock:
 
     def _constraints_caiso_pfp(self, block):
         eq_stateofcharge_caiso_pfp(block) ## TODO
-        eq_stateofcharge_initial(block)
-        eq_stateofcharge_final(block)
         ineq_stateofcharge_minimum_reserve_twoprod(block)
         ineq_stateofcharge_maximum_reserve_twoprod(block)
         ineq_power_limit_twoprod(block)
@@ -182,7 +164,7 @@ def eq_objective_arb(m):
     mp = m.parent_block()
 
     _expr = sum(
-        (mp.price_electricity[t] * mp.q_d[t] - mp.price_electricity[t] * mp.q_r[t]) * math.e ** (-t * mp.R) for
+        (mp.price_electricity[t] * mp.q_d[t] - mp.price_electricity[t] * mp.q_r[t]) * mp.discount[t] for
         t in mp.time)
 
     mp.objective_expr += _expr
@@ -244,7 +226,7 @@ def eq_objective_ercot_arbreg(m):
                  + mp.price_reg_up[t] * mp.q_ru[t] + mp.price_reg_down[t] * mp.q_rd[t]
                  + mp.price_electricity[t] * mp.q_ru[t] * mp.fraction_reg_up[t]
                  - mp.price_electricity[t] * mp.q_rd[t] * mp.fraction_reg_down[t])
-                * math.e ** (-t * mp.R) for t in mp.time)
+                * mp.discount[t] for t in mp.time)
 
     mp.objective_expr += _expr
     m.objective_rt = Expression(expr=_expr)
@@ -293,7 +275,7 @@ def eq_objective_pjm_pfp(m):
 
     _expr = sum((mp.price_electricity[t] * mp.q_d[t] - mp.price_electricity[t] * mp.q_r[t]
                  + mp.q_reg[t] * mp.perf_score[t] * (mp.mi_mult[t] * mp.price_reg_service[t] + mp.price_regulation[t]))
-                * math.e ** (-t * mp.R) for t in mp.time)
+                * mp.discount[t] for t in mp.time)
 
     mp.objective_expr += _expr
     m.objective_rt = Expression(expr=_expr)
@@ -341,7 +323,7 @@ def eq_objective_miso_pfp(m):
     mp = m.parent_block()
     _expr = sum((mp.price_electricity[t] * mp.q_d[t] - mp.price_electricity[t] * mp.q_r[t]
                  + (1 + mp.Make_whole) * mp.q_reg[t] * mp.perf_score[t] * mp.price_regulation[t])
-                * math.e ** (-t * mp.R) for t in mp.time)
+                * mp.discount[t] for t in mp.time)
 
     mp.objective_expr += _expr
     m.objective_rt = Expression(expr=_expr)
@@ -390,7 +372,7 @@ def eq_objective_isone_pfp(m):
     mp = m.parent_block()
 
     _expr = sum((mp.price_electricity[t] * mp.q_d[t] - mp.price_electricity[t] * mp.q_r[t]
-                 + mp.q_reg[t] * (mp.mi_mult[t] * mp.price_reg_service[t] + mp.price_regulation[t]) * mp.perf_score[t]) * math.e ** (-t * mp.R) for t in mp.time)
+                 + mp.q_reg[t] * (mp.mi_mult[t] * mp.price_reg_service[t] + mp.price_regulation[t]) * mp.perf_score[t]) * mp.discount[t] for t in mp.time)
 
     mp.objective_expr += _expr
     m.objective_rt = Expression(expr=_expr)
@@ -426,7 +408,7 @@ def eq_objective_nyiso_pfp(m):
                  + mp.price_electricity[t] * mp.fraction_reg_up[t] * mp.q_reg[t]
                  - mp.price_electricity[t] * mp.fraction_reg_down[t] * mp.q_reg[t]
                  + mp.q_reg[t] * mp.price_regulation[t] * (1 - 1.1*(1-mp.perf_score[t])) )
-                 * math.e ** (-t * mp.R) for t in mp.time)
+                 * mp.discount[t] for t in mp.time)
 
     # _expr = sum((mp.price_electricity[t] * mp.q_d[t] - mp.price_electricity[t] * mp.q_r[t]
     #              + mp.q_reg[t] * mp.rmccp[t] * (1 - 1.1*(1-mp.Perf_score)) )
@@ -470,7 +452,7 @@ def eq_objective_spp_pfp(m):
                  + mp.price_reg_up[t] * mp.q_ru[t] + mp.price_reg_down[t] * mp.q_rd[t]
                  + mp.price_electricity[t] * mp.q_ru[t] * mp.fraction_reg_up[t]
                  - mp.price_electricity[t] * mp.q_rd[t] * mp.fraction_reg_down[t])
-                * math.e ** (-t * mp.R) for t in mp.time)
+                * mp.discount[t] for t in mp.time)
 
     mp.objective_expr += _expr
     m.objective_rt = Expression(expr=_expr)
@@ -510,7 +492,7 @@ def eq_objective_caiso_pfp(m):
                  - mp.price_electricity[t] * mp.q_rd[t] * mp.fraction_reg_down[t]
                  + mp.perf_score_ru[t] * mp.mi_mult_ru[t] * mp.price_reg_serv_up[t]
                  + mp.perf_score_rd[t] * mp.mi_mult_rd[t] * mp.price_reg_serv_down[t])
-                * math.e ** (-t * mp.R) for t in mp.time)
+                * mp.discount[t] for t in mp.time)
 
     mp.objective_expr += _expr
     m.objective_rt = Expression(expr=_expr)
@@ -594,60 +576,13 @@ def eq_stateofcharge_caiso_pfp(m):
 #
 #     m.discharge_limit = Constraint(mp.time_interval, rule=_ineq_discharge_limit_isone_pfp)
 
-##################################
-#          Generic              ##
-#     Equality Constraints      ##
-##################################
-
-def eq_stateofcharge_initial(m):
-    """Requires the initial state of charge of the energy storage device to equal its minimum value."""
-    mp = m.parent_block()
-
-    def _eq_stateofcharge_initial(_m, t):
-        if not t == 0:
-            return Constraint.Skip
-        else:
-            return mp.s[t] == mp.State_of_charge_init*mp.Energy_capacity
-
-    m.stateofcharge_initial = Constraint(mp.soc_time, rule=_eq_stateofcharge_initial)
-
-def eq_stateofcharge_final(m):
-    """Requires the final state of charge of the energy storage device to equal its initial value."""
-    mp = m.parent_block()
-
-    def _eq_stateofcharge_final(_m, t):
-        if not t == mp.soc_time[-1]:
-            return Constraint.Skip
-        else:
-            return mp.s[t] == mp.State_of_charge_init*mp.Energy_capacity
-        
-    m.stateofcharge_final = Constraint(mp.soc_time, rule=_eq_stateofcharge_final)
-
-
 ##################################
 #          Generic              ##
 #   Inequality Constraints      ##
 ##################################
 
-
-def ineq_stateofcharge_minimum(m):
-    """Requires the state of charge of the energy storage device to remain above the minimum at any given time."""
-    mp = m.parent_block()
-
-    def _ineq_stateofcharge_minimum(_m, t):
-        return mp.s[t] >= mp.State_of_charge_min*mp.Energy_capacity
-
-    m.stateofcharge_minimum = Constraint(mp.soc_time, rule=_ineq_stateofcharge_minimum)
-
-
-def ineq_stateofcharge_maximum(m):
-    """Requires the state of charge of the energy storage device to remain below the maximum at any given time."""
-    mp = m.parent_block()
-
-    def _ineq_stateofcharge_maximum(_m, t):
-        return mp.s[t] <= mp.State_of_charge_max*mp.Energy_capacity
-
-    m.stateofcharge_maximum = Constraint(mp.soc_time, rule=_ineq_stateofcharge_maximum)
+# The initial and final state of charge and the state of charge limits of the arbitrage formulation are bounds
+# of s set by ValuationOptimizer._update_model_bounds() rather than constraints.
 
 
 def ineq_stateofcharge_minimum_reserve_oneprod(m):
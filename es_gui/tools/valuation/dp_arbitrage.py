@@ -0,0 +1,206 @@
+from __future__ import division, absolute_import
+
+import logging
+
+import numpy as np
+
+from es_gui.tools.valuation.matrix_model import VARIABLES, get_series
+
+
+class ArbitrageDP:
+    """The arbitrage-only valuation problem solved exactly by dynamic programming over the state of charge.
+
+    The formulation mirrors the arbitrage ExpressionsBlock in constraints.py. Because the problem is an LP, the value to go of the state of charge is a concave piecewise linear function; it is represented by its left end point and the lengths and decreasing slopes of its segments. Each step of the backward induction merges the one or two segments of the timestep's revenue into the value to go, scales it by the self-discharge efficiency, and clips it to the state of charge limits; the state of charge to charge up to and to discharge down to in that timestep are where the marginal revenue is inserted. The state of charge is not discretized, so the gross revenue is the LP optimum up to floating point round-off (within 1e-9 relative; see the check in __main__).
+    """
+
+    def __init__(self, model):
+        self.n_time = len(model.price_electricity)
+
+        self._build(model)
+
+    def _build(self, m):
+        """Gets the model parameters and the discounted price of each timestep."""
+        T = self.n_time
+
+        E = m.Energy_capacity
+        self.sd = m.Self_discharge_efficiency
+        self.rte = m.Round_trip_efficiency
+        self.power = float(m.Power_rating)
+        self.soc_min = max(m.State_of_charge_min*E, 0)
+        self.soc_max = m.State_of_charge_max*E
+        self.soc_init = m.State_of_charge_init*E
+
+        if not self.soc_min <= self.soc_init <= self.soc_max:
+            raise(AssertionError('An optimal solution could not be obtained. (the initial state of charge is outside of the state of charge limits)'))
+
+        self.value = get_series(m, 'price_electricity', T)*np.exp(-np.arange(T)*m.R)
+
+        # Round-off tolerance for the state of charge limits.
+        self._tol = 1e-9*max(abs(self.soc_min), abs(self.soc_max), 1.0)
+
+    def solve(self):
+        """Solves the problem by backward induction and returns a dictionary of decision variable arrays."""
+        T = self.n_time
+        sd, rte, power = self.sd, self.rte, self.power
+        soc_min, soc_max = self.soc_min, self.soc_max
+
+        # The value to go of the state of charge after the last timestep: it must equal its initial value.
+        start = self.soc_init
+        lengths = []
+        slopes = []
+
+        # For each timestep, the state of charge to charge up to and to discharge down to.
+        thresholds = [None]*T
+        value = self.value.tolist()
+
+        for t in range(T - 1, -1, -1):
+            v = value[t]
+
+            # The revenue as a concave function of the state of charge given up in the timestep, from charging at full power to discharging at full power.
+            if v >= 0:
+                # Only charge or discharge, whichever is needed.
+                rev_segments = ((rte*power, v/rte), (power, v))
+            else:
+                # Charge and discharge as much as the power rating allows.
+                rev_segments = (((1 + rte)*power, 2*v/(1 + rte)),)
+
+            # The value to go before the timestep is the supremal convolution of the value to go after it and the revenue: their segments merged in order of decreasing slope.
+            ix = 0
+            insert_ixs = []
+            positions = []
+
+            for rev_length, rev_slope in rev_segments:
+                while ix < len(slopes) and slopes[ix] > rev_slope:
+                    ix += 1
+
+                # Charging (discharging) pays while the marginal value of the state of charge is above (below) the marginal revenue.
+                insert_ixs.append(ix)
+                positions.append(start + sum(lengths[:ix]))
+
+            for n_inserted, (ix, (rev_length, rev_slope)) in enumerate(zip(insert_ixs, rev_segments)):
+                lengths.insert(ix + n_inserted, rev_length)
+                slopes.insert(ix + n_inserted, rev_slope)
+
+            thresholds[t] = (positions[0], positions[-1])
+
+            # Self-discharge: the state of charge s becomes sd*s during the timestep.
+            start = (start - rte*power)/sd
+            lengths = [length/sd for length in lengths]
+            slopes = [slope*sd for slope in slopes]
+
+            # Clip the value to go to the state of charge limits.
+            end = start + sum(lengths)
+
+            if t > 0:
+                lower, upper = max(soc_min, start), min(soc_max, end)
+            else:
+                lower, upper = max(self.soc_init, start), min(self.soc_init, end)
+
+            if lower > upper + self._tol:
+                logging.error('ArbitrageDP: An optimal solution could not be obtained. (no feasible state of charge trajectory)')
+                raise(AssertionError('An optimal solution could not be obtained. (no feasible state of charge trajectory)'))
+
+            upper = max(lower, upper)
+
+            excess = lower - start
+
+            while lengths and lengths[0] <= excess:
+                excess -= lengths.pop(0)
+                slopes.pop(0)
+
+            if lengths:
+                lengths[0] -= excess
+
+            excess = end - upper
+
+            while lengths and lengths[-1] <= excess:
+                excess -= lengths.pop()
+                slopes.pop()
+
+            if lengths:
+                lengths[-1] -= excess
+
+            start = lower
+
+        # Recover the state of charge trajectory forward in time.
+        solution = {var: np.zeros(T) for var in VARIABLES}
+        s = solution['s'] = np.empty(T + 1)
+        s[0] = soc = self.soc_init
+
+        for t in range(T):
+            charge_to, discharge_to = thresholds[t]
+            soc *= sd
+
+            soc = min(max(soc, min(charge_to, soc + rte*power)), max(discharge_to, soc - power))
+            soc = min(max(soc, soc_min), soc_max)
+
+            s[t + 1] = soc
+
+        s[T] = self.soc_init
+
+        # The charge and discharge quantities that give up e of the state of charge with the most revenue.
+        e = sd*s[:-1] - s[1:]
+        negative = self.value < 0
+
+        q_r = np.maximum(-e, 0)/rte
+        q_r[negative] = (power - e[negative])/(1 + rte)
+
+        solution['q_r'] = q_r
+        solution['q_d'] = np.where(negative, rte*q_r + e, np.maximum(e, 0))
+
+        return solution
+
+
+if __name__ == '__main__':
+    # Checks the dynamic program against the matrix LP on synthetic months and compares their run times, e.g.:
+    # python -m es_gui.tools.valuation.dp_arbitrage
+    import argparse
+    import time
+
+    from es_gui.tools.valuation.valuation_optimizer import ValuationOptimizer
+
+    parser = argparse.ArgumentParser(description='Compare the gross revenue and run time of the dp and matrix backends for arbitrage-only valuations.')
+    parser.add_argument('--months', type=int, default=5, help='Number of synthetic 744-hour price series for each parameter set.')
+    parser.add_argument('--tolerance', type=float, default=1e-9, help='Largest acceptable relative difference in gross revenue.')
+    args = parser.parse_args()
+
+    param_sets = [{},
+                  {'Round_trip_efficiency': 0.9, 'Self_discharge_efficiency': 0.999, 'R': 0.0005},
+                  {'Round_trip_efficiency': 0.85, 'Self_discharge_efficiency': 0.99},
+                  {'Power_rating': 3, 'State_of_charge_init': 0.2},
+                  {'Round_trip_efficiency': 0.8, 'State_of_charge_min': 0.1, 'State_of_charge_max': 0.9, 'State_of_charge_init': 0.1},
+                  ]
+
+    max_difference = 0.0
+    run_times = {'matrix': [], 'dp': []}
+
+    for seed in range(args.months):
+        rng = np.random.RandomState(seed)
+        price_electricity = 30 + 10*np.sin(np.arange(744)/24*2*np.pi) + rng.normal(0, 5, 744)
+
+        if seed % 2:
+            # Include negative prices.
+            price_electricity -= 30
+
+        for params in param_sets:
+            gross_revenue = {}
+
+            for backend in run_times:
+                op = ValuationOptimizer(market_type='arbitrage', backend=backend, price_electricity=price_electricity)
+                op.set_model_parameters(**params)
+
+                start = time.perf_counter()
+                _, gross_revenue[backend] = op.run()
+                run_times[backend].append(time.perf_counter() - start)
+
+            difference = abs(gross_revenue['dp'] - gross_revenue['matrix'])/max(abs(gross_revenue['matrix']), 1.0)
+            max_difference = max(max_difference, difference)
+
+            print('month {0}, {1}: matrix {2:.4f}, dp {3:.4f}, relative difference {4:.1e}'.format(
+                seed, params or 'default parameters', gross_revenue['matrix'], gross_revenue['dp'], difference))
+
+    print('Largest relative difference: {0:.1e}; mean run time per month: matrix {1:.4f} s, dp {2:.4f} s'.format(
+        max_difference, np.mean(run_times['matrix']), np.mean(run_times['dp'])))
+
+    if max_difference > args.tolerance:
+        raise SystemExit('The dp backend differs from the matrix LP by more than {0:.1e}.'.format(args.tolerance))
@@ -0,0 +1,192 @@
+from __future__ import division, absolute_import
+
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+from es_gui.tools.optimizer import LINPROG_METHOD
+
+
+ONEPROD_MARKETS = {'pjm_pfp', 'miso_pfp', 'isone_pfp', 'nyiso_pfp'}
+TWOPROD_MARKETS = {'ercot_arbreg', 'spp_pfp', 'caiso_pfp'}
+MARKET_TYPES = {'arbitrage'} | ONEPROD_MARKETS | TWOPROD_MARKETS
+
+# Decision variables in column order; 's' is indexed over soc_time and the rest over time.
+VARIABLES = ('s', 'q_r', 'q_d', 'q_ru', 'q_rd', 'q_reg')
+
+
+def get_series(m, name, n):
+    """Returns the model attribute name as a float array of length n."""
+    value = getattr(m, name)
+
+    if hasattr(value, 'extract_values'):
+        # Mutable Pyomo Param, e.g., in sweep mode.
+        values = value.extract_values()
+        value = list(values.values()) if value.is_indexed() else values[None]
+
+    try:
+        arr = np.asarray(value, dtype=float)
+    except (TypeError, ValueError):
+        raise IndexError('{0} could not be converted to an array.'.format(name))
+
+    if arr.ndim == 0:
+        return np.full(n, float(arr))
+    elif len(arr) < n:
+        raise IndexError('{0} is shorter than price_electricity.'.format(name))
+
+    return arr[:n]
+
+
+class MatrixModel:
+    """The valuation LP for a given market type assembled as sparse matrices for a direct LP interface.
+
+    The formulation mirrors the ExpressionsBlock in constraints.py: the objective is maximized, the state of charge is fixed to its initial value at the beginning and end of the horizon, and decision variables that do not participate in the market type are fixed to zero.
+    """
+
+    def __init__(self, model, market_type):
+        if market_type not in MARKET_TYPES:
+            raise ValueError('Invalid market type specified!')
+
+        self._market_type = market_type
+
+        self.n_time = len(model.price_electricity)
+        self._build(model)
+
+    @property
+    def market_type(self):
+        """The market formulation of the LP."""
+        return self._market_type
+
+    def _slice(self, var):
+        """Returns the column slice for the decision variable var."""
+        T = self.n_time
+
+        if var == 's':
+            return slice(0, T + 1)
+
+        start = T + 1 + T*(VARIABLES.index(var) - 1)
+
+        return slice(start, start + T)
+
+    def _build(self, m):
+        """Assembles the objective vector, constraint matrices, and variable bounds from the model parameters."""
+        T = self.n_time
+        n_vars = T + 1 + 5*T
+
+        E = m.Energy_capacity
+        sd = m.Self_discharge_efficiency
+        rte = m.Round_trip_efficiency
+        soc_min = m.State_of_charge_min*E
+        soc_max = m.State_of_charge_max*E
+        soc_init = m.State_of_charge_init*E
+
+        price = get_series(m, 'price_electricity', T)
+        discount = np.exp(-np.arange(T)*m.R)
+
+        c = np.zeros(n_vars)
+        lb = np.zeros(n_vars)
+        ub = np.full(n_vars, np.inf)
+
+        c[self._slice('q_d')] = price*discount
+        c[self._slice('q_r')] = -price*discount
+
+        eye = sp.identity(T, format='csr')
+        zero = sp.csr_matrix((T, T))
+
+        # State of charge: sd*s[t] + rte*q_r[t] - q_d[t] + (regulation terms) - s[t+1] == 0.
+        soc_block = sd*sp.eye(T, T + 1, format='csr') - sp.eye(T, T + 1, k=1, format='csr')
+        soc_terms = {'q_r': rte*eye, 'q_d': -eye, 'q_ru': zero, 'q_rd': zero, 'q_reg': zero}
+
+        # Power rating: q_r[t] + q_d[t] + (regulation terms) <= Power_rating.
+        power_terms = {'q_r': eye, 'q_d': eye, 'q_ru': zero, 'q_rd': zero, 'q_reg': zero}
+
+        if self.market_type == 'arbitrage':
+            active = ('q_r', 'q_d')
+
+            lb[self._slice('s')] = max(soc_min, 0)
+            ub[self._slice('s')] = soc_max
+
+            A_ub = sp.hstack([sp.csr_matrix((T, T + 1))] + [power_terms[var] for var in VARIABLES[1:]])
+            b_ub = np.full(T, float(m.Power_rating))
+        else:
+            fru = get_series(m, 'fraction_reg_up', T)
+            frd = get_series(m, 'fraction_reg_down', T)
+
+            if self.market_type in ONEPROD_MARKETS:
+                active = ('q_r', 'q_d', 'q_reg')
+                reg_min, reg_max = 'q_reg', 'q_reg'
+
+                perf = get_series(m, 'perf_score', T)
+                price_reg = get_series(m, 'price_regulation', T)
+
+                if self.market_type in {'pjm_pfp', 'isone_pfp'}:
+                    mi_mult = get_series(m, 'mi_mult', T)
+                    price_serv = get_series(m, 'price_reg_service', T)
+
+                    c[self._slice('q_reg')] = perf*(mi_mult*price_serv + price_reg)*discount
+                elif self.market_type == 'miso_pfp':
+                    c[self._slice('q_reg')] = (1 + m.Make_whole)*perf*price_reg*discount
+                else:
+                    c[self._slice('q_reg')] = (price*fru - price*frd + price_reg*(1 - 1.1*(1 - perf)))*discount
+
+                soc_terms['q_reg'] = sp.diags(rte*frd - fru, format='csr')
+                power_terms['q_reg'] = eye
+            else:
+                active = ('q_r', 'q_d', 'q_ru', 'q_rd')
+                reg_min, reg_max = 'q_ru', 'q_rd'
+
+                price_reg_up = get_series(m, 'price_reg_up', T)
+                price_reg_down = get_series(m, 'price_reg_down', T)
+
+                c[self._slice('q_ru')] = (price_reg_up + price*fru)*discount
+                c[self._slice('q_rd')] = (price_reg_down - price*frd)*discount
+
+                soc_terms['q_ru'] = sp.diags(-fru, format='csr')
+                soc_terms['q_rd'] = sp.diags(rte*frd, format='csr')
+                power_terms['q_ru'] = eye
+                power_terms['q_rd'] = eye
+
+            # State of charge limits with regulation reserves, applied to s[t+1].
+            # -s[t+1] + Reserve_reg_min*q_min[t] <= -soc_min
+            # s[t+1] + rte*Reserve_reg_max*q_max[t] <= soc_max
+            s_next = sp.eye(T, T + 1, k=1, format='csr')
+            min_terms = {var: (m.Reserve_reg_min*eye if var == reg_min else zero) for var in VARIABLES[1:]}
+            max_terms = {var: (rte*m.Reserve_reg_max*eye if var == reg_max else zero) for var in VARIABLES[1:]}
+
+            A_ub = sp.vstack([
+                sp.hstack([-s_next] + [min_terms[var] for var in VARIABLES[1:]]),
+                sp.hstack([s_next] + [max_terms[var] for var in VARIABLES[1:]]),
+                sp.hstack([sp.csr_matrix((T, T + 1))] + [power_terms[var] for var in VARIABLES[1:]]),
+            ])
+            b_ub = np.concatenate([np.full(T, -soc_min), np.full(T, soc_max), np.full(T, float(m.Power_rating))])
+
+        # Initial and final state of charge.
+        boundary = sp.csr_matrix(([1.0, 1.0], ([0, 1], [0, T])), shape=(2, n_vars))
+
+        A_eq = sp.vstack([sp.hstack([soc_block] + [soc_terms[var] for var in VARIABLES[1:]]), boundary])
+        b_eq = np.concatenate([np.zeros(T), [soc_init, soc_init]])
+
+        # Fix variables that do not participate in this market type.
+        for var in VARIABLES[1:]:
+            if var not in active:
+                ub[self._slice(var)] = 0
+
+        self.c = -c  # linprog minimizes
+        self.A_ub = sp.csr_matrix(A_ub)
+        self.b_ub = b_ub
+        self.A_eq = sp.csr_matrix(A_eq)
+        self.b_eq = b_eq
+        self.bounds = np.column_stack([lb, ub])
+
+    def solve(self):
+        """Solves the LP with scipy.optimize.linprog, i.e., HiGHS from SciPy 1.6, and returns a dictionary of decision variable arrays."""
+        res = linprog(self.c, A_ub=self.A_ub, b_ub=self.b_ub, A_eq=self.A_eq, b_eq=self.b_eq,
+                      bounds=self.bounds, method=LINPROG_METHOD)
+
+        if res.status != 0:
+            logging.error('MatrixModel: An optimal solution could not be obtained. (solver status: {0})'.format(res.message))
+            raise(AssertionError('An optimal solution could not be obtained. (solver status: {0})'.format(res.message)))
+
+        return {var: res.x[self._slice(var)] for var in VARIABLES}
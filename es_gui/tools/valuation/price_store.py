@@ -0,0 +1,226 @@
+from __future__ import absolute_import
+
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from es_gui.tools.valuation.utilities import (read_pjm_data, read_miso_data, read_isone_data, read_nyiso_data,
+                                              read_spp_data, read_caiso_data, read_ercot_da_spp, read_ercot_da_ccp,
+                                              read_ercot_da_spp_year, read_ercot_da_ccp_year,
+                                              read_miso_data_bulk, read_nyiso_data_bulk)
+
+
+# Columns stored for each ISO as (node-specific columns, system-wide columns), in the order returned by PriceStore.get().
+SCHEMA = {'PJM': (('LMP',), ('MR', 'RA', 'RD', 'RegCCP', 'RegPCP')),
+          'MISO': (('LMP',), ('MCP',)),
+          'ISONE': (('LMP',), ('RegCCP', 'RegPCP', 'MiMult')),
+          'NYISO': (('LBMP',), ('RegCAP',)),
+          'SPP': (('LMP',), ('MCPRU', 'MCPRD')),
+          'CAISO': (('LMP',), ('ASPRU', 'ASPRD', 'ASPRMU', 'ASPRMD', 'RMU_MM', 'RMD_MM', 'RMU_PACC', 'RMD_PACC')),
+          'ERCOT': (('SPP',), ('REGDN', 'REGUP')),
+          }
+
+# Partition name for columns that do not depend on the pricing node.
+SYSTEM_PARTITION = '_system'
+
+
+def _find_file(fpath, extension):
+    """Returns the path to the last file in fpath with the given extension."""
+    fname = None
+
+    for filename in sorted(os.listdir(fpath)):
+        if filename.lower().endswith(extension):
+            fname = filename
+
+    if fname is None:
+        raise FileNotFoundError('No {ext} file found in {path}'.format(ext=extension, path=fpath))
+
+    return os.path.join(fpath, fname)
+
+
+def read_raw_data(home_path, iso, year, month, node_id):
+    """Reads the price data for the given ISO, year, month, and pricing node from the raw data bank files at home_path.
+
+    :return: A tuple of NumPy ndarrays in the column order of SCHEMA[iso].
+    """
+    path = os.path.join(home_path, iso)
+
+    year = str(year)
+    month = str(int(month))
+    node_id = str(node_id)
+
+    if iso == 'PJM':
+        return read_pjm_data(path, year, month, node_id)
+    elif iso == 'MISO':
+        return read_miso_data(path, year, month, node_id)
+    elif iso == 'ISONE':
+        return read_isone_data(path, year, month, node_id)
+    elif iso == 'NYISO':
+        lbmp_da, lbmp_rt, rcap_da, rcap_rt, rmov_da = read_nyiso_data(path, year, month, node_id, typedat="both", RT_DAM="DAM")
+
+        return lbmp_da, rcap_da
+    elif iso == 'SPP':
+        return read_spp_data(path, year, month, node_id, typedat="both")
+    elif iso == 'CAISO':
+        return read_caiso_data(path, year, month, node_id)
+    elif iso == 'ERCOT':
+        spp_fname = _find_file(os.path.join(path, 'SPP', year), '.xlsx')
+        ccp_fname = _find_file(os.path.join(path, 'CCP', year), '.csv')
+
+        spp_da = read_ercot_da_spp(spp_fname, month, node_id)
+        rd, ru = read_ercot_da_ccp(ccp_fname, month)
+
+        return spp_da, rd, ru
+    else:
+        raise ValueError('Invalid ISO specified: {0}'.format(iso))
+
+
+def read_raw_data_bulk(home_path, iso, year, month, node_ids):
+    """Reads the price data for the given ISO, year, and month for every pricing node in node_ids from the raw data bank files at home_path.
+
+    MISO and NYISO daily files and ERCOT workbooks are parsed once for all of the nodes; other ISOs are read node by node.
+
+    :return: A dictionary of tuples of NumPy ndarrays in the column order of SCHEMA[iso] keyed by node ID.
+    """
+    path = os.path.join(home_path, iso)
+
+    if iso == 'MISO':
+        lmp_data, RegMCP = read_miso_data_bulk(path, str(year), str(int(month)), node_ids)
+
+        return {node_id: (lmp_data[node_id], RegMCP) for node_id in node_ids}
+    elif iso == 'NYISO':
+        lbmp_data, rcap_da = read_nyiso_data_bulk(path, str(year), str(int(month)), node_ids)
+
+        return {node_id: (lbmp_data[node_id], rcap_da) for node_id in node_ids}
+    elif iso == 'ERCOT':
+        spp_year = read_ercot_da_spp_year(_find_file(os.path.join(path, 'SPP', str(year)), '.xlsx'))
+        ccp_year = read_ercot_da_ccp_year(_find_file(os.path.join(path, 'CCP', str(year)), '.csv'))
+
+        rd, ru = ccp_year.get(int(month), (np.array([]), np.array([])))
+
+        return {node_id: (spp_year.get((int(month), node_id), np.array([])), rd, ru) for node_id in node_ids}
+    else:
+        return {node_id: read_raw_data(home_path, iso, year, month, node_id) for node_id in node_ids}
+
+
+class PriceStore:
+    """
+    A normalized columnar store of ISO/RTO price data on disk.
+
+    Each column is saved as a float64 .npy file, partitioned by ISO, pricing node, year, and month: ``<root>/<ISO>/<node ID>/<year>/<MM>/<column>.npy``. Columns that do not depend on the pricing node are saved once under the ``_system`` node partition. Columns are loaded memory-mapped, so reading a month of data does not parse any vendor files.
+
+    :param root: A string indicating the path to the root of the store.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def _partition_path(self, iso, node, year, month):
+        return os.path.join(self.root, iso, str(node), str(year), str(int(month)).zfill(2))
+
+    def _column_paths(self, iso, year, month, node_id):
+        """Returns the .npy paths of each column of SCHEMA[iso] in order."""
+        try:
+            node_columns, system_columns = SCHEMA[iso]
+        except KeyError:
+            raise ValueError('Invalid ISO specified: {0}'.format(iso))
+
+        node_path = self._partition_path(iso, node_id, year, month)
+        system_path = self._partition_path(iso, SYSTEM_PARTITION, year, month)
+
+        return [os.path.join(node_path, column + '.npy') for column in node_columns] + \
+               [os.path.join(system_path, column + '.npy') for column in system_columns]
+
+    def has(self, iso, year, month, node_id):
+        """Returns True if every column for the given partition has been stored."""
+        return all(os.path.exists(fpath) for fpath in self._column_paths(iso, year, month, node_id))
+
+    def get(self, iso, year, month, node_id):
+        """Returns a tuple of memory-mapped float64 arrays in the column order of SCHEMA[iso].
+
+        :raises KeyError: If the partition has not been stored.
+        """
+        column_paths = self._column_paths(iso, year, month, node_id)
+
+        try:
+            return tuple(np.load(fpath, mmap_mode='r') for fpath in column_paths)
+        except (IOError, OSError):
+            raise KeyError(self._partition_path(iso, node_id, year, month))
+
+    def put(self, iso, year, month, node_id, columns, overwrite=True):
+        """Saves the arrays in columns, given in the column order of SCHEMA[iso], to the given partition."""
+        column_paths = self._column_paths(iso, year, month, node_id)
+
+        if len(columns) != len(column_paths):
+            raise ValueError('Expected {0} columns for {1}, got {2}.'.format(len(column_paths), iso, len(columns)))
+
+        for fpath, column in zip(column_paths, columns):
+            if not overwrite and os.path.exists(fpath):
+                continue
+
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+
+            # Write to a temporary file first so that readers never see a partially written column.
+            tmp_fpath = fpath + '.tmp'
+
+            with open(tmp_fpath, 'wb') as f:
+                np.save(f, np.asarray(column, dtype=np.float64))
+
+            os.replace(tmp_fpath, fpath)
+
+    def ingest(self, home_path, iso, node_ids, years, months=range(1, 13), overwrite=False):
+        """Converts the raw data bank files at home_path into the store.
+
+        Partitions that are already stored are skipped unless overwrite is True. MISO and NYISO daily files are parsed once per month for all of the nodes. Partitions with missing raw data (empty arrays) are not stored so that they fall back to the raw files once the data is downloaded.
+
+        :param home_path: A string indicating the path to the root of the data bank, e.g., 'data'.
+        :param iso: The ISO/RTO of the data to ingest.
+        :param node_ids: An iterable of pricing node IDs to ingest.
+        :param years: An iterable of years to ingest.
+        :param months: An iterable of months to ingest.
+        :return: The number of partitions stored.
+        """
+        n_stored = 0
+
+        for year in years:
+            for month in months:
+                nodes_to_read = [node_id for node_id in node_ids if overwrite or not self.has(iso, year, month, node_id)]
+
+                if not nodes_to_read:
+                    continue
+
+                try:
+                    node_columns = read_raw_data_bulk(home_path, iso, year, month, nodes_to_read)
+                except (FileNotFoundError, KeyError, ValueError, IndexError) as e:
+                    logging.warning('PriceStore: Could not read {iso} data for {year}-{month}, skipping... ({error})'.format(iso=iso, year=year, month=month, error=e))
+                    continue
+
+                for node_id, columns in node_columns.items():
+                    if any(len(column) == 0 for column in columns):
+                        logging.warning('PriceStore: Incomplete {iso} data for {year}-{month} at {node}, skipping...'.format(iso=iso, year=year, month=month, node=node_id))
+                        continue
+
+                    self.put(iso, year, month, node_id, columns, overwrite=overwrite)
+                    n_stored += 1
+
+        logging.info('PriceStore: Stored {n} {iso} partitions in {root}'.format(n=n_stored, iso=iso, root=self.root))
+
+        return n_stored
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest the ISO/RTO data bank into the columnar price store.')
+    parser.add_argument('iso', choices=sorted(SCHEMA.keys()))
+    parser.add_argument('--nodes', nargs='+', required=True, help='Pricing node IDs to ingest.')
+    parser.add_argument('--years', nargs='+', type=int, required=True, help='Years to ingest.')
+    parser.add_argument('--months', nargs='+', type=int, default=list(range(1, 13)), help='Months to ingest.')
+    parser.add_argument('--data-bank', default='data', help='Path to the root of the data bank.')
+    parser.add_argument('--store', default=None, help='Path to the root of the price store. Defaults to <data bank>/_price_store.')
+    parser.add_argument('--overwrite', action='store_true', help='Re-ingest partitions that are already stored.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    store = PriceStore(args.store or os.path.join(args.data_bank, '_price_store'))
+    store.ingest(args.data_bank, args.iso, args.nodes, args.years, args.months, overwrite=args.overwrite)
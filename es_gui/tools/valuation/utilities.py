@@ -9,6 +9,45 @@ import logging
 from xlrd.biffh import XLRDError
 
 
+class _MissingDailyFile(Exception):
+    """Raised by a daily file reader when a daily file is missing or lacks the requested data."""
+    pass
+
+
+class _MissingNode(Exception):
+    """Raised by a daily file reader when the requested node is not in a daily file."""
+    pass
+
+
+def _stack_daily(chunks, n_days, hours_per_day=24):
+    """Copies the per-day arrays yielded by chunks into a single preallocated array.
+
+    The buffer is sized for n_days*hours_per_day rows plus one day of slack for days with extra hours, e.g., the end of daylight saving time. 2-D chunks are stacked row-wise, one column per series. Returns an empty array if chunks raises _MissingDailyFile.
+    """
+    buffer = None
+    n_rows = 0
+
+    try:
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype=float)
+
+            if buffer is None:
+                buffer = np.empty(((n_days + 1)*hours_per_day,) + chunk.shape[1:])
+            elif n_rows + len(chunk) > len(buffer):
+                buffer = np.concatenate([buffer, np.empty_like(buffer)])
+
+            buffer[n_rows:n_rows + len(chunk)] = chunk
+            n_rows += len(chunk)
+    except _MissingDailyFile as e:
+        logging.warning(e)
+        return np.empty([0])
+
+    if buffer is None:
+        return np.empty([0])
+
+    return buffer[:n_rows]
+
+
 def read_ercot_da_spp(fname, month, settlement_point):
     """
     Reads the day-ahead market historical settlement point prices file at fname and returns the NumPy ndarray corresponding to the hourly price at settlement_point.
@@ -101,6 +140,69 @@ def read_ercot_da_ccp(fname, month):
     return regdn, regup
 
 
+def read_ercot_da_spp_year(fname):
+    """
+    Reads every monthly worksheet of the day-ahead market historical settlement point prices file at fname once and returns the hourly prices indexed by month and settlement point.
+
+    :param fname: string giving location of DAM SPPs file
+    :type fname: str
+    :return spp_da: dictionary of NumPy ndarrays with SPPs keyed by (month, settlement point), where month is an int in [1, 12]
+    :rtype: dict
+    """
+    spp_da = {}
+    month_abbrs = list(calendar.month_abbr)
+    months_read = set()
+
+    wkbk = pd.ExcelFile(fname)
+
+    for sheet_name in wkbk.sheet_names:
+        try:
+            month_ix = month_abbrs.index(sheet_name[:3])
+        except ValueError:
+            continue
+
+        if month_ix in months_read:
+            # Only the first worksheet for each month is used, as in read_ercot_da_spp().
+            continue
+
+        months_read.add(month_ix)
+
+        df = wkbk.parse(sheet_name, usecols=['Settlement Point', 'Settlement Point Price'])
+
+        # Split the worksheet by settlement_point in one pass.
+        for settlement_point, df_sp in df.groupby('Settlement Point', sort=False):
+            spp = df_sp['Settlement Point Price'].astype('float').values
+            spp_da[(month_ix, settlement_point)] = spp[~np.isnan(spp)]
+
+    return spp_da
+
+
+def read_ercot_da_ccp_year(fname):
+    """
+    Reads the day-ahead market historical capacity clearing prices file at fname once and returns the hourly regdn and regup prices indexed by month.
+
+    :param fname: string giving location of DAM CCPs file
+    :type fname: str
+    :return: dictionary of (regdn, regup) NumPy ndarrays keyed by month, an int in [1, 12]
+    :rtype: dict
+    """
+    ccp_da = {}
+
+    df = pd.read_csv(fname, low_memory=False)
+    df.columns = [col.strip() for col in df.columns]  # the REGUP key has a trailing space in some files
+
+    # Parse the dates once for the whole year.
+    series_month = pd.to_datetime(df['Delivery Date']).dt.month
+
+    for month_ix, df_month in df.groupby(series_month):
+        regdn = df_month['REGDN'].astype('float').values
+        regup = df_month['REGUP'].astype('float').values
+
+        ccp_da[int(month_ix)] = (regdn[~np.isnan(regdn)], regup[~np.isnan(regup)])
+
+    return ccp_da
+
+
 def read_nodeid(fname,iso):
     from xlrd import open_workbook
     wb = open_workbook(filename = fname)
@@ -477,6 +579,67 @@ def read_isone_data(fpath, year, month, nodeid):
 #///////////////////////////////////////////////////////#
 
 
+def _miso_daily_fname(fpath, year, month, day, product):
+    """Returns the path to the daily MISO 'LMP' or 'MCP' file for the given day."""
+    date_str = '{year}{month}{day}'.format(year=year, month=str(month).zfill(2), day=str(day).zfill(2))
+
+    if (int(year) <= 2014) or (int(year) == 2015 and int(month) <= 2):
+        suffix = {'LMP': 'da_lmp', 'MCP': 'asm_damcp'}[product]
+    else:
+        suffix = {'LMP': 'da_exante_lmp', 'MCP': 'asm_exante_damcp'}[product]
+
+    return os.path.join(fpath, product, str(year), str(month).zfill(2), '{prefix}_{suffix}.csv'.format(prefix=date_str, suffix=suffix))
+
+
+def _iter_miso_lmp_days(fpath, year, month, nodeid):
+    """Yields the hourly MISO DA LMP at nodeid for each day of the month."""
+    _, n_days_month = calendar.monthrange(int(year), int(month))
+
+    for day in range(1, n_days_month+1):
+        lmp_fname = _miso_daily_fname(fpath, year, month, day, 'LMP')
+
+        # Parse only the node, value type, and hourly columns.
+        try:
+            df = pd.read_csv(lmp_fname, skiprows=4, usecols=range(27), low_memory=False)
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_miso_data: LMP file missing, returning empty array.')
+
+        # Filter rows by node_name and LMP values in one pass.
+        col1 = df.columns[0]
+        col3 = df.columns[2]
+        df1 = df.loc[(df[col1] == nodeid) & (df[col3] == "LMP"), df.columns[3:27]]
+
+        if len(df1) == 0:
+            raise _MissingDailyFile('read_miso_data: A daily LMP file is missing required data, returning empty array.')
+
+        # Convert to NumPy ndarray, ravel, and remove NaNs.
+        LMP_day = np.ravel(df1.astype('float').values)
+
+        yield LMP_day[~np.isnan(LMP_day)]
+
+
+def _iter_miso_mcp_days(fpath, year, month):
+    """Yields the hourly MISO DA regulation MCP for each day of the month."""
+    _, n_days_month = calendar.monthrange(int(year), int(month))
+
+    for day in range(1, n_days_month+1):
+        mcp_fname = _miso_daily_fname(fpath, year, month, day, 'MCP')
+
+        try:
+            df = pd.read_csv(mcp_fname, skiprows=4, nrows=7, usecols=range(27), low_memory=False)
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_miso_data: MCP file missing, returning empty array.')
+
+        # Find SERREGMCP values.
+        col3 = df.columns[2]
+        df1 = df.loc[df[col3] == "SERREGMCP", df.columns[3:27]]
+
+        # convert to NumPy ndarray, ravel, and remove NaNs
+        RegMCP_day = np.ravel(df1.astype('float').values)
+
+        yield RegMCP_day[~np.isnan(RegMCP_day)]
+
+
 def read_miso_data(fpath, year, month, nodeid):
     """Reads the daily MISO data files and returns the NumPy ndarrays for LMP and MCP.
 
@@ -492,72 +655,80 @@ def read_miso_data(fpath, year, month, nodeid):
     :return: arrays of data specified
     :rtype: NumPy ndarrays
     """
-    LMP = np.array([])
-    RegMCP = np.array([])
+    _, n_days_month = calendar.monthrange(int(year), int(month))
+
+    LMP = _stack_daily(_iter_miso_lmp_days(fpath, year, month, nodeid), n_days_month)
+    RegMCP = _stack_daily(_iter_miso_mcp_days(fpath, year, month), n_days_month)
+
+    return LMP, RegMCP
+
 
+def _iter_miso_lmp_days_bulk(fpath, year, month, node_ids, missing):
+    """Yields the hourly MISO DA LMP for each day of the month as an hour x node array with one column per node in node_ids.
+
+    Nodes without LMP values in a daily file are added to the set missing and their columns are filled with NaN for that day.
+    """
     _, n_days_month = calendar.monthrange(int(year), int(month))
 
     for day in range(1, n_days_month+1):
-        # Read daily files.
-        date_str = '{year}{month}{day}'.format(year=year, month=str(month).zfill(2), day=str(day).zfill(2))
+        lmp_fname = _miso_daily_fname(fpath, year, month, day, 'LMP')
 
-        if (int(year) <= 2014) or (int(year) == 2015 and int(month) <= 2):
-            lmp_fname = os.path.join(fpath, 'LMP', str(year), str(month).zfill(2), '{prefix}_da_lmp.csv'.format(prefix=date_str))
-            mcp_fname = os.path.join(fpath, 'MCP', str(year), str(month).zfill(2), '{prefix}_asm_damcp.csv'.format(prefix=date_str))
-        else: 
-            lmp_fname = os.path.join(fpath, 'LMP', str(year), str(month).zfill(2), '{prefix}_da_exante_lmp.csv'.format(prefix=date_str))
-            mcp_fname = os.path.join(fpath, 'MCP', str(year), str(month).zfill(2), '{prefix}_asm_exante_damcp.csv'.format(prefix=date_str))
-        
-        # LMP file.
         try:
-            df = pd.read_csv(lmp_fname, skiprows=4, low_memory=False)
+            df = pd.read_csv(lmp_fname, skiprows=4, usecols=range(27), low_memory=False)
         except FileNotFoundError:
-            logging.warning('read_miso_data: LMP file missing, returning empty array.')
-            break
+            raise _MissingDailyFile('read_miso_data_bulk: LMP file missing, returning empty arrays.')
 
-        # Filter rows by node_name.
-        col1 = df.axes[1][0]
-        col3 = df.axes[1][2]
-        pnode_ix1 = df.index[df[col1] == nodeid]
-        df1 = df.iloc[pnode_ix1, :]
-        
-        # Find LMP values.
-        pnode_ix2 = df1.index[df1[col3] == "LMP"]
-        df2 = df.iloc[pnode_ix2, :]
-        
-        # Filter Total LMP columns.
-        df3 = df2[df2.axes[1][3:27]]
+        # Scatter the LMP rows of every requested node into a node x hour frame in one pass.
+        col1 = df.columns[0]
+        col3 = df.columns[2]
+        df1 = df.loc[df[col3] == "LMP", :].set_index(col1)
+        df1 = df1.loc[~df1.index.duplicated(), df1.columns[2:26]].reindex(node_ids)
 
-        if len(df3) == 0:
-            LMP = np.array([])
-            logging.warning('read_miso_data: A daily LMP file is missing required data, returning empty array.')
-            break
+        LMP_day = df1.astype('float').values
+        missing.update(node for node, row in zip(node_ids, LMP_day) if np.isnan(row).all())
 
-        # Convert to NumPy ndarray, ravel, and remove NaNs.
-        LMP_day = np.ravel(df3.astype('float').values)
-        LMP_day = LMP_day[~np.isnan(LMP_day)] 
-        LMP = np.append(LMP, LMP_day)
+        yield LMP_day.T
 
-        # MCP file.
-        try:
-            df = pd.read_csv(mcp_fname, skiprows=4, nrows=7, low_memory=False)
-        except FileNotFoundError:
-            RegMCP = np.array([])
-            logging.warning('read_miso_data: MCP file missing, returning empty array.')
-            break
-        
-        # Find SERREGMCP values.
-        col3 = df.axes[1][2]
-        pnode_ix1 = df.index[df[col3] == "SERREGMCP"]
-        df1 = df.iloc[pnode_ix1, :]
-        df2 = df1[df1.axes[1][3:27]]
-    
-        # convert to NumPy ndarray, ravel, and remove NaNs
-        RegMCP_day = np.ravel(df2.astype('float').values)
-        RegMCP_day = RegMCP_day[~np.isnan(RegMCP_day)] 
-        RegMCP = np.append(RegMCP, RegMCP_day)
-    
-    return LMP, RegMCP
+
+def _split_node_columns(matrix, node_ids, missing):
+    """Returns a dictionary of the hour x node matrix columns keyed by node ID with NaNs removed; nodes in missing, or all nodes if matrix is empty, map to empty arrays."""
+    node_data = {}
+
+    for ix, node in enumerate(node_ids):
+        if matrix.ndim != 2 or node in missing:
+            node_data[node] = np.array([])
+        else:
+            values = matrix[:, ix]
+            node_data[node] = values[~np.isnan(values)]
+
+    return node_data
+
+
+def read_miso_data_bulk(fpath, year, month, node_ids):
+    """Reads the daily MISO data files once and returns the LMP for every node in node_ids and the MCP.
+
+    :param fpath: root of the MISO data folder
+    :type fpath: str
+    :param year: year of data
+    :type year: int or str
+    :param month: month of data
+    :type month: int or str
+    :param node_ids: pricing node IDs
+    :type node_ids: list of str
+    :return: dictionary of LMP arrays keyed by node ID, MCP array
+    :rtype: dict, NumPy ndarray
+    """
+    _, n_days_month = calendar.monthrange(int(year), int(month))
+    node_ids = list(node_ids)
+    missing = set()
+
+    LMP = _stack_daily(_iter_miso_lmp_days_bulk(fpath, year, month, node_ids, missing), n_days_month)
+    RegMCP = _stack_daily(_iter_miso_mcp_days(fpath, year, month), n_days_month)
+
+    for node in missing:
+        logging.warning('read_miso_data_bulk: A daily LMP file is missing required data for {0}, returning empty array.'.format(node))
+
+    return _split_node_columns(LMP, node_ids, missing), RegMCP
 
 
 
@@ -566,6 +737,92 @@ def read_miso_data(fpath, year, month, nodeid):
 # NYISO
 #######################################################################################################################
 
+def _nyiso_asp_format(year, month, day):
+    """Returns the NYISO ancillary service price file format in use on the given day: 'nyca' (since 2016-06-23), 'east' (since 2001-10), or 'legacy'."""
+    if (year >= 2016 and month >= 6 and day >= 23) or (year >= 2016 and month >= 7) or (year >= 2017):
+        return 'nyca'
+    elif (year >= 2001 and month >= 10) or (year >= 2001 and month >= 11) or (year >= 2002):
+        return 'east'
+    else:
+        return 'legacy'
+
+
+def _iter_nyiso_asp_days(fpath, year, month, zoneid, RT_DAM):
+    """Yields the hourly NYISO regulation capacity prices in zoneid for each day of the month.
+
+    DAM chunks are 1-D arrays of capacity prices. RT chunks are 2-D arrays with capacity and movement price columns.
+    """
+    ndaysmonth = calendar.monthrange(year, month)[1]
+
+    for day_x in range(1, ndaysmonth+1):
+        date_str = str(year) + str(month).zfill(2) + str(day_x).zfill(2)
+
+        if RT_DAM == "RT":
+            # 20180501rtasp.csv
+            fname_path = os.path.join(fpath, 'ASP', 'RT', str(year), str(month).zfill(2), date_str + "rtasp.csv")
+        else:
+            # 20170201damasp.csv
+            fname_path = os.path.join(fpath, 'ASP', 'DAM', str(year), str(month).zfill(2), date_str + "damasp.csv")
+
+        asp_format = _nyiso_asp_format(year, month, day_x)
+
+        if asp_format == 'nyca':
+            price_cols = ['NYCA Regulation Capacity ($/MWHr)', 'NYCA Regulation Movement ($/MW)']
+        elif asp_format == 'east':
+            price_cols = ['East Regulation ($/MWHr)', ' NYCA Regulation Movement ($/MW)']
+        elif RT_DAM == "RT":
+            # RT ancillary services for NYISO start on July 2004
+            continue
+        else:
+            price_cols = ['Regulation ($/MWHr)']
+
+        if RT_DAM != "RT":
+            price_cols = price_cols[:1]
+
+        # Parse only the needed columns.
+        usecols = ['PTID'] + price_cols if asp_format == 'nyca' else price_cols
+
+        try:
+            df_file = pd.read_csv(fname_path, index_col=False, usecols=usecols)
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_nyiso_data: {0} ASP file missing, returning empty array.'.format("RT" if RT_DAM == "RT" else "DA"))
+
+        if asp_format == 'nyca':
+            df_file = df_file.loc[df_file['PTID'] == zoneid, :]
+
+        prices = df_file[price_cols].values
+
+        yield prices if RT_DAM == "RT" else prices[:, 0]
+
+
+def _iter_nyiso_lbmp_days(fpath, year, month, nodeid, zone_gen, RT_DAM):
+    """Yields the hourly NYISO LBMP at nodeid for each day of the month."""
+    ndaysmonth = calendar.monthrange(year, month)[1]
+
+    for day_x in range(1, ndaysmonth+1):
+        date_str = str(year) + str(month).zfill(2) + str(day_x).zfill(2)
+
+        if RT_DAM == "RT":
+            # 20170201realtime_gen.csv
+            fname_path = os.path.join(fpath, 'LBMP', 'RT', zone_gen, str(year), str(month).zfill(2), date_str + "realtime_" + zone_gen + ".csv")
+        else:
+            # 20170201damlbmp_gen.csv
+            # 20170201damlbmp_zone.csv
+            fname_path = os.path.join(fpath, 'LBMP', 'DAM', zone_gen, str(year), str(month).zfill(2), date_str + "damlbmp_" + zone_gen + ".csv")
+
+        try:
+            df_LBMP = pd.read_csv(fname_path, index_col=False, usecols=['PTID', 'LBMP ($/MWHr)'])
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_nyiso_data: {0} LMP file missing, returning empty array.'.format("RT" if RT_DAM == "RT" else "DA"))
+
+        LBMP_node_x = df_LBMP.loc[df_LBMP['PTID'] == nodeid, 'LBMP ($/MWHr)']
+
+        if LBMP_node_x.empty:
+            raise _MissingNode(nodeid)
+
+        yield LBMP_node_x.values
+
+
 def read_nyiso_data(fpath, year, month, nodeid, typedat="both", RT_DAM="both"):
     """"
     Reads the historical LBMP, regulation capacity, and regulation movement prices for the year 'year',
@@ -628,102 +885,120 @@ def read_nyiso_data(fpath, year, month, nodeid, typedat="both", RT_DAM="both"):
     ndaysmonth = calendar.monthrange(year, month)
     ndaysmonth = int(ndaysmonth[1])
 
+    try:
+        if typedat == "asp" or typedat == "both":
+            if RT_DAM == "RT" or RT_DAM == "both":
+                rtASP = _stack_daily(_iter_nyiso_asp_days(fpath, year, month, zoneid, "RT"), ndaysmonth)
 
-    for ix in range(ndaysmonth):
-        day_x = ix+1
-        date_str = str(year)+ str(month).zfill(2)+str(day_x).zfill(2)
-        # print(date_str)
+                if rtASP.ndim == 2:
+                    rtCAP, rtMOV = rtASP[:, 0], rtASP[:, 1]
 
-        fnameLBMP_DA = date_str + "damlbmp_" + zone_gen + ".csv"
-        fnameASP_DA = date_str + "damasp.csv"
+            if RT_DAM == "DAM" or RT_DAM == "both":
+                daCAP = _stack_daily(_iter_nyiso_asp_days(fpath, year, month, zoneid, "DAM"), ndaysmonth)
 
-        fnameLBMP_RT = date_str + "realtime_" + zone_gen + ".csv"
-        fnameASP_RT = date_str + "rtasp.csv"
+        if typedat == "lbmp" or typedat == "both":
+            if RT_DAM == "RT" or RT_DAM == "both":
+                rtLBMP = _stack_daily(_iter_nyiso_lbmp_days(fpath, year, month, nodeid, zone_gen, "RT"), ndaysmonth)
 
-        fname_path_LBMP_DA = os.path.join(fpath, 'LBMP', 'DAM', zone_gen, str(year), str(month).zfill(2),fnameLBMP_DA)
-        fname_path_ASP_DA = os.path.join(fpath, 'ASP', 'DAM', str(year), str(month).zfill(2),fnameASP_DA)
+            if RT_DAM == "DAM" or RT_DAM == "both":
+                daLBMP = _stack_daily(_iter_nyiso_lbmp_days(fpath, year, month, nodeid, zone_gen, "DAM"), ndaysmonth)
+    except _MissingNode:
+        return np.empty([0]), np.empty([0]), np.empty([0]), np.empty([0]), np.empty([0])
 
-        fname_path_LBMP_RT = os.path.join(fpath, 'LBMP', 'RT', zone_gen, str(year), str(month).zfill(2),fnameLBMP_RT)
-        fname_path_ASP_RT = os.path.join(fpath, 'ASP', 'RT', str(year), str(month).zfill(2),fnameASP_RT)
+    return daLBMP, rtLBMP, daCAP, rtCAP, rtMOV
 
-        if typedat == "asp" or typedat == "both":
-            # 20170201damasp.csv
-            # 20180501rtasp.csv
-            if RT_DAM == "RT" or RT_DAM == "both":
-                try:
-                    df_file = pd.read_csv(fname_path_ASP_RT, index_col=False)
-                except FileNotFoundError:
-                    rtCAP = np.empty([0])
-                    rtMOV = np.empty([0])
-                    logging.warning('read_nyiso_data: RT ASP file missing, returning empty array.')
-                    break
 
-                if (year>=2016 and month>=6 and day_x>=23) or (year>=2016 and month>=7) or (year>=2017):
-                    # NYCA Regulation Capacity ($/MWHr) - for newest type of data
-                    df_file_rtCAP = df_file.loc[df_file['PTID'] == zoneid, ['NYCA Regulation Capacity ($/MWHr)']]
-                    rtCAP = np.append(rtCAP, df_file_rtCAP.values)
-                    # NYCA Regulation Movement ($/MW)
-                    df_file_rtMOV = df_file.loc[df_file['PTID'] == zoneid, ['NYCA Regulation Movement ($/MW)']]
-                    rtMOV = np.append(rtMOV, df_file_rtMOV.values)
-                elif (year>=2001 and month>=10 and day_x>=0) or (year>=2001 and month>=11) or \
-                     (year>=2002 and not ((year>=2016 and month>=6 and day_x>=23) or (year>=2016 and month>=7) or (year>=2017))):
-                    df_file_rtCAP = df_file['East Regulation ($/MWHr)']
-                    rtCAP = np.append(rtCAP, df_file_rtCAP.values)
-                    df_file_rtMOV = df_file[' NYCA Regulation Movement ($/MW)']
-                    rtMOV = np.append(rtMOV, df_file_rtMOV.values)
-                    # RT ancillary services for NYISO start on July 2004
+def _iter_nyiso_lbmp_days_bulk(fpath, year, month, node_ids, zone_gen, missing):
+    """Yields the hourly NYISO DA LBMP for each day of the month as an hour x node array with one column per node in node_ids.
 
+    Nodes without LBMP values in a daily file are added to the set missing and their columns are filled with NaN for that day.
+    """
+    ndaysmonth = calendar.monthrange(year, month)[1]
 
-            if RT_DAM == "DAM" or RT_DAM == "both":
-                try:
-                    df_file = pd.read_csv(fname_path_ASP_DA, index_col=False)
-                except FileNotFoundError:
-                    daCAP = np.empty([0])
-                    logging.warning('read_nyiso_data: DA ASP file missing, returning empty array.')
-                    break
+    for day_x in range(1, ndaysmonth+1):
+        date_str = str(year) + str(month).zfill(2) + str(day_x).zfill(2)
+        fname_path = os.path.join(fpath, 'LBMP', 'DAM', zone_gen, str(year), str(month).zfill(2), date_str + "damlbmp_" + zone_gen + ".csv")
 
-                if (year >= 2016 and month >= 6 and day_x >= 23) or (year >= 2016 and month >= 7) or (year >= 2017):
-                    df_file_daCAP = df_file.loc[df_file['PTID'] == zoneid, ['NYCA Regulation Capacity ($/MWHr)']]
-                    daCAP = np.append(daCAP, df_file_daCAP.values)
-                elif (year >= 2001 and month >= 10 and day_x >= 0) or (year >= 2001 and month >= 11) or \
-                     (year >= 2002 and not ((year >= 2016 and month >= 6 and day_x >= 23) or (year >= 2016 and month >= 7) or (year >= 2017))):
-                    df_file_daCAP = df_file['East Regulation ($/MWHr)']
-                    daCAP = np.append(daCAP, df_file_daCAP.values)
-                else:
-                    df_file_daCAP = df_file['Regulation ($/MWHr)']
-                    daCAP = np.append(daCAP, df_file_daCAP.values)
+        try:
+            df_LBMP = pd.read_csv(fname_path, index_col=False, usecols=['PTID', 'LBMP ($/MWHr)'])
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_nyiso_data_bulk: DA LMP file missing, returning empty arrays.')
 
-        if typedat == "lbmp" or typedat == "both":
-            # 20170201damlbmp_gen.csv
-            # 20170201damlbmp_zone.csv
-            # 20170201realtime_gen.csv
-            if RT_DAM == "RT" or RT_DAM == "both":
-                try:
-                    df_rtLBMP = pd.read_csv(fname_path_LBMP_RT, index_col=False)
-                except FileNotFoundError:
-                    rtLBMP = np.empty([0])
-                    logging.warning('read_nyiso_data: RT LMP file missing, returning empty array.')
-                    break
+        # Scatter the rows of every requested node into an hour x node frame in one pass.
+        df_LBMP = df_LBMP.loc[df_LBMP['PTID'].isin(node_ids), :]
+        df_LBMP = df_LBMP.assign(hour=df_LBMP.groupby('PTID').cumcount())
+        df_LBMP = df_LBMP.pivot(index='hour', columns='PTID', values='LBMP ($/MWHr)').reindex(columns=node_ids)
 
-                rtLBMP_node_x = df_rtLBMP.loc[df_rtLBMP['PTID'] == nodeid, ['LBMP ($/MWHr)']]
-                rtLBMP = np.append(rtLBMP, rtLBMP_node_x.values)
-                if rtLBMP_node_x.empty:
-                    return np.empty([0]), np.empty([0]), np.empty([0]), np.empty([0]), np.empty([0])
+        missing.update(node for node in node_ids if df_LBMP[node].isnull().all())
 
-            if RT_DAM == "DAM" or RT_DAM == "both":
-                try:
-                    df_daLBMP = pd.read_csv(fname_path_LBMP_DA, index_col=False)
-                except FileNotFoundError:
-                    daLBMP = np.empty([0])
-                    logging.warning('read_nyiso_data: DA LMP file missing, returning empty array.')
-                    break
+        yield df_LBMP.values
 
-                daLBMP_node_x = df_daLBMP.loc[df_daLBMP['PTID'] == nodeid, ['LBMP ($/MWHr)']]
-                daLBMP = np.append(daLBMP, daLBMP_node_x.values)
-                if daLBMP_node_x.empty:
-                    return np.empty([0]), np.empty([0]), np.empty([0]), np.empty([0]), np.empty([0])
 
-    return daLBMP, rtLBMP, daCAP, rtCAP, rtMOV
+def read_nyiso_data_bulk(fpath, year, month, node_ids):
+    """
+    Reads the historical day-ahead LBMP for every node in node_ids and the day-ahead regulation capacity prices for the year 'year' and the month 'month', parsing each daily file once.
+
+    :param fpath: The path to the root of the NYISO data directory
+    :type fpath: str
+    :param year: Year of data to read
+    :type year: int or str
+    :param month: Month of data to read
+    :type month: int or str
+    :param node_ids: IDs of the nodes to read
+    :type node_ids: list of int or str
+    :return: daLBMP, daCAP: Dictionary of hourly LBMP arrays keyed by node ID as given, hourly regulation capacity clearing prices.
+    :rtype: dict, NumPy ndarray
+    """
+    if isinstance(month, str):
+        month = int(month)
+
+    if isinstance(year, str):
+        year = int(year)
+
+    ndaysmonth = calendar.monthrange(year, month)[1]
+
+    path_nodes_file = '../../es_gui/apps/data_manager/_static/'
+    pathf_nodeszones = os.path.join(fpath, path_nodes_file, 'nodes_nyiso.csv')
+    df_nodeszones = pd.read_csv(pathf_nodeszones, index_col=False)
+    node_zones = dict(zip(df_nodeszones['Node ID'], df_nodeszones['Zone ID']))
+
+    daLBMP = {nodeid: np.empty([0]) for nodeid in node_ids}
+    daCAP = np.empty([0])
+
+    # Group the nodes by the daily files that contain them.
+    zone_gen_nodes = {"zone": [], "gen": []}
+
+    for nodeid in node_ids:
+        zoneid = node_zones.get(int(nodeid))
+
+        if zoneid is None:
+            logging.warning('read_nyiso_data_bulk: The node {0} does not exist in NYISO, returning empty array.'.format(nodeid))
+        elif int(nodeid) == zoneid:
+            zone_gen_nodes["zone"].append(nodeid)
+        else:
+            zone_gen_nodes["gen"].append(nodeid)
+
+    for zone_gen, nodes in zone_gen_nodes.items():
+        if not nodes:
+            continue
+
+        missing = set()
+        ptids = [int(nodeid) for nodeid in nodes]
+        LBMP = _stack_daily(_iter_nyiso_lbmp_days_bulk(fpath, year, month, ptids, zone_gen, missing), ndaysmonth)
+
+        node_LBMP = _split_node_columns(LBMP, ptids, missing)
+
+        for nodeid in nodes:
+            daLBMP[nodeid] = node_LBMP[int(nodeid)]
+
+    # NYCA regulation capacity prices are the same in every zone, so the ASP files are read once.
+    located_nodes = zone_gen_nodes["zone"] + zone_gen_nodes["gen"]
+
+    if located_nodes:
+        zoneid = node_zones[int(located_nodes[0])]
+        daCAP = _stack_daily(_iter_nyiso_asp_days(fpath, year, month, zoneid, "DAM"), ndaysmonth)
+
+    return daLBMP, daCAP
 
 
 #TODO: delete function below:
@@ -902,6 +1177,46 @@ def read_nyiso_data_old(fpath, year, month, nodeid, typedat="both", RT_DAM="both
 # SPP
 #######################################################################################################################
 
+def _iter_spp_lmp_days(fpath, year, month, node, bus_loc):
+    """Yields the hourly SPP DA LMP at node for each day of the month."""
+    ndaysmonth = calendar.monthrange(year, month)[1]
+
+    for day_x in range(1, ndaysmonth+1):
+        # DA-LMP-B-201707010100.csv
+        # DA-LMP-SL-201707010100.csv
+        fnameLMP_DA = "DA-LMP-{0:s}-{1:d}{2:02d}{3:02d}0100.csv".format(bus_loc[1], year, month, day_x)
+        fname_path_LMP_DA = os.path.join(fpath, 'LMP', 'DAM', bus_loc[0], str(year), str(month).zfill(2), fnameLMP_DA)
+
+        try:
+            df_daLMP = pd.read_csv(fname_path_LMP_DA, index_col=False, usecols=['Pnode', 'LMP'])
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_spp_data: LMP file missing, returning empty array.')
+
+        daLMP_node_x = df_daLMP.loc[df_daLMP['Pnode'] == node, 'LMP']
+
+        if daLMP_node_x.empty:
+            raise _MissingNode(node)
+
+        yield daLMP_node_x.values
+
+
+def _iter_spp_mcp_days(fpath, year, month, ResZone):
+    """Yields the hourly SPP DA regulation up and down MCPs in ResZone as two columns for each day of the month."""
+    ndaysmonth = calendar.monthrange(year, month)[1]
+
+    for day_x in range(1, ndaysmonth+1):
+        # DA-MCP-201707010100.csv
+        fnameMCP_DA = "DA-MCP-{0:d}{1:02d}{2:02d}0100.csv".format(year, month, day_x)
+        fname_path_MCP_DA = os.path.join(fpath, 'MCP', 'DAM', str(year), str(month).zfill(2), fnameMCP_DA)
+
+        try:
+            df_daMCP = pd.read_csv(fname_path_MCP_DA, index_col=False, usecols=['Reserve Zone', 'RegUP', 'RegDN'])
+        except FileNotFoundError:
+            raise _MissingDailyFile('read_spp_data: MCP file missing, returning empty arrays.')
+
+        yield df_daMCP.loc[df_daMCP['Reserve Zone'] == ResZone, ['RegUP', 'RegDN']].values
+
+
 def read_spp_data(fpath, year, month, node, typedat="both"):
     """"
     Reads the historical LMP, regulation capacity, and regulation service (mileage) prices for the year 'year',
@@ -954,46 +1269,17 @@ def read_spp_data(fpath, year, month, node, typedat="both"):
     ndaysmonth = calendar.monthrange(year, month)
     ndaysmonth = int(ndaysmonth[1])
 
-    for ix in range(ndaysmonth):
-        day_x = ix+1
-
-        fnameLMP_DA = "DA-LMP-{0:s}-{1:d}{2:02d}{3:02d}0100.csv".format(bus_loc[1], year, month, day_x)
-        fnameMCP_DA = "DA-MCP-{0:d}{1:02d}{2:02d}0100.csv".format(year, month, day_x)
-
-        fname_path_LMP_DA = os.path.join(fpath, 'LMP', 'DAM', bus_loc[0], str(year), str(month).zfill(2),fnameLMP_DA)
-        fname_path_MCP_DA = os.path.join(fpath, 'MCP', 'DAM', str(year), str(month).zfill(2),fnameMCP_DA)
-
-        if typedat == "lmp" or typedat == "both":
-            # DA-LMP-B-201707010100.csv
-            # DA-LMP-SL-201707010100.csv
-            try:
-                df_daLMP = pd.read_csv(fname_path_LMP_DA, index_col=False)
-            except FileNotFoundError:
-                daLMP = np.empty([0])
-                logging.warning('read_spp_data: LMP file missing, returning empty array.')
-                break
-
-            daLMP_node_x = df_daLMP.loc[df_daLMP['Pnode'] == node, ['LMP']]
-            daLMP = np.append(daLMP, daLMP_node_x.values)
-            if daLMP_node_x.empty:
-                return np.empty([0]), np.empty([0]), np.empty([0])
-
-        if typedat == "mcp" or typedat == "both":
-            # DA-MCP-201707010100.csv
-            try:
-                df_daMCP = pd.read_csv(fname_path_MCP_DA, index_col=False)
-            except FileNotFoundError:
-                daMCPRU = np.empty([0])
-                daMCPRD = np.empty([0])
-                logging.warning('read_spp_data: MCP file missing, returning empty arrays.')
-                break
+    if typedat == "lmp" or typedat == "both":
+        try:
+            daLMP = _stack_daily(_iter_spp_lmp_days(fpath, year, month, node, bus_loc), ndaysmonth)
+        except _MissingNode:
+            return np.empty([0]), np.empty([0]), np.empty([0])
 
-            # print('Warning -reserve zone not figured out!!!')
-            daMCPRU_node_x = df_daMCP.loc[df_daMCP['Reserve Zone'] == ResZone, ['RegUP']]
-            daMCPRD_node_x = df_daMCP.loc[df_daMCP['Reserve Zone'] == ResZone, ['RegDN']]
+    if typedat == "mcp" or typedat == "both":
+        daMCP = _stack_daily(_iter_spp_mcp_days(fpath, year, month, ResZone), ndaysmonth)
 
-            daMCPRU = np.append(daMCPRU, daMCPRU_node_x.values)
-            daMCPRD = np.append(daMCPRD, daMCPRD_node_x.values)
+        if daMCP.ndim == 2:
+            daMCPRU, daMCPRD = daMCP[:, 0], daMCP[:, 1]
 
     return daLMP, daMCPRU, daMCPRD
 
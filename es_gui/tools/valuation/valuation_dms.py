@@ -3,22 +3,28 @@ import logging
 import os
 import json
 
+import numpy as np
 import pandas as pd
 
 from es_gui.tools.dms import DataManagementSystem
 from es_gui.tools.valuation.utilities import *
+from es_gui.tools.valuation.price_store import PriceStore
 
 
 class ValuationDMS(DataManagementSystem):
     """
     A class for managing data for the energy storage valuation optimization functions. Class methods for each type of file to be loaded are included, extending from the get_data() method of the superclass. Each of these methods uses get_data() to retrieve the relevant data and loads the file and adds it to the DMS if the data is not loaded. An optional class method for calling each of the individual data methods can be included to, e.g., form the necessary arguments and return the desired variables.
 
+    Data that has been ingested into the columnar price store (see price_store.py) is read from the store instead of the raw data bank files.
+
     :param home_path: A string indicating the relative path to where data is saved.
+    :param store_path: A string indicating the path to the columnar price store. Defaults to '_price_store' in home_path.
     """
-    def __init__(self, home_path, **kwargs):
+    def __init__(self, home_path, store_path=None, **kwargs):
         DataManagementSystem.__init__(self, **kwargs)
 
         self.home_path = home_path
+        self.price_store = PriceStore(store_path if store_path is not None else os.path.join(home_path, '_price_store'))
 
         # with open(os.path.abspath(os.path.join(self.home_path, '..', 'es_gui', 'apps', 'valuation', 'definitions', 'nodes.json')), 'r') as fp:
         #     self.NODES = json.load(fp)
@@ -44,44 +50,83 @@ class ValuationDMS(DataManagementSystem):
         #     return node_name
 
     def get_ercot_spp_data(self, id_key):
-        """Retrieves DAM-SPP data for ERCOT."""
+        """Retrieves DAM-SPP data for ERCOT. The workbook is parsed once for every month and settlement point, which are all added to the DMS."""
         logging.info('DMS: Loading ERCOT DA-SPP')
-        try:
+
+        fname, month, settlement_point = id_key.split(self.delimiter)
+        month = int(month)
+
+        def _lookup():
             # attempt to access data if it is already loaded
-            spp_da = self.get_data(id_key)
-        except KeyError:
-            # load the data and add it to the DMS
+            return {(month, settlement_point): self.get_data(id_key)}
 
-            # deconstruct id_key to obtain args for read function
-            spp_da = read_ercot_da_spp(*id_key.split(self.delimiter))
-            self.add_data(spp_da, id_key)
-        finally:
-            return spp_da
+        def _load():
+            # load the data for the whole year and add it to the DMS
+            spp_year = read_ercot_da_spp_year(fname)
+
+            if (month, settlement_point) not in spp_year:
+                logging.warning('get_ercot_spp_data: No data matching input parameters found, returning empty array. (got {fname}, {month}, {settlement_point})'.format(fname=fname, month=month, settlement_point=settlement_point))
+
+            # record the missing months of the settlement point so that the workbook is not parsed again for them
+            for month_ix in range(1, 13):
+                spp_year.setdefault((month_ix, settlement_point), np.array([]))
+
+            for (month_ix, sp), spp_da in spp_year.items():
+                self.add_data(spp_da, self.delimiter.join([fname, str(month_ix), sp]))
+
+            return spp_year
+
+        # concurrent requests for the same month and settlement point share one load
+        spp_year = self.load_once(id_key, _load, _lookup)
+
+        return spp_year[(month, settlement_point)]
 
     def get_ercot_ccp_data(self, id_key):
-        """Retrieves DAM-CCP data for ERCOT."""
+        """Retrieves DAM-CCP data for ERCOT. The file is parsed once for every month, which are all added to the DMS."""
         logging.info('DMS: Loading ERCOT DA-CCP')
-        try:
+
+        fname, month = id_key.split(self.delimiter)[:2]
+        month = int(month)
+
+        def _lookup():
             # attempt to access data if it is already loaded
-            REGUP = self.get_data(id_key + self.delimiter + 'REGUP')
-            REGDN = self.get_data(id_key + self.delimiter + 'REGDN')
-        except KeyError:
-            # load the data and add it to the DMS
+            return {month: (self.get_data(id_key + self.delimiter + 'REGDN'), self.get_data(id_key + self.delimiter + 'REGUP'))}
 
-            # deconstruct id_key to obtain args for read function
-            REGDN, REGUP = read_ercot_da_ccp(*id_key.split(self.delimiter)[:2])
+        def _load():
+            # load the data for the whole year and add it to the DMS
+            ccp_year = read_ercot_da_ccp_year(fname)
 
-            self.add_data(REGUP, id_key + self.delimiter + 'REGUP')
-            self.add_data(REGDN, id_key + self.delimiter + 'REGDN')
-        finally:
-            return REGDN, REGUP
+            if month not in ccp_year:
+                logging.warning('get_ercot_ccp_data: No data matching input parameters found, returning empty array. (got {fname}, {month})'.format(fname=fname, month=month))
+
+            # record the missing months so that the file is not parsed again for them
+            for month_ix in range(1, 13):
+                ccp_year.setdefault(month_ix, (np.array([]), np.array([])))
+
+            for month_ix, (REGDN, REGUP) in ccp_year.items():
+                month_key = self.delimiter.join([fname, str(month_ix)])
+
+                self.add_data(REGUP, month_key + self.delimiter + 'REGUP')
+                self.add_data(REGDN, month_key + self.delimiter + 'REGDN')
+
+            return ccp_year
+
+        # concurrent requests for the same month share one load
+        ccp_year = self.load_once(id_key, _load, _lookup)
+
+        return ccp_year[month]
 
     def get_ercot_data(self, year, month, settlement_point):
+        try:
+            # read the data from the price store if it has been ingested
+            return self.price_store.get('ERCOT', year, month, settlement_point)
+        except KeyError:
+            pass
+
         # construct file name paths
         path = os.path.join(self.home_path, 'ERCOT')  # path to data_bank root
 
-        if isinstance(month, int):
-            month = str(month)
+        month = str(int(month))
 
         spp_fpath = os.path.join(path, 'SPP', str(year))
         
@@ -185,24 +230,31 @@ class ValuationDMS(DataManagementSystem):
         rccp_key = self.delimiter.join([path, year, month, 'RegCCP'])
         rpcp_key = self.delimiter.join([path, year, month, 'RegPCP'])
 
-        try:
+        def _lookup():
             # attempt to access data if it is already loaded
-            lmp_da = self.get_data(lmp_key)
-            MR = self.get_data(mr_key)
-            RA = self.get_data(ra_key)
-            RD = self.get_data(rd_key)
-            RegCCP = self.get_data(rccp_key)
-            RegPCP = self.get_data(rpcp_key)
+            return self.get_data(lmp_key), self.get_data(mr_key), self.get_data(ra_key), self.get_data(rd_key), self.get_data(rccp_key), self.get_data(rpcp_key)
+
+        try:
+            lmp_da, MR, RA, RD, RegCCP, RegPCP = _lookup()
         except KeyError:
-            # load the data and add it to the DMS
-            lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
+            def _load():
+                # load the data from the price store, or from the raw files if it has not been ingested, and add it to the DMS
+                try:
+                    lmp_da, MR, RA, RD, RegCCP, RegPCP = self.price_store.get('PJM', year, month, nodeid)
+                except KeyError:
+                    lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
+
+                self.add_data(lmp_da, lmp_key)
+                self.add_data(MR, mr_key)
+                self.add_data(RA, ra_key)
+                self.add_data(RD, rd_key)
+                self.add_data(RegCCP, rccp_key)
+                self.add_data(RegPCP, rpcp_key)
 
-            self.add_data(lmp_da, lmp_key)
-            self.add_data(MR, mr_key)
-            self.add_data(RA, ra_key)
-            self.add_data(RD, rd_key)
-            self.add_data(RegCCP, rccp_key)
-            self.add_data(RegPCP, rpcp_key)
+                return lmp_da, MR, RA, RD, RegCCP, RegPCP
+
+            # concurrent requests for the same data share one load
+            lmp_da, MR, RA, RD, RegCCP, RegPCP = self.load_once(lmp_key, _load, _lookup)
 
         return lmp_da, MR, RA, RD, RegCCP, RegPCP
     
@@ -235,25 +287,88 @@ class ValuationDMS(DataManagementSystem):
     def get_miso_data(self, year, month, nodeid):
         path = os.path.join(self.home_path, 'MISO')
 
+        nodeid = str(nodeid)
         year = str(year)
         month = str(month)
 
         lmp_key = self.delimiter.join([path, year, month, nodeid, 'LMP'])
         regmcp_key = self.delimiter.join([path, year, month, 'MCP'])
 
-        try:
+        def _lookup():
             # attempt to access data if it is already loaded
-            lmp_da = self.get_data(lmp_key)
-            RegMCP = self.get_data(regmcp_key)
+            return self.get_data(lmp_key), self.get_data(regmcp_key)
+
+        try:
+            lmp_da, RegMCP = _lookup()
         except KeyError:
-            # load the data and add it to the DMS
-            lmp_da, RegMCP = read_miso_data(path, year, month, nodeid)
+            def _load():
+                # load the data from the price store, or from the raw files if it has not been ingested, and add it to the DMS
+                try:
+                    lmp_da, RegMCP = self.price_store.get('MISO', year, month, nodeid)
+                except KeyError:
+                    lmp_da, RegMCP = read_miso_data(path, year, month, nodeid)
 
-            self.add_data(lmp_da, lmp_key)
-            self.add_data(RegMCP, regmcp_key)
+                self.add_data(lmp_da, lmp_key)
+                self.add_data(RegMCP, regmcp_key)
+
+                return lmp_da, RegMCP
+
+            # concurrent requests for the same data share one load
+            lmp_da, RegMCP = self.load_once(lmp_key, _load, _lookup)
 
         return lmp_da, RegMCP
 
+    def get_miso_data_bulk(self, year, month, node_ids):
+        """Retrieves the data returned by get_miso_data() for every node in node_ids. The daily files are parsed once for all of the nodes that are not already loaded or in the price store.
+
+        :return: A dictionary of (lmp_da, RegMCP) tuples keyed by node ID.
+        """
+        path = os.path.join(self.home_path, 'MISO')
+
+        year = str(year)
+        month = str(month)
+
+        regmcp_key = self.delimiter.join([path, year, month, 'MCP'])
+
+        lmp_data = {}
+        nodes_to_read = []
+
+        # the data is keyed by the node ID as a string, as in get_miso_data()
+        node_keys = [str(nodeid) for nodeid in node_ids]
+
+        for nodeid in node_keys:
+            lmp_key = self.delimiter.join([path, year, month, nodeid, 'LMP'])
+
+            try:
+                # attempt to access data if it is already loaded
+                lmp_data[nodeid] = self.get_data(lmp_key)
+            except KeyError:
+                try:
+                    lmp_data[nodeid], _ = self.price_store.get('MISO', year, month, nodeid)
+                except KeyError:
+                    nodes_to_read.append(nodeid)
+                else:
+                    self.add_data(lmp_data[nodeid], lmp_key)
+
+        if nodes_to_read:
+            # load the data for the remaining nodes from one pass over the raw files and add it to the DMS
+            lmp_read, RegMCP = read_miso_data_bulk(path, year, month, nodes_to_read)
+
+            for nodeid, lmp_da in lmp_read.items():
+                lmp_data[nodeid] = lmp_da
+                self.add_data(lmp_da, self.delimiter.join([path, year, month, nodeid, 'LMP']))
+
+            self.add_data(RegMCP, regmcp_key)
+        elif node_keys:
+            try:
+                RegMCP = self.get_data(regmcp_key)
+            except KeyError:
+                _, RegMCP = self.get_miso_data(year, month, node_keys[0])
+        else:
+            RegMCP = np.array([])
+
+        return {nodeid: (lmp_data[str(nodeid)], RegMCP) for nodeid in node_ids}
+
     ####################################################################################################################
 
     def get_isone_data(self, year, month, nodeid):
@@ -267,20 +382,29 @@ class ValuationDMS(DataManagementSystem):
         rpcp_key = self.delimiter.join([path, year, month, 'RegPCP'])
         mimult_key = self.delimiter.join([path, year, month, 'MiMult'])
 
-        try:
+        def _lookup():
             # attempt to access data if it is already loaded
-            lmp_da = self.get_data(lmp_key)
-            rccp = self.get_data(rccp_key)
-            rpcp = self.get_data(rpcp_key)
-            mi_mult = self.get_data(mimult_key)
+            return self.get_data(lmp_key), self.get_data(rccp_key), self.get_data(rpcp_key), self.get_data(mimult_key)
+
+        try:
+            lmp_da, rccp, rpcp, mi_mult = _lookup()
         except KeyError:
-            # load the data and add it to the DMS
-            lmp_da, rccp, rpcp, mi_mult = read_isone_data(path, year, month, nodeid)
+            def _load():
+                # load the data from the price store, or from the raw files if it has not been ingested, and add it to the DMS
+                try:
+                    lmp_da, rccp, rpcp, mi_mult = self.price_store.get('ISONE', year, month, nodeid)
+                except KeyError:
+                    lmp_da, rccp, rpcp, mi_mult = read_isone_data(path, year, month, nodeid)
 
-            self.add_data(lmp_da, lmp_key)
-            self.add_data(rccp, rccp_key)
-            self.add_data(rpcp, rpcp_key)
-            self.add_data(mi_mult, mimult_key)
+                self.add_data(lmp_da, lmp_key)
+                self.add_data(rccp, rccp_key)
+                self.add_data(rpcp, rpcp_key)
+                self.add_data(mi_mult, mimult_key)
+
+                return lmp_da, rccp, rpcp, mi_mult
+
+            # concurrent requests for the same data share one load
+            lmp_da, rccp, rpcp, mi_mult = self.load_once(lmp_key, _load, _lookup)
 
         return lmp_da, rccp, rpcp, mi_mult
 
@@ -296,20 +420,83 @@ class ValuationDMS(DataManagementSystem):
         lbmp_key = self.delimiter.join([path, year, month, nodeid, 'LBMP'])
         rcap_key = self.delimiter.join([path, year, month, 'RegCAP'])
 
-        try:
+        def _lookup():
             # attempt to access data if it is already loaded
-            lbmp_da = self.get_data(lbmp_key)
-            rcap_da = self.get_data(rcap_key)
+            return self.get_data(lbmp_key), self.get_data(rcap_key)
+
+        try:
+            lbmp_da, rcap_da = _lookup()
         except KeyError:
-            # load the data and add it to the DMS
-            lbmp_da, lbmp_rt, rcap_da, rcap_rt, rmov_da = read_nyiso_data(path, year, month, nodeid, typedat="both", RT_DAM="DAM")
+            def _load():
+                # load the data from the price store, or from the raw files if it has not been ingested, and add it to the DMS
+                try:
+                    lbmp_da, rcap_da = self.price_store.get('NYISO', year, month, nodeid)
+                except KeyError:
+                    lbmp_da, lbmp_rt, rcap_da, rcap_rt, rmov_da = read_nyiso_data(path, year, month, nodeid, typedat="both", RT_DAM="DAM")
 
-            self.add_data(lbmp_da, lbmp_key)
-            self.add_data(rcap_da, rcap_key)
+                self.add_data(lbmp_da, lbmp_key)
+                self.add_data(rcap_da, rcap_key)
+
+                return lbmp_da, rcap_da
+
+            # concurrent requests for the same data share one load
+            lbmp_da, rcap_da = self.load_once(lbmp_key, _load, _lookup)
 
         return lbmp_da, rcap_da
 
 
+    def get_nyiso_data_bulk(self, year, month, node_ids):
+        """Retrieves the data returned by get_nyiso_data() for every node in node_ids. The daily files are parsed once for all of the nodes that are not already loaded or in the price store.
+
+        :return: A dictionary of (lbmp_da, rcap_da) tuples keyed by node ID as given.
+        """
+        path = os.path.join(self.home_path, 'NYISO')
+
+        year = str(year)
+        month = str(month)
+
+        rcap_key = self.delimiter.join([path, year, month, 'RegCAP'])
+
+        lbmp_data = {}
+        nodes_to_read = []
+
+        # the data is keyed by the node ID as a string, as in get_nyiso_data()
+        node_keys = [str(nodeid) for nodeid in node_ids]
+
+        for nodeid in node_keys:
+            lbmp_key = self.delimiter.join([path, year, month, nodeid, 'LBMP'])
+
+            try:
+                # attempt to access data if it is already loaded
+                lbmp_data[nodeid] = self.get_data(lbmp_key)
+            except KeyError:
+                try:
+                    lbmp_data[nodeid], _ = self.price_store.get('NYISO', year, month, nodeid)
+                except KeyError:
+                    nodes_to_read.append(nodeid)
+                else:
+                    self.add_data(lbmp_data[nodeid], lbmp_key)
+
+        if nodes_to_read:
+            # load the data for the remaining nodes from one pass over the raw files and add it to the DMS
+            lbmp_read, rcap_da = read_nyiso_data_bulk(path, year, month, nodes_to_read)
+
+            for nodeid, lbmp_da in lbmp_read.items():
+                lbmp_data[nodeid] = lbmp_da
+                self.add_data(lbmp_da, self.delimiter.join([path, year, month, nodeid, 'LBMP']))
+
+            self.add_data(rcap_da, rcap_key)
+        elif node_keys:
+            try:
+                rcap_da = self.get_data(rcap_key)
+            except KeyError:
+                _, rcap_da = self.get_nyiso_data(year, month, node_keys[0])
+        else:
+            rcap_da = np.array([])
+
+        return {nodeid: (lbmp_data[str(nodeid)], rcap_da) for nodeid in node_ids}
+
+
     def get_spp_data(self, year, month, nodeid):
         path = os.path.join(self.home_path, 'SPP')
 
@@ -320,19 +507,29 @@ class ValuationDMS(DataManagementSystem):
         mcpru_key = self.delimiter.join([path, year, month, 'MCPRU'])
         mcprd_key = self.delimiter.join([path, year, month, 'MCPRD'])
 
-        try:
+        def _lookup():
             # attempt to access data if it is already loaded
-            lmp_da = self.get_data(lmp_key)
-            mcpru_da = self.get_data(mcpru_key)
-            mcprd_da = self.get_data(mcprd_key)
+            return self.get_data(lmp_key), self.get_data(mcpru_key), self.get_data(mcprd_key)
+
+        try:
+            lmp_da, mcpru_da, mcprd_da = _lookup()
         except KeyError:
-            # load the data and add it to the DMS
-            # lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
-            lmp_da, mcpru_da, mcprd_da = read_spp_data(path, year, month, nodeid, typedat="both")
+            def _load():
+                # load the data from the price store, or from the raw files if it has not been ingested, and add it to the DMS
+                # lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
+                try:
+                    lmp_da, mcpru_da, mcprd_da = self.price_store.get('SPP', year, month, nodeid)
+                except KeyError:
+                    lmp_da, mcpru_da, mcprd_da = read_spp_data(path, year, month, nodeid, typedat="both")
 
-            self.add_data(lmp_da, lmp_key)
-            self.add_data(mcpru_da, mcpru_key)
-            self.add_data(mcprd_da, mcprd_key)
+                self.add_data(lmp_da, lmp_key)
+                self.add_data(mcpru_da, mcpru_key)
+                self.add_data(mcprd_da, mcprd_key)
+
+                return lmp_da, mcpru_da, mcprd_da
+
+            # concurrent requests for the same data share one load
+            lmp_da, mcpru_da, mcprd_da = self.load_once(lmp_key, _load, _lookup)
 
         return lmp_da, mcpru_da, mcprd_da
 
@@ -353,31 +550,35 @@ class ValuationDMS(DataManagementSystem):
         rmu_pacc_key = self.delimiter.join([path, year, month, 'RMU_PACC'])
         rmd_pacc_key = self.delimiter.join([path, year, month, 'RMD_PACC'])
 
-        try:
+        def _lookup():
             # attempt to access data if it is already loaded
-            lmp_da = self.get_data(lmp_key)
-            aspru_da = self.get_data(aspru_key)
-            asprd_da = self.get_data(asprd_key)
-            asprmu_da = self.get_data(asprmu_key)
-            asprmd_da = self.get_data(asprmd_key)
-            rmu_mm = self.get_data(rmu_mm_key)
-            rmd_mm = self.get_data(rmd_mm_key)
-            rmu_pacc = self.get_data(rmu_pacc_key)
-            rmd_pacc = self.get_data(rmd_pacc_key)
+            return self.get_data(lmp_key), self.get_data(aspru_key), self.get_data(asprd_key), self.get_data(asprmu_key), self.get_data(asprmd_key), self.get_data(rmu_mm_key), self.get_data(rmd_mm_key), self.get_data(rmu_pacc_key), self.get_data(rmd_pacc_key)
+
+        try:
+            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = _lookup()
         except KeyError:
-            # load the data and add it to the DMS
-            # lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
-            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = read_caiso_data(path, year, month, nodeid)
-
-            self.add_data(lmp_da, lmp_key)
-            self.add_data(aspru_da, aspru_key)
-            self.add_data(asprd_da, asprd_key)
-            self.add_data(asprmu_da, asprmu_key)
-            self.add_data(asprmd_da, asprmd_key)
-            self.add_data(rmu_mm, rmu_mm_key)
-            self.add_data(rmd_mm, rmd_mm_key)
-            self.add_data(rmu_pacc, rmu_pacc_key)
-            self.add_data(rmd_pacc, rmd_pacc_key)
+            def _load():
+                # load the data from the price store, or from the raw files if it has not been ingested, and add it to the DMS
+                # lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
+                try:
+                    lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = self.price_store.get('CAISO', year, month, nodeid)
+                except KeyError:
+                    lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = read_caiso_data(path, year, month, nodeid)
+
+                self.add_data(lmp_da, lmp_key)
+                self.add_data(aspru_da, aspru_key)
+                self.add_data(asprd_da, asprd_key)
+                self.add_data(asprmu_da, asprmu_key)
+                self.add_data(asprmd_da, asprmd_key)
+                self.add_data(rmu_mm, rmu_mm_key)
+                self.add_data(rmd_mm, rmd_mm_key)
+                self.add_data(rmu_pacc, rmu_pacc_key)
+                self.add_data(rmd_pacc, rmd_pacc_key)
+
+                return lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc
+
+            # concurrent requests for the same data share one load
+            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = self.load_once(lmp_key, _load, _lookup)
 
         return lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc
 
@@ -9,11 +9,23 @@ import numpy as np
 
 from es_gui.tools import optimizer
 from es_gui.tools.valuation.constraints import ExpressionsBlock
+from es_gui.tools.valuation.matrix_model import MatrixModel, VARIABLES, get_series
+from es_gui.tools.valuation.dp_arbitrage import ArbitrageDP
 
 
 class ValuationOptimizer(optimizer.Optimizer):
     """A framework wrapper class for creating Pyomo ConcreteModels for energy storage valuation."""
 
+    # Model parameters that can be updated in place in sweep mode.
+    SWEEP_PARAMS = {'Power_rating', 'R', 'Energy_capacity', 'Self_discharge_efficiency', 'Round_trip_efficiency',
+                    'Reserve_reg_min', 'Reserve_reg_max',
+                    'State_of_charge_min', 'State_of_charge_max', 'State_of_charge_init', 'Make_whole',
+                    'fraction_reg_up', 'fraction_reg_down', 'perf_score', 'perf_score_ru', 'perf_score_rd'}
+
+    # Model parameters that are fractions; values greater than 1.0 are interpreted as percentages.
+    FRACTION_PARAMS = {'Self_discharge_efficiency', 'Round_trip_efficiency', 'Reserve_reg_min', 'Reserve_reg_max',
+                       'State_of_charge_min', 'State_of_charge_max', 'State_of_charge_init'}
+
     def __init__(self, price_electricity=None,
                  price_reg_up=None, price_reg_down=None,
                  price_reg_serv_up=None, price_reg_serv_down=None,
@@ -23,15 +35,17 @@ class ValuationOptimizer(optimizer.Optimizer):
                  perf_score=None, perf_score_ru=None, perf_score_rd=None,
                  fraction_reg_up=None, fraction_reg_down=None,
                  market_type='arbitrage',
-                 solver='glpk'):
+                 solver='glpk', backend='pyomo'):
 
         # TODO: deprecate Perf_score and mileage_ratio
 
         self._model = ConcreteModel()
         self._market_type = market_type
         self._solver = solver
+        self.backend = backend
 
         self._expressions_block = None
+        self._solution = None
 
         self._price_electricity = price_electricity
 
@@ -222,6 +236,18 @@ class ValuationOptimizer(optimizer.Optimizer):
     def solver(self, value):
         self._solver = value
 
+    @property
+    def backend(self):
+        """The model building backend: 'pyomo' for a Pyomo ConcreteModel solved by the selected solver, 'matrix' for a sparse matrix LP solved by HiGHS in-process, or 'dp' for an exact dynamic program over the state of charge for arbitrage-only market types (other market types use 'matrix'), defaults to 'pyomo'."""
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        if value in {'pyomo', 'matrix', 'dp'}:
+            self._backend = value
+        else:
+            raise ValueError("backend must be one of 'pyomo', 'matrix', or 'dp'.")
+
     @property
     def expressions_block(self):
         """ExpressionsBlock object for setting model objectives and constraints."""
@@ -445,7 +471,7 @@ class ValuationOptimizer(optimizer.Optimizer):
         if not hasattr(m, 's'):
             def _s_init(_m, t):
                 """The energy storage device's state of charge [MWh]."""
-                return m.State_of_charge_init*m.Energy_capacity
+                return value(m.State_of_charge_init*m.Energy_capacity)
 
             m.s = Var(m.soc_time, initialize=_s_init, within=NonNegativeReals)
 
@@ -484,6 +510,46 @@ class ValuationOptimizer(optimizer.Optimizer):
 
             m.q_reg = Var(m.time, initialize=_q_reg_init, within=NonNegativeReals)
 
+    def _discount_factors(self):
+        """Returns the discount factor for each time period as an array."""
+        m = self.model
+
+        return np.exp(-np.arange(len(m.time))*value(m.R))
+
+    def _set_discount(self):
+        """Sets the discount factors for the objective, computed once rather than in every objective term."""
+        m = self.model
+
+        if self.sweep_mode:
+            m.discount = Param(m.time, initialize=dict(zip(m.time, self._discount_factors())), mutable=True)
+        else:
+            m.discount = self._discount_factors().tolist()
+
+    def _update_model_bounds(self):
+        """Sets the state of charge bounds, including the initial and final state of charge, and the discount factors derived from model parameters."""
+        m = self.model
+
+        if isinstance(m.discount, Param):
+            m.discount.store_values(dict(zip(m.time, self._discount_factors())))
+
+        if not len(m.soc_time):
+            return
+
+        soc_min = value(m.State_of_charge_min*m.Energy_capacity)
+        soc_max = value(m.State_of_charge_max*m.Energy_capacity)
+        soc_init = value(m.State_of_charge_init*m.Energy_capacity)
+
+        if self.market_type == 'arbitrage':
+            # Without regulation reserves, the state of charge limits only involve s.
+            for t in m.soc_time:
+                m.s[t].setlb(soc_min)
+                m.s[t].setub(soc_max)
+
+        # The state of charge at the beginning and end of the horizon equals its initial value. These are bounds rather than fixed values so that an initial value outside of the state of charge limits is still infeasible.
+        for t in (m.soc_time.first(), m.soc_time.last()):
+            m.s[t].setlb(max(soc_init, soc_min))
+            m.s[t].setub(min(soc_init, soc_max))
+
     def instantiate_model(self):
         """Instantiates the Pyomo ConcreteModel and populates it with supplied time series data."""
         if not hasattr(self, 'model'):
@@ -536,7 +602,19 @@ class ValuationOptimizer(optimizer.Optimizer):
         self.model.objective_expr = 0.0
 
         self._set_model_param()
+
+        if self.sweep_mode:
+            self._make_params_mutable(['Power_rating', 'R', 'Energy_capacity', 'Self_discharge_efficiency',
+                                       'Round_trip_efficiency', 'Reserve_reg_min', 'Reserve_reg_max',
+                                       'State_of_charge_min', 'State_of_charge_max', 'State_of_charge_init',
+                                       'Make_whole',
+                                       'fraction_reg_up', 'fraction_reg_down',
+                                       'perf_score', 'perf_score_ru', 'perf_score_rd'],
+                                      index_set=self.model.time)
+
+        self._set_discount()
         self._set_model_var()
+        self._update_model_bounds()
 
         self.expressions_block = ExpressionsBlock(self.market_type)
 
@@ -553,143 +631,90 @@ class ValuationOptimizer(optimizer.Optimizer):
         #     raise(IncompatibleDataException('The objective function was ill-formed, resulting in a constant objective function.'))
 
 
+    def run(self):
+        """Instantiates, creates, and solves the model using the selected backend."""
+        if self.backend in {'matrix', 'dp'}:
+            self.instantiate_model()
+            self._set_model_param()
+
+            try:
+                if self.backend == 'dp' and self.market_type == 'arbitrage':
+                    native_model = ArbitrageDP(self.model)
+                else:
+                    native_model = MatrixModel(self.model, self.market_type)
+            except IndexError:
+                # Array-like object(s) do(es) not match the length of the price_electricity array-like.
+                raise(IncompatibleDataException('At least one of the array-like parameter objects is not the expected length. (It should match the length of the price_electricity object.)'))
+
+            self._solution = native_model.solve()
+            self._process_results()
+
+            return self.get_results()
+        else:
+            self._solution = None
+
+            return super(ValuationOptimizer, self).run()
+
+    def _normalize_param(self, name, value):
+        """Interprets fractional model parameters greater than 1.0 as percentages."""
+        if name in self.FRACTION_PARAMS and value > 1.0:
+            logging.warning('ValuationOptimizer: {0} provided is greater than 1.0, interpreting as percentage...'.format(name))
+            return value/100
+
+        return value
+
     def _process_results(self):
         """Processes optimization results for further evaluation."""
         m = self.model
 
-        t = m.time
-        q_r = [m.q_r[n].value for n in m.time]
-        q_d = [m.q_d[n].value for n in m.time]
-        q_ru = [m.q_ru[n].value for n in m.time]
-        q_rd = [m.q_rd[n].value for n in m.time]
-        q_reg = [m.q_reg[n].value for n in m.time]
-        soc = [m.s[n].value for n in m.time]
-        price_electricity = [m.price_electricity[n] for n in m.time]
+        if self._solution is not None:
+            # Solved by the matrix or dp backend.
+            solution = self._solution
+        else:
+            solution = {var: optimizer.get_var_values(getattr(m, var)) for var in VARIABLES}
+
+        T = len(solution['q_r'])
+        price_electricity = get_series(m, 'price_electricity', T)
 
-        run_results = {'time': t, 'q_r': q_r, 'q_d': q_d, 'q_ru': q_ru, 'q_rd': q_rd, 'q_reg': q_reg,
-                       'state of charge': soc, 'price of electricity': price_electricity}
+        q_r, q_d, q_ru, q_rd, q_reg = (solution[var] for var in ('q_r', 'q_d', 'q_ru', 'q_rd', 'q_reg'))
 
-        if self.market_type == 'pjm_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.q_reg[t].value*m.perf_score[t]*(m.mi_mult[t]*m.price_reg_service[t] + m.price_regulation[t]) for t in m.time]))
+        run_results = {'time': np.arange(T), 'q_r': q_r, 'q_d': q_d, 'q_ru': q_ru, 'q_rd': q_rd, 'q_reg': q_reg,
+                       'state of charge': solution['s'][:T], 'price of electricity': price_electricity}
 
-            revenue = rev_arb + rev_reg
+        rev_arb = price_electricity*(q_d - q_r)
 
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
+        if self.market_type in {'pjm_pfp', 'isone_pfp'}:
+            rev_reg = q_reg*get_series(m, 'perf_score', T)*(get_series(m, 'mi_mult', T)*get_series(m, 'price_reg_service', T)
+                                                            + get_series(m, 'price_regulation', T))
         elif self.market_type == 'miso_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([(1 + m.Make_whole)*m.perf_score[t]*m.price_regulation[t]*m.q_reg[t].value for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #//////////////////////////////////////////////////#
-        elif self.market_type == 'isone_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([(m.mi_mult[t] * m.price_reg_service[t] + m.price_regulation[t]) * m.perf_score[t]*m.q_reg[t].value for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #//////////////////////////////////////////////////#
-        #######################################################################################################################
+            rev_reg = (1 + value(m.Make_whole))*get_series(m, 'perf_score', T)*get_series(m, 'price_regulation', T)*q_reg
         elif self.market_type == 'nyiso_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.q_reg[t].value* m.price_regulation[t] * (1 - 1.1*(1 - m.perf_score[t]))
-                                          + m.price_electricity[t]*(m.q_reg[t].value * m.fraction_reg_up[t]
-                                          - m.q_reg[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #######################################################################################################################
-        #######################################################################################################################
-        elif self.market_type == 'spp_pfp':
-            # TODO: copied from 'ercot_arbreg' -make sure is correct for this market
-            # rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value
-            #                                                       + m.q_ru[t].value*m.fraction_reg_up[t]
-            #                                                       - m.q_rd[t].value*m.fraction_reg_down[t])
-            #                               for t in m.time]))
-            # rev_reg = np.cumsum(np.array([m.ru[t]*m.q_ru[t].value + m.rd[t]*m.q_rd[t].value for t in m.time]))
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-                                          + m.price_electricity[t]*(m.q_ru[t].value * m.fraction_reg_up[t]
-                                          - m.q_rd[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #######################################################################################################################
-        elif self.market_type == 'caiso_pfp':
-            # rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value
-            #                                                       + m.q_ru[t].value*m.fraction_reg_up[t]
-            #                                                       - m.q_rd[t].value*m.fraction_reg_down[t])
-            #                               for t in m.time]))
-            # rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-            #                               + m.perf_score_ru[t] * m.mi_mult_ru[t] * m.price_reg_serv_up[t]
-            #                               + m.perf_score_rd[t] * m.mi_mult_rd[t] * m.price_reg_serv_down[t]
-            #                               for t in m.time]))
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-                                          + m.perf_score_ru[t] * m.mi_mult_ru[t] * m.price_reg_serv_up[t]
-                                          + m.perf_score_rd[t] * m.mi_mult_rd[t] * m.price_reg_serv_down[t]
-                                          + m.price_electricity[t]*(m.q_ru[t].value * m.fraction_reg_up[t]
-                                          - m.q_rd[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #######################################################################################################################
-        elif self.market_type == 'ercot_arbreg':
-            # rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value
-            #                                                       + m.q_ru[t].value*m.fraction_reg_up[t]
-            #                                                       - m.q_rd[t].value*m.fraction_reg_down[t])
-            #                               for t in m.time]))
-            # # rev_reg = np.cumsum(np.array([m.ru[t] * m.q_ru[t].value + m.rd[t] * m.q_rd[t].value for t in m.time]))
-            # rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value for t in m.time]))
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-                                          + m.price_electricity[t]*(m.q_ru[t].value * m.fraction_reg_up[t]
-                                          - m.q_rd[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
+            rev_reg = (q_reg*get_series(m, 'price_regulation', T)*(1 - 1.1*(1 - get_series(m, 'perf_score', T)))
+                       + price_electricity*(q_reg*get_series(m, 'fraction_reg_up', T) - q_reg*get_series(m, 'fraction_reg_down', T)))
+        elif self.market_type in {'spp_pfp', 'ercot_arbreg', 'caiso_pfp'}:
+            rev_reg = (get_series(m, 'price_reg_up', T)*q_ru + get_series(m, 'price_reg_down', T)*q_rd
+                       + price_electricity*(q_ru*get_series(m, 'fraction_reg_up', T) - q_rd*get_series(m, 'fraction_reg_down', T)))
+
+            if self.market_type == 'caiso_pfp':
+                rev_reg = rev_reg + (get_series(m, 'perf_score_ru', T)*get_series(m, 'mi_mult_ru', T)*get_series(m, 'price_reg_serv_up', T)
+                                     + get_series(m, 'perf_score_rd', T)*get_series(m, 'mi_mult_rd', T)*get_series(m, 'price_reg_serv_down', T))
         else:
-            rev_arb = np.cumsum(np.array([m.price_electricity[t] * (m.q_d[t].value - m.q_r[t].value)
-                                          for t in m.time]))
-            rev_reg = np.cumsum(np.array([0 for t in m.time]))
+            rev_reg = np.zeros(T)
 
-            revenue = rev_arb + rev_reg
+        rev_arb = np.cumsum(rev_arb)
+        rev_reg = np.cumsum(rev_reg)
+        revenue = rev_arb + rev_reg
 
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
+        run_results['rev_arb'] = rev_arb
+        run_results['rev_reg'] = rev_reg
+        run_results['revenue'] = revenue
 
         try:
             self.gross_revenue = revenue[-1]
         except IndexError:
             # Revenue is of length-0, likely due to no price_electricity array-like being given before solving.
             self.gross_revenue = 0
-        
+
         self.results = pd.DataFrame(run_results)
 
     def get_results(self):
@@ -697,6 +722,15 @@ class ValuationOptimizer(optimizer.Optimizer):
         return self.results, self.gross_revenue
 
 
+class ValuationRecord(optimizer.OptimizerRecord):
+    """A compact record of a solved ValuationOptimizer for results viewers and reports."""
+    __slots__ = ATTRIBUTES = ('market_type', 'gross_revenue')
+
+    def get_results(self):
+        """Returns the decision variables and derived quantities in a DataFrame, plus the net revenue."""
+        return self.results, self.gross_revenue
+
+
 class BadParameterException(Exception):
     pass
 
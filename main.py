@@ -432,9 +432,9 @@ class QuEStApp(App):
 
     def build_config(self, config):
         """Set default settings here."""
-        config.setdefaults('optimization', {'solver': 'glpk'})
+        config.setdefaults('optimization', {'solver': 'glpk', 'n_workers': 1, 'stack_size': 1, 'solve_cache': 1, 'solve_cache_size': 500, 'solved_ops_limit': 500})
         config.setdefaults('connectivity', {'use_proxy': 0, 'http_proxy': '', 'https_proxy': '', 'use_ssl_verify': 1})
-        config.setdefaults('valuation', {'valuation_dms_save': 1, 'valuation_dms_size': 20000})
+        config.setdefaults('valuation', {'valuation_dms_save': 1, 'valuation_dms_size': 20000, 'valuation_backend': 'pyomo'})
         config.setdefaults('btm', {'btm_dms_save': 1, 'btm_dms_size': 20000})
         config.setdefaults('datamanager-pjm', {'pjm_subscription_key': ''})
         config.setdefaults('datamanager-isone', {'iso-ne_api_username': ''})
@@ -21,7 +21,9 @@ setuptools_kwargs = {
                           'xlrd', 'six',
                           'jinja2',
                           'bs4', 'requests', 'urllib3',
-                          'holidays']
+                          'holidays'],
+    'extras_require': {'highs': ['highspy']},
+    'entry_points': {'console_scripts': ['quest-batch = es_gui.cli:main']},
 }
 
 setup(name=DISTNAME,